@@ -0,0 +1,368 @@
+"""Catalogue SQLite des séries, des épisodes et des définitions d'émissions.
+
+Le contenu de ``emissions_def.json`` et de ``bd_videos.json`` est conservé
+dans une base SQLite (``config.CATALOGUE_SQLITE``) avec trois tables
+principales : ``series`` (définition, ordre, ``prochain``, ``nb_episodes``),
+``episodes`` (fichiers, empreintes et informations Plex de chaque série) et
+``emissions`` (définitions des émissions). Les séries et les épisodes sont
+indexés par nom de série, les épisodes aussi par chemin et par empreinte
+(voir ``empreintes.py``).
+
+Les mises à jour se font ligne par ligne dans une transaction : avancer le
+``prochain`` d'une série ou changer son nombre d'épisodes ne réécrit plus
+tout le catalogue et deux scripts qui écrivent en même temps ne s'écrasent
+plus l'un l'autre.
+
+Les fichiers JSON restent le format d'échange. Après chaque écriture, le
+fichier touché est exporté de façon atomique et son empreinte (date de
+modification et taille) est notée dans la base. Un fichier JSON modifié à
+la main a une autre empreinte : il est réimporté au prochain
+``synchroniser()``. Sans ``CATALOGUE_SQLITE`` (ou avec ``None``), les
+scripts travaillent directement sur les fichiers JSON comme auparavant.
+
+Usage : python base_catalogue.py importer|exporter
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import config
+except ImportError:
+    print("Le fichier 'config.py' est manquant. Copiez 'config.py.sample' puis personnalisez-le.")
+    sys.exit(1)
+
+from utils import ecrire_json_atomique
+
+JSON_DEFINITIONS = 'emissions_def.json'
+JSON_VIDEOS = 'bd_videos.json'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    cle TEXT PRIMARY KEY,
+    valeur TEXT
+);
+CREATE TABLE IF NOT EXISTS series (
+    nom TEXT PRIMARY KEY,
+    position INTEGER,           -- rang dans emissions_def.json (NULL : absente)
+    ordre TEXT,
+    prochain INTEGER,
+    nb_episodes INTEGER,
+    definition TEXT,            -- définition complète, en JSON
+    position_videos INTEGER     -- rang dans bd_videos.json (NULL : absente)
+);
+CREATE TABLE IF NOT EXISTS episodes (
+    serie TEXT NOT NULL,
+    rang INTEGER NOT NULL,
+    fichier TEXT NOT NULL,      -- chemin local ou PLEX-ÉPISODE:<id>
+    plex_fichier TEXT,
+    plex_duree INTEGER,
+    plex_maj INTEGER,
+    empreinte TEXT,             -- empreinte échantillonnée du fichier local
+    PRIMARY KEY (serie, rang)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS episodes_fichier ON episodes (fichier);
+CREATE TABLE IF NOT EXISTS emissions (
+    position INTEGER PRIMARY KEY,
+    definition TEXT NOT NULL
+);
+"""
+
+_verrou = threading.RLock()
+_connexion = None
+
+
+def chemin_base():
+    """Emplacement de la base (``None`` : catalogue désactivé, par défaut)."""
+    return getattr(config, 'CATALOGUE_SQLITE', None)
+
+
+def actif() -> bool:
+    """Indique si le catalogue SQLite est utilisé."""
+    return chemin_base() is not None
+
+
+def connexion() -> sqlite3.Connection:
+    """Retourne la connexion partagée, en créant la base au premier appel."""
+    global _connexion
+    with _verrou:
+        if _connexion is None:
+            # Transactions explicites (BEGIN IMMEDIATE) plutôt qu'implicites
+            _connexion = sqlite3.connect(str(chemin_base()), timeout=30, isolation_level=None,
+                                         check_same_thread=False)
+            _connexion.execute('PRAGMA journal_mode=WAL')
+            _connexion.executescript(SCHEMA)
+            colonnes = [ligne[1] for ligne in _connexion.execute('PRAGMA table_info(episodes)')]
+            if 'empreinte' not in colonnes:
+                # Base créée avant les empreintes
+                _connexion.execute('ALTER TABLE episodes ADD COLUMN empreinte TEXT')
+            _connexion.execute('CREATE INDEX IF NOT EXISTS episodes_empreinte ON episodes (empreinte)')
+        return _connexion
+
+
+@contextmanager
+def transaction():
+    """Exécute un bloc dans une transaction qui verrouille la base en écriture."""
+    with _verrou:
+        base = connexion()
+        base.execute('BEGIN IMMEDIATE')
+        try:
+            yield base
+        except BaseException:
+            base.execute('ROLLBACK')
+            raise
+        base.execute('COMMIT')
+
+
+def _meta(base, cle, defaut=None):
+    ligne = base.execute('SELECT valeur FROM meta WHERE cle = ?', (cle,)).fetchone()
+    return json.loads(ligne[0]) if ligne else defaut
+
+
+def _noter_meta(base, cle, valeur):
+    base.execute('INSERT OR REPLACE INTO meta (cle, valeur) VALUES (?, ?)',
+                 (cle, json.dumps(valeur, ensure_ascii=False)))
+
+
+def _empreinte(fichier):
+    """Date de modification et taille d'un fichier JSON, ou ``None`` s'il est absent."""
+    try:
+        stat = os.stat(fichier)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def importer_definitions(donnees: dict):
+    """Remplace les définitions de séries et d'émissions par celles de ``donnees``."""
+    # Les autres clés et leur ordre sont conservés pour l'export
+    gabarit = {cle: (None if cle in ('series', 'emissions') else valeur) for cle, valeur in donnees.items()}
+    with transaction() as base:
+        base.execute('UPDATE series SET position = NULL, ordre = NULL, prochain = NULL, '
+                     'nb_episodes = NULL, definition = NULL')
+        for position, serie in enumerate(donnees.get('series', [])):
+            if serie.get('nom') is None:
+                continue
+            base.execute(
+                'INSERT INTO series (nom, position, ordre, prochain, nb_episodes, definition) '
+                'VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (nom) DO UPDATE SET position = excluded.position, ordre = excluded.ordre, '
+                'prochain = excluded.prochain, nb_episodes = excluded.nb_episodes, definition = excluded.definition',
+                (serie['nom'], position, serie.get('ordre'), serie.get('prochain'), serie.get('nb_episodes'),
+                 json.dumps(serie, ensure_ascii=False))
+            )
+        base.execute('DELETE FROM series WHERE definition IS NULL AND position_videos IS NULL')
+        base.execute('DELETE FROM emissions')
+        base.executemany('INSERT INTO emissions (position, definition) VALUES (?, ?)',
+                         [(position, json.dumps(emission, ensure_ascii=False))
+                          for position, emission in enumerate(donnees.get('emissions', []))])
+        _noter_meta(base, 'gabarit_definitions', gabarit)
+
+
+def _inserer_episodes(base, serie):
+    """Remplace les épisodes d'une série de ``bd_videos.json``."""
+    base.execute('DELETE FROM episodes WHERE serie = ?', (serie['nom'],))
+    plex = serie.get('plex', {})
+    fichiers = serie.get('fichiers', [])
+    empreintes = serie.get('empreintes') or []
+    if len(empreintes) != len(fichiers):
+        # Liste incohérente (fichier modifié à la main) : recalculée au prochain balayage
+        empreintes = [None] * len(fichiers)
+    lignes = []
+    for rang, (fichier, empreinte) in enumerate(zip(fichiers, empreintes)):
+        episode = plex.get(fichier.split(':', 1)[1], {}) if fichier.startswith('PLEX-ÉPISODE:') else {}
+        lignes.append((serie['nom'], rang, fichier, episode.get('fichier'), episode.get('duree'), episode.get('maj'),
+                       empreinte))
+    base.executemany('INSERT INTO episodes (serie, rang, fichier, plex_fichier, plex_duree, plex_maj, empreinte) '
+                     'VALUES (?, ?, ?, ?, ?, ?, ?)', lignes)
+
+
+def importer_videos(donnees: dict):
+    """Remplace les séries et épisodes de ``bd_videos.json`` par ceux de ``donnees``."""
+    gabarit = {cle: (None if cle == 'series' else valeur) for cle, valeur in donnees.items()}
+    with transaction() as base:
+        base.execute('UPDATE series SET position_videos = NULL')
+        base.execute('DELETE FROM episodes')
+        for position, serie in enumerate(donnees.get('series', [])):
+            if serie.get('nom') is None:
+                continue
+            base.execute('INSERT INTO series (nom, position_videos) VALUES (?, ?) '
+                         'ON CONFLICT (nom) DO UPDATE SET position_videos = excluded.position_videos',
+                         (serie['nom'], position))
+            _inserer_episodes(base, serie)
+        base.execute('DELETE FROM series WHERE definition IS NULL AND position_videos IS NULL')
+        _noter_meta(base, 'gabarit_videos', gabarit)
+
+
+def remplacer_videos(series: list, changements=None):
+    """Enregistre un balayage : séries de ``bd_videos.json`` et changements constatés."""
+    with _verrou:
+        gabarit = _meta(connexion(), 'gabarit_videos', {'series': None})
+        if changements is not None:
+            gabarit['changements'] = changements
+        importer_videos({**gabarit, 'series': series})
+
+
+def _definition_serie(ligne) -> dict:
+    """Reconstruit une définition de série; les colonnes priment sur le JSON."""
+    _, ordre, prochain, nb_episodes, definition = ligne
+    serie = json.loads(definition)
+    for cle, valeur in (('prochain', prochain), ('nb_episodes', nb_episodes)):
+        if valeur is not None or cle in serie:
+            serie[cle] = valeur
+    return serie
+
+
+def definitions() -> dict:
+    """Retourne le contenu de ``emissions_def.json``."""
+    with _verrou:
+        base = connexion()
+        gabarit = _meta(base, 'gabarit_definitions', {'emissions': None, 'series': None})
+        series = [_definition_serie(ligne) for ligne in base.execute(
+            'SELECT nom, ordre, prochain, nb_episodes, definition FROM series '
+            'WHERE definition IS NOT NULL ORDER BY position')]
+        emissions = [json.loads(ligne[0]) for ligne in base.execute(
+            'SELECT definition FROM emissions ORDER BY position')]
+    return {**gabarit, 'series': series, 'emissions': emissions}
+
+
+def _videos_serie(base, nom) -> dict:
+    fichiers = []
+    plex = {}
+    empreintes = []
+    for fichier, plex_fichier, duree, maj, empreinte in base.execute(
+            'SELECT fichier, plex_fichier, plex_duree, plex_maj, empreinte FROM episodes '
+            'WHERE serie = ? ORDER BY rang', (nom,)):
+        fichiers.append(fichier)
+        empreintes.append(empreinte)
+        if fichier.startswith('PLEX-ÉPISODE:') and (plex_fichier, duree, maj) != (None, None, None):
+            plex[fichier.split(':', 1)[1]] = {'fichier': plex_fichier, 'duree': duree, 'maj': maj}
+    serie = {'nom': nom, 'nb_episodes': len(fichiers), 'fichiers': fichiers}
+    if plex:
+        serie['plex'] = plex
+    if any(empreintes):
+        serie['empreintes'] = empreintes
+    return serie
+
+
+def videos() -> dict:
+    """Retourne le contenu de ``bd_videos.json``."""
+    with _verrou:
+        base = connexion()
+        gabarit = _meta(base, 'gabarit_videos', {'series': None})
+        noms = [ligne[0] for ligne in base.execute(
+            'SELECT nom FROM series WHERE position_videos IS NOT NULL ORDER BY position_videos')]
+        series = [_videos_serie(base, nom) for nom in noms]
+    return {**gabarit, 'series': series}
+
+
+def definition_serie(nom):
+    """Retourne la définition de la série ``nom``, ou ``None``."""
+    with _verrou:
+        ligne = connexion().execute(
+            'SELECT nom, ordre, prochain, nb_episodes, definition FROM series '
+            'WHERE nom = ? AND definition IS NOT NULL', (nom,)).fetchone()
+    return _definition_serie(ligne) if ligne else None
+
+
+def videos_serie(nom):
+    """Retourne la série ``nom`` de ``bd_videos.json``, ou ``None``."""
+    with _verrou:
+        base = connexion()
+        if base.execute('SELECT 1 FROM series WHERE nom = ? AND position_videos IS NOT NULL', (nom,)).fetchone():
+            return _videos_serie(base, nom)
+    return None
+
+
+def avancer_prochain(nom):
+    """Avance le ``prochain`` épisode de la série ``nom``; retourne la nouvelle valeur.
+
+    Le calcul est celui de ``transcode.update_emissions_def`` : après le
+    dernier épisode, la série revient au premier.
+    """
+    with transaction() as base:
+        ligne = base.execute('SELECT prochain, nb_episodes FROM series WHERE nom = ? AND definition IS NOT NULL',
+                             (nom,)).fetchone()
+        if ligne is None:
+            return None
+        prochain, nb_episodes = ligne
+        prochain = ((prochain or 1) + 1) % ((nb_episodes if nb_episodes is not None else 1) + 1) or 1
+        base.execute('UPDATE series SET prochain = ? WHERE nom = ?', (prochain, nom))
+    return prochain
+
+
+def mettre_a_jour_nb_episodes(nb_episodes: dict):
+    """Change le ``nb_episodes`` des séries données (nom -> nombre) en une transaction."""
+    with transaction() as base:
+        base.executemany('UPDATE series SET nb_episodes = ? WHERE nom = ? AND definition IS NOT NULL',
+                         [(nombre, nom) for nom, nombre in nb_episodes.items()])
+
+
+def recaler_prochains(prochains: dict):
+    """Change le ``prochain`` des séries données (nom -> (ancien, nouveau)) en une transaction.
+
+    Une série dont le ``prochain`` n'est plus ``ancien`` (avancé entre-temps
+    par ``transcode.py``) n'est pas touchée.
+    """
+    with transaction() as base:
+        base.executemany('UPDATE series SET prochain = ? WHERE nom = ? AND prochain IS ? AND definition IS NOT NULL',
+                         [(nouveau, nom, ancien) for nom, (ancien, nouveau) in prochains.items()])
+
+
+def exporter(fichier=None):
+    """Écrit un fichier JSON d'échange à partir de la base et note son empreinte.
+
+    ``fichier`` est ``emissions_def.json`` ou ``bd_videos.json`` (ou un
+    chemin vers l'un d'eux); sans argument, les deux sont écrits.
+    """
+    if fichier is None:
+        exporter(JSON_DEFINITIONS)
+        exporter(JSON_VIDEOS)
+        return
+    est_videos = Path(fichier).name == JSON_VIDEOS
+    with _verrou:
+        contenu = videos() if est_videos else definitions()
+        ecrire_json_atomique(fichier, contenu)
+        with transaction() as base:
+            _noter_meta(base, f'empreinte:{Path(fichier).name}', _empreinte(fichier))
+
+
+def synchroniser(repertoire='.', forcer=False):
+    """Réimporte les fichiers JSON modifiés hors du catalogue depuis le dernier export.
+
+    Avec ``forcer``, les fichiers sont réimportés même s'ils n'ont pas changé.
+    """
+    for nom, importer in ((JSON_DEFINITIONS, importer_definitions), (JSON_VIDEOS, importer_videos)):
+        fichier = Path(repertoire) / nom
+        with _verrou:
+            empreinte = _empreinte(fichier)
+            if empreinte is None or (not forcer and empreinte == _meta(connexion(), f'empreinte:{nom}')):
+                continue
+            print(f"Import de {fichier} dans le catalogue {chemin_base()}")
+            with open(fichier, 'r', encoding='utf-8') as f:
+                importer(json.load(f))
+            with transaction() as base:
+                _noter_meta(base, f'empreinte:{nom}', empreinte)
+
+
+def main():
+    """Importe ou exporte les fichiers JSON du répertoire courant."""
+    if not actif():
+        print("CATALOGUE_SQLITE est désactivé dans config.py.")
+        sys.exit(1)
+    if len(sys.argv) != 2 or sys.argv[1] not in ('importer', 'exporter'):
+        print("Usage: python base_catalogue.py importer|exporter")
+        sys.exit(1)
+    if sys.argv[1] == 'importer':
+        synchroniser(forcer=True)
+    else:
+        exporter()
+    print("Catalogue à jour.")
+
+
+if __name__ == '__main__':
+    main()
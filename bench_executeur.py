@@ -0,0 +1,81 @@
+"""Mesure le coût fixe d'un appel ffmpeg pour chaque moteur d'exécution.
+
+Chaque moteur disponible exécute plusieurs fois une commande ffmpeg
+minimale (une image noire de 16x16 envoyée vers la sortie nulle). Le temps
+mesuré correspond donc presque entièrement au surcoût du lancement :
+démarrage du conteneur, montage des volumes, vérification de l'image...
+
+Usage : python bench_executeur.py [nombre_iterations]
+"""
+import shutil
+import statistics
+import sys
+import time
+
+try:
+    import config
+except ImportError:
+    print("Le fichier 'config.py' est manquant. Copiez 'config.py.sample' puis personnalisez-le.")
+    sys.exit(1)
+
+import executeur_ffmpeg
+
+COMMANDE_MINIMALE = [
+    '-hide_banner', '-loglevel', 'error',
+    '-f', 'lavfi', '-i', 'color=c=black:s=16x16:d=0.04',
+    '-frames:v', '1',
+    '-f', 'null', '-',
+]
+
+
+def moteurs_disponibles():
+    """Retourne les moteurs utilisables sur cette machine."""
+    moteurs = []
+    if shutil.which('ffmpeg'):
+        moteurs.append('local')
+    if shutil.which('docker'):
+        moteurs += ['docker', 'docker-persistant']
+    return moteurs
+
+
+def mesurer(moteur, iterations):
+    """Retourne la durée de chaque appel (en secondes) pour ``moteur``."""
+    if moteur == 'docker-persistant':
+        # Le démarrage du conteneur n'est payé qu'une fois : on l'exclut
+        executeur_ffmpeg.demarrer_conteneur()
+    durees = []
+    for _ in range(iterations):
+        debut = time.perf_counter()
+        resultat = executeur_ffmpeg.executer(COMMANDE_MINIMALE, capturer=True, moteur=moteur)
+        durees.append(time.perf_counter() - debut)
+        if resultat.returncode != 0:
+            print(f"Le moteur {moteur} a échoué (code {resultat.returncode}) : {resultat.stderr}")
+            break
+    return durees
+
+
+def main():
+    """Affiche le surcoût moyen, médian et maximal par moteur."""
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    moteurs = moteurs_disponibles()
+    if not moteurs:
+        print("Aucun moteur ffmpeg disponible (ni ffmpeg ni docker dans le PATH).")
+        sys.exit(1)
+
+    resultats = {moteur: mesurer(moteur, iterations) for moteur in moteurs}
+
+    print()
+    print(f"{'Moteur':<20}{'Appels':>8}{'Moyenne (ms)':>15}{'Médiane (ms)':>15}{'Max (ms)':>12}")
+    for moteur, durees in resultats.items():
+        if not durees:
+            continue
+        print(
+            f"{moteur:<20}{len(durees):>8}"
+            f"{statistics.mean(durees) * 1000:>15.1f}"
+            f"{statistics.median(durees) * 1000:>15.1f}"
+            f"{max(durees) * 1000:>12.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
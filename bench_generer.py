@@ -0,0 +1,186 @@
+"""Banc d'essai de la planification des émissions (``generer.process_emissions``).
+
+Un catalogue synthétique (séries séquentielles et aléatoires, fichiers
+locaux et épisodes Plex déjà résolus) est planifié sur plusieurs horizons
+avec le moteur de ``generer.py`` et avec le parcours segment par segment
+qu'il remplace, reproduit ici comme référence (affichage compris, redirigé
+vers ``os.devnull``). Pour chaque horizon, le script vérifie que les deux
+planifications sont identiques pour une même graine de ``random`` (listes
+produites et pointeurs ``prochain``) puis affiche leurs durées médianes.
+
+Aucun accès à Plex ni aux fichiers du catalogue n'est nécessaire.
+
+Usage : python bench_generer.py [--series N] [--episodes N] [--repetitions N]
+                                [--jours 1 30 365]
+"""
+import argparse
+import contextlib
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+try:
+    import config
+except ImportError:
+    print("Le fichier 'config.py' est manquant. Copiez 'config.py.sample' puis personnalisez-le.")
+    sys.exit(1)
+
+import catalogue
+import generer
+
+# Émissions synthétiques : une par jour, dans cet ordre
+NB_EMISSIONS = 5
+SEGMENTS_PAR_EMISSION = 12
+GRAINE = 20240601
+
+
+def construire_donnees(nb_series, nb_episodes):
+    """Retourne un ``emissions_def.json`` et un ``bd_videos.json`` synthétiques."""
+    alea = random.Random(GRAINE)
+    definitions = []
+    videos = []
+    for i in range(nb_series):
+        nom = f"Série {i:04d}"
+        # Une série sur trois est sur Plex, une sur deux est séquentielle
+        if i % 3 == 0:
+            fichiers = [f"PLEX-ÉPISODE:{i * 100000 + j}" for j in range(nb_episodes)]
+            plex = {str(i * 100000 + j): {"fichier": f"/Plex/Séries/{nom}/Saison 1/{j:05d}.mkv",
+                                          "duree": 1320000, "maj": 1700000000}
+                    for j in range(nb_episodes)}
+        else:
+            fichiers = [f"/mnt/Medias/Séries/{nom}/Saison {j // 50 + 1}/Épisode {j:05d}.mp4"
+                        for j in range(nb_episodes)]
+            plex = {}
+        serie_videos = {"nom": nom, "nb_episodes": len(fichiers), "fichiers": fichiers}
+        if plex:
+            serie_videos["plex"] = plex
+        videos.append(serie_videos)
+        definitions.append({
+            "nom": nom,
+            "chemins": [nom],
+            "ordre": "sequentiel" if i % 2 == 0 else "aleatoire",
+            "prochain": alea.randint(1, nb_episodes),
+            "nb_episodes": nb_episodes,
+        })
+    noms = [definition["nom"] for definition in definitions]
+    emissions = [
+        {
+            "no": no,
+            "titre": f"Émission {no}",
+            "segments": [{"série": "Intros"}]
+                        + [{"série": alea.choice(noms)} for _ in range(SEGMENTS_PAR_EMISSION - 2)]
+                        + [{"série": "Fin"}],
+        }
+        for no in range(1, NB_EMISSIONS + 1)
+    ]
+    return {"series": definitions, "emissions": emissions}, {"series": videos}
+
+
+def planifier_segment_par_segment(num_loops, date_obj, emissions_data, series):
+    """Référence : parcours segment par segment, tel qu'avant le calcul en forme close."""
+    emissions_info = []
+    for _ in range(num_loops):
+        for emission in emissions_data["emissions"]:
+            series_list = []
+            videos_list = []
+            aincrementer_list = []
+            id_plex_list = []
+
+            for segment in emission["segments"]:
+                serie_name = segment["série"]
+
+                if serie_name not in ["Fin", "Transitions", "Intros"]:
+                    series_list.append(serie_name)
+
+                serie = series.serie(serie_name)
+                episodes = serie.episodes if serie else None
+                ordre_serie = serie.ordre if serie else None
+                print(f"Ordre '{ordre_serie}' '{serie_name}'  ")
+                if episodes is not None:
+                    if ordre_serie == "sequentiel":
+                        print(f"sequentiel")
+                        video_choisie, id_plex = generer.get_video_path(serie.episode_prochain(), serie.plex)
+                        if id_plex:
+                            id_plex_list.append(id_plex)
+                        print(f"on incrémente")
+
+                        if serie.prochain + 1 > serie.nb_episodes:
+                            print(f"on revient a 1 ")
+
+                        serie.avancer()
+                        aincrementer_list.append(serie_name)
+                    else:
+                        print(f"aleatoire")
+                        video_choisie, id_plex = generer.get_video_path(random.choice(episodes), serie.plex)
+                        if id_plex:
+                            id_plex_list.append(id_plex)
+                    videos_list.append(video_choisie)
+                else:
+                    print(f"La série '{serie_name}' n'a pas été trouvée dans bdvideos_data.")
+
+            videos_list = [generer.map_path(video) for video in videos_list]
+
+            emissions_info.append({
+                "no": emission["no"],
+                "date_diffusion": date_obj.strftime('%Y-%m-%d'),
+                "titre": emission["titre"],
+                "description": " | ".join(series_list),
+                "fichiers_concatenes": videos_list,
+                "a_incrementer": aincrementer_list,
+                "genere": False,
+                "id_plex": id_plex_list
+            })
+            date_obj += timedelta(days=1)
+    return emissions_info
+
+
+def executer(fonction, jours, emissions_def, bd_videos):
+    """Planifie ``jours`` jours; retourne la durée, la planification et les pointeurs finaux."""
+    emissions_data = dict(emissions_def, emissions=emissions_def["emissions"][:jours])
+    num_loops = max(1, jours // len(emissions_data["emissions"]))
+    series = catalogue.Catalogue(emissions_data, bd_videos)
+    random.seed(GRAINE)
+    with open(os.devnull, 'w') as nul, contextlib.redirect_stdout(nul):
+        debut = time.perf_counter()
+        planification = fonction(num_loops, datetime(2025, 1, 1), emissions_data, series)
+        duree = time.perf_counter() - debut
+    return duree, planification, {serie.nom: serie.prochain for serie in series}
+
+
+def main():
+    """Compare les deux planifications et affiche les durées par horizon."""
+    parser = argparse.ArgumentParser(description="Mesure la planification des émissions sur plusieurs horizons.")
+    parser.add_argument('--series', type=int, default=200, help="Nombre de séries du catalogue synthétique")
+    parser.add_argument('--episodes', type=int, default=500, help="Nombre d'épisodes par série")
+    parser.add_argument('--repetitions', type=int, default=5, help="Nombre de mesures par horizon")
+    parser.add_argument('--jours', type=int, nargs='+', default=[1, 30, 365], help="Horizons mesurés, en jours")
+    args = parser.parse_args()
+
+    emissions_def, bd_videos = construire_donnees(args.series, args.episodes)
+    print(f"Catalogue : {args.series} séries de {args.episodes} épisodes, {NB_EMISSIONS} émissions "
+          f"de {SEGMENTS_PAR_EMISSION} segments; NumPy {'utilisé' if catalogue.numpy is not None else 'absent'}")
+    print()
+    print(f"{'Jours':>6}{'Segment par segment (ms)':>27}{'Forme close (ms)':>19}{'Gain':>8}{'Identique':>11}")
+    for jours in args.jours:
+        references, mesures = [], []
+        identique = True
+        for _ in range(args.repetitions):
+            duree_ref, attendu, prochains_ref = executer(
+                planifier_segment_par_segment, jours, emissions_def, bd_videos)
+            duree, obtenu, prochains = executer(generer.process_emissions, jours, emissions_def, bd_videos)
+            identique = identique and obtenu == attendu and prochains == prochains_ref
+            references.append(duree_ref)
+            mesures.append(duree)
+        reference, mesure = statistics.median(references), statistics.median(mesures)
+        print(f"{jours:>6}{reference * 1000:>27.2f}{mesure * 1000:>19.2f}{reference / mesure:>7.1f}x"
+              f"{'oui' if identique else 'NON':>11}")
+        if not identique:
+            print(f"Les planifications diffèrent pour {jours} jour(s).")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""Banc d'essai reproductible du transcodage sur des sources synthétiques.
+
+Des sources sont générées avec les filtres ``lavfi`` de ffmpeg (mire
+``testsrc2`` et tonalité ``sine``) dans des résolutions, SAR, fréquences
+d'images et durées variées. Chaque configuration (codec, ``-threads``,
+débit, format de sortie) passe ensuite par les vraies fonctions
+``transcode.transcode_video`` et ``transcode.assembler_emission``.
+
+Pour chaque configuration, le script affiche le temps réel, le débit
+(secondes de vidéo par seconde et images par seconde), le temps CPU, la
+mémoire résidente maximale de ffmpeg et la taille de l'émission produite.
+Les mesures de ffmpeg proviennent des métriques ``-progress`` du module
+``executeur_ffmpeg``.
+
+Le banc s'exécute hors ligne avec le binaire ``ffmpeg`` local et les
+encodeurs logiciels. Les index, métriques et fichiers produits restent
+dans un répertoire de travail distinct.
+
+Usage : python bench_transcode.py [--repertoire DIR] [--configurations NOM ...]
+                                  [--qsv] [--json FICHIER]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+try:
+    import config
+except ImportError:
+    print("Le fichier 'config.py' est manquant. Copiez 'config.py.sample' puis personnalisez-le.")
+    sys.exit(1)
+
+import executeur_ffmpeg
+import transcode
+
+# Sources synthétiques : nom, largeur, hauteur, SAR, images/s, durée (s), canaux audio
+SOURCES = [
+    ('ntsc_4x3', 720, 480, '8:9', '30000/1001', 10, 2),
+    ('ntsc_16x9', 720, 480, '32:27', '30000/1001', 10, 2),
+    ('pal_court', 720, 576, '16:15', '25', 5, 1),
+    ('hd_720p', 1280, 720, '1:1', '25', 10, 2),
+    ('fhd_1080p', 1920, 1080, '1:1', '24000/1001', 20, 6),
+]
+
+# Configurations comparées : réglages de config.py remplacés le temps de la mesure
+CONFIGURATIONS = [
+    {'nom': 'x264_1080p_1t', 'codec': 'libx264', 'FORMAT_SORTIE': '1080p', 'THREADS_PAR_TRAVAILLEUR': 1},
+    {'nom': 'x264_1080p_4t', 'codec': 'libx264', 'FORMAT_SORTIE': '1080p', 'THREADS_PAR_TRAVAILLEUR': 4},
+    {'nom': 'x264_720p_1t', 'codec': 'libx264', 'FORMAT_SORTIE': '720p', 'THREADS_PAR_TRAVAILLEUR': 1},
+    {'nom': 'x264_1080p_3000k', 'codec': 'libx264', 'FORMAT_SORTIE': '1080p', 'THREADS_PAR_TRAVAILLEUR': 1,
+     'BITRATE_VIDEO': 3000},
+    {'nom': 'x265_1080p_1t', 'codec': 'libx265', 'FORMAT_SORTIE': '1080p', 'THREADS_PAR_TRAVAILLEUR': 1},
+    {'nom': 'x265_1080p_4t', 'codec': 'libx265', 'FORMAT_SORTIE': '1080p', 'THREADS_PAR_TRAVAILLEUR': 4},
+]
+
+# Encodage matériel, seulement avec --qsv
+CONFIGURATIONS_QSV = [
+    {'nom': 'hevc_qsv_1080p', 'codec': 'hevc_qsv', 'FORMAT_SORTIE': '1080p', 'THREADS_PAR_TRAVAILLEUR': 1},
+]
+
+
+def preparer_config(repertoire: Path):
+    """Isole le banc d'essai : moteur local, index et métriques dans ``repertoire``."""
+    config.EXECUTEUR_FFMPEG = 'local'
+    config.INDEX_MEDIAS = repertoire / 'index_medias.json'
+    config.METRIQUES_DIR = repertoire / 'metriques'
+    config.CACHE_SEGMENTS_TAILLE_MAX_GO = 0
+    config.MEZZANINE_DIR = None
+    # pydub n'est pas requis pour le banc d'essai
+    config.NORMALISATION_AUDIO = 'loudnorm'
+
+
+def generer_sources(repertoire: Path) -> list:
+    """Génère les sources synthétiques absentes et retourne leurs chemins."""
+    repertoire.mkdir(parents=True, exist_ok=True)
+    sources = []
+    for nom, largeur, hauteur, sar, ips, duree, canaux in SOURCES:
+        chemin = repertoire / f'{nom}.mp4'
+        sources.append(str(chemin))
+        if chemin.exists():
+            continue
+        disposition = {1: 'mono', 2: 'stereo', 6: '5.1'}[canaux]
+        command = [
+            '-hide_banner', '-loglevel', 'error',
+            '-f', 'lavfi', '-i', f'testsrc2=size={largeur}x{hauteur}:rate={ips}:duration={duree}',
+            '-f', 'lavfi', '-i', f'sine=frequency=440:beep_factor=4:sample_rate=44100:duration={duree}',
+            '-filter_complex', f'[0:v]setsar={sar}[v];[1:a]aformat=channel_layouts={disposition}[a]',
+            '-map', '[v]', '-map', '[a]',
+            '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p',
+            '-c:a', 'aac',
+            '-y', str(chemin),
+        ]
+        print(f"Génération de la source synthétique {chemin.name}")
+        resultat = executeur_ffmpeg.executer(command, etiquettes={'bench': 'generation', 'source': nom})
+        if resultat.returncode != 0:
+            print(f"Impossible de générer {chemin.name} (code {resultat.returncode})")
+            sys.exit(1)
+    return sources
+
+
+def lire_metriques(nom_configuration: str) -> list:
+    """Retourne les métriques ffmpeg enregistrées pour une configuration."""
+    chemin = executeur_ffmpeg.fichier_metriques()
+    if not chemin.exists():
+        return []
+    with open(chemin, 'r', encoding='utf-8') as f:
+        enregistrements = [json.loads(ligne) for ligne in f if ligne.strip()]
+    return [e for e in enregistrements if e.get('bench') == nom_configuration]
+
+
+def mesurer(configuration: dict, sources: list, repertoire: Path) -> dict:
+    """Transcode et assemble toutes les sources avec ``configuration``."""
+    nom = configuration['nom']
+    codec = configuration['codec']
+    reglages = {cle: valeur for cle, valeur in configuration.items() if cle not in ('nom', 'codec')}
+    anciens = {cle: getattr(config, cle, None) for cle in reglages}
+    for cle, valeur in reglages.items():
+        setattr(config, cle, valeur)
+
+    sortie = repertoire / nom
+    shutil.rmtree(sortie, ignore_errors=True)
+    sortie.mkdir(parents=True)
+
+    try:
+        debut = time.monotonic()
+        segments = []
+        for i, source in enumerate(sources, start=1):
+            segment = str(sortie / f'{i:02}.mp4')
+            etiquettes = {'bench': nom, 'source': Path(source).stem, 'segment': i}
+            if transcode.transcode_video(source, segment, codec, etiquettes) != 0:
+                print(f"Échec du transcodage de {source} avec {nom}")
+                return {'nom': nom, 'erreur': 'transcodage'}
+            segments.append(segment)
+        fin_transcodage = time.monotonic()
+
+        emission = str(sortie / 'emission.mp4')
+        chapitres = [Path(source).stem for source in sources]
+        durees_ms = [transcode.obtenir_duree_ms(source) for source in sources]
+        if transcode.assembler_emission(segments, emission, nom, 'Banc d\'essai', chapitres, durees_ms,
+                                        {'bench': nom}) != 0:
+            return {'nom': nom, 'erreur': 'assemblage'}
+        fin = time.monotonic()
+    finally:
+        for cle, valeur in anciens.items():
+            setattr(config, cle, valeur)
+
+    metriques = lire_metriques(nom)
+    encodages = [m for m in metriques if m.get('etape') == 'transcodage']
+    duree_source = sum(durees_ms) / 1000
+    temps_transcodage = fin_transcodage - debut
+    images = sum(m.get('images') or 0 for m in encodages)
+    return {
+        'nom': nom,
+        'codec': codec,
+        'reglages': reglages,
+        'temps_reel_s': round(fin - debut, 2),
+        'temps_transcodage_s': round(temps_transcodage, 2),
+        'temps_assemblage_s': round(fin - fin_transcodage, 2),
+        'vitesse': round(duree_source / temps_transcodage, 2),
+        'images_par_seconde': round(images / temps_transcodage, 1),
+        'temps_cpu_s': round(sum(m.get('temps_cpu_s') or 0 for m in metriques), 2),
+        'rss_max_mo': round(max((m.get('rss_max_ko') or 0 for m in metriques), default=0) / 1024, 1),
+        'taille_mo': round(os.path.getsize(emission) / 1024 ** 2, 2),
+    }
+
+
+def afficher(resultats: list):
+    """Affiche le tableau comparatif des configurations."""
+    print()
+    print(f"{'Configuration':<20}{'Réel (s)':>10}{'Vitesse':>9}{'Img/s':>9}"
+          f"{'CPU (s)':>10}{'RSS (Mo)':>10}{'Taille (Mo)':>13}")
+    for r in resultats:
+        if 'erreur' in r:
+            print(f"{r['nom']:<20}  échec ({r['erreur']})")
+            continue
+        print(
+            f"{r['nom']:<20}{r['temps_reel_s']:>10.2f}{r['vitesse']:>8.2f}x{r['images_par_seconde']:>9.1f}"
+            f"{r['temps_cpu_s']:>10.2f}{r['rss_max_mo']:>10.1f}{r['taille_mo']:>13.2f}"
+        )
+
+
+def main():
+    """Génère les sources, mesure chaque configuration et affiche le résultat."""
+    parser = argparse.ArgumentParser(description="Banc d'essai du transcodage sur des sources synthétiques.")
+    parser.add_argument('--repertoire', type=Path, default=Path(tempfile.gettempdir()) / 'bench_transcode',
+                        help="Répertoire de travail (sources conservées entre deux exécutions)")
+    parser.add_argument('--configurations', nargs='+', help="Noms des configurations à mesurer")
+    parser.add_argument('--qsv', action='store_true', help="Ajoute les configurations Intel QSV")
+    parser.add_argument('--json', type=Path, help="Écrit aussi les résultats dans ce fichier JSON")
+    args = parser.parse_args()
+
+    if not shutil.which('ffmpeg') or not shutil.which('ffprobe'):
+        print("Le banc d'essai demande ffmpeg et ffprobe dans le PATH.")
+        sys.exit(1)
+
+    configurations = CONFIGURATIONS + (CONFIGURATIONS_QSV if args.qsv else [])
+    if args.configurations:
+        configurations = [c for c in configurations if c['nom'] in args.configurations]
+        if not configurations:
+            print(f"Aucune configuration ne correspond à : {' '.join(args.configurations)}")
+            sys.exit(1)
+
+    preparer_config(args.repertoire)
+    sources = generer_sources(args.repertoire / 'sources')
+
+    # La mesure d'intensité sonore est conservée dans l'index : elle est faite
+    # une fois ici pour que toutes les configurations mesurent le même travail.
+    for source in sources:
+        transcode.mesurer_loudness(source, {'bench': 'generation'})
+
+    resultats = [mesurer(configuration, sources, args.repertoire) for configuration in configurations]
+    afficher(resultats)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultats, f, indent=4, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
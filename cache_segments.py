@@ -0,0 +1,142 @@
+"""Cache persistant des segments transcodés.
+
+Chaque segment produit par ``transcode.py`` est conservé dans
+``config.CACHE_SEGMENTS_DIR`` sous un nom dérivé de l'identité du fichier
+source et des réglages d'encodage. L'identité est l'empreinte échantillonnée
+du fichier lorsque l'index des médias la connaît (un fichier renommé ou
+déplacé garde alors ses segments), sinon son chemin, sa taille et sa date
+de modification. Lorsqu'une même source est de nouveau demandée avec les
+mêmes réglages, le segment en cache est réutilisé sans relancer ffmpeg.
+
+La taille du cache est limitée par ``config.CACHE_SEGMENTS_TAILLE_MAX_GO``.
+Les segments les moins récemment utilisés sont supprimés en premier.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+try:
+    import config
+except ImportError:
+    print("Le fichier 'config.py' est manquant. Copiez 'config.py.sample' puis personnalisez-le.")
+    sys.exit(1)
+
+import index_medias
+
+# Verrou partagé par les travailleurs du pool de transcodage
+_verrou = threading.Lock()
+
+
+def repertoire_cache() -> Path:
+    """Retourne le répertoire du cache de segments."""
+    return Path(getattr(config, 'CACHE_SEGMENTS_DIR', Path(tempfile.gettempdir()) / 'cache_segments'))
+
+
+def taille_max_octets() -> int:
+    """Retourne le budget du cache en octets (0 désactive le cache)."""
+    return int(float(getattr(config, 'CACHE_SEGMENTS_TAILLE_MAX_GO', 0)) * 1024 ** 3)
+
+
+def cache_actif() -> bool:
+    """Indique si le cache de segments est activé dans la configuration."""
+    return taille_max_octets() > 0
+
+
+def cle_segment(fichier_source: str, reglages: dict) -> str:
+    """Calcule la clé d'un segment à partir de sa source et des réglages."""
+    empreinte = index_medias.valeur(fichier_source, 'empreinte')
+    if empreinte:
+        identite = {'empreinte': empreinte, 'reglages': reglages}
+    else:
+        stat = os.stat(fichier_source)
+        identite = {
+            'chemin': os.path.abspath(fichier_source),
+            'taille': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'reglages': reglages,
+        }
+    contenu = json.dumps(identite, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenu.encode('utf-8')).hexdigest()
+
+
+def _chemin_entree(cle: str) -> Path:
+    return repertoire_cache() / f'{cle}.mp4'
+
+
+def _lier_ou_copier(source: str, destination: str):
+    """Crée un lien physique vers ``source`` ou, à défaut, une copie."""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def recuperer(cle: str, destination: str) -> bool:
+    """Place le segment en cache à ``destination`` s'il existe.
+
+    Retourne ``True`` si le segment a été trouvé. La date de modification
+    de l'entrée est rafraîchie pour l'éviction LRU.
+    """
+    if not cache_actif():
+        return False
+    entree = _chemin_entree(cle)
+    with _verrou:
+        if not entree.exists():
+            return False
+        os.utime(entree)
+        if os.path.exists(destination):
+            os.remove(destination)
+        _lier_ou_copier(str(entree), destination)
+    print(f"Segment récupéré du cache : {entree.name}")
+    return True
+
+
+def enregistrer(cle: str, fichier: str):
+    """Ajoute ``fichier`` au cache sous la clé ``cle`` puis applique le budget."""
+    if not cache_actif():
+        return
+    repertoire = repertoire_cache()
+    repertoire.mkdir(parents=True, exist_ok=True)
+    entree = _chemin_entree(cle)
+    temporaire = repertoire / f'.{cle}.{threading.get_ident()}.tmp'
+    try:
+        _lier_ou_copier(fichier, str(temporaire))
+        os.replace(temporaire, entree)
+    except OSError as e:
+        print(f"Impossible d'ajouter le segment au cache : {e}")
+        if temporaire.exists():
+            temporaire.unlink()
+        return
+    evincer()
+
+
+def evincer(taille_max: int = None):
+    """Supprime les entrées les moins récemment utilisées au-delà du budget."""
+    if taille_max is None:
+        taille_max = taille_max_octets()
+    repertoire = repertoire_cache()
+    if not repertoire.exists():
+        return
+    with _verrou:
+        entrees = []
+        for entree in repertoire.glob('*.mp4'):
+            try:
+                stat = entree.stat()
+            except FileNotFoundError:
+                continue
+            entrees.append((stat.st_mtime, stat.st_size, entree))
+        total = sum(taille for _, taille, _ in entrees)
+        for _, taille, entree in sorted(entrees):
+            if total <= taille_max:
+                break
+            try:
+                entree.unlink()
+                total -= taille
+                print(f"Segment retiré du cache : {entree.name}")
+            except FileNotFoundError:
+                pass
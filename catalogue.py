@@ -0,0 +1,192 @@
+"""Modèle en mémoire du catalogue, partagé par les scripts.
+
+Les séries de ``emissions_def.json`` (définitions) et de ``bd_videos.json``
+(épisodes) sont réunies en un seul enregistrement ``Serie`` par nom, dans
+un dictionnaire : trouver une série ne demande plus de parcourir les
+listes. Les enregistrements utilisent ``__slots__`` et les épisodes d'une
+série sont stockés de façon compacte : le préfixe commun des chemins (point
+de montage et répertoire de la série, ou ``PLEX-ÉPISODE:``) n'est conservé
+qu'une fois, suivi des seules fins de chemin.
+
+Le pointeur séquentiel (``prochain``) est un attribut de la série : lire
+l'épisode à jouer et avancer le pointeur se font en temps constant. Les
+pointeurs des ``n`` prochains passages sont aussi donnés en forme close
+(arithmétique modulaire), en un seul calcul vectoriel avec NumPy
+lorsqu'il est installé et que les passages sont nombreux.
+"""
+import json
+import os
+import sys
+
+try:
+    import config
+except ImportError:
+    print("Le fichier 'config.py' est manquant. Copiez 'config.py.sample' puis personnalisez-le.")
+    sys.exit(1)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import base_catalogue
+
+# En deçà, le calcul en Python pur est plus rapide que la création des tableaux NumPy
+SEUIL_NUMPY = 256
+
+
+class Episodes:
+    """Liste de chemins d'épisodes stockée sous forme préfixe commun + fins.
+
+    Se comporte comme une liste en lecture seule : ``len``, indices (y
+    compris négatifs), itération. ``random.choice`` y fait donc exactement
+    le même tirage que sur la liste d'origine.
+    """
+
+    __slots__ = ('prefixe', 'fins')
+
+    def __init__(self, chemins=()):
+        chemins = list(chemins)
+        prefixe = os.path.commonprefix(chemins) if chemins else ''
+        # Couper après le dernier séparateur : les fins restent des noms lisibles
+        coupure = max(prefixe.rfind('/'), prefixe.rfind(':')) + 1
+        self.prefixe = sys.intern(prefixe[:coupure])
+        self.fins = [chemin[coupure:] for chemin in chemins]
+
+    def __len__(self):
+        return len(self.fins)
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return [self.prefixe + fin for fin in self.fins[indice]]
+        return self.prefixe + self.fins[indice]
+
+    def __iter__(self):
+        prefixe = self.prefixe
+        return (prefixe + fin for fin in self.fins)
+
+    def __bool__(self):
+        return bool(self.fins)
+
+
+class Serie:
+    """Série du catalogue : définition, épisodes et pointeur séquentiel.
+
+    ``definition`` est le dictionnaire de ``emissions_def.json`` (``None``
+    si la série n'y figure pas) et ``episodes`` la liste de
+    ``bd_videos.json`` (``None`` si la série n'a pas été balayée).
+    """
+
+    __slots__ = ('nom', 'ordre', 'prochain', 'nb_episodes', 'definition', 'episodes', 'plex')
+
+    def __init__(self, nom):
+        self.nom = nom
+        self.ordre = None
+        self.prochain = 1
+        self.nb_episodes = 1
+        self.definition = None
+        self.episodes = None
+        self.plex = {}
+
+    def definir(self, definition: dict):
+        """Associe la définition de ``emissions_def.json``."""
+        self.definition = definition
+        self.ordre = definition.get("ordre")
+        self.prochain = definition.get("prochain", 1)
+        self.nb_episodes = definition.get("nb_episodes", 1)
+
+    def episode_prochain(self) -> str:
+        """Retourne l'épisode désigné par le pointeur séquentiel."""
+        return self.episodes[self.prochain - 1]
+
+    def _cycle(self):
+        """Avancements avant le premier retour à 1, et longueur du cycle ensuite."""
+        return max(self.nb_episodes - self.prochain, 0), max(self.nb_episodes, 1)
+
+    def positions(self, nombre: int) -> list:
+        """Pointeurs des ``nombre`` prochains passages, sans avancer.
+
+        Le résultat est celui de ``nombre`` lectures de ``prochain`` suivies
+        chacune d'un ``avancer()`` : le pointeur monte jusqu'à
+        ``nb_episodes``, puis parcourt le cycle 1..``nb_episodes``.
+        """
+        lineaires, cycle = self._cycle()
+        if numpy is not None and nombre >= SEUIL_NUMPY:
+            rangs = numpy.arange(nombre)
+            return numpy.where(rangs <= lineaires, self.prochain + rangs,
+                               (rangs - lineaires - 1) % cycle + 1).tolist()
+        return [self.prochain + rang if rang <= lineaires else (rang - lineaires - 1) % cycle + 1
+                for rang in range(nombre)]
+
+    def avancer(self, nombre: int = 1) -> int:
+        """Avance le pointeur séquentiel de ``nombre`` épisodes; après le dernier, revient au premier."""
+        lineaires, cycle = self._cycle()
+        if nombre <= lineaires:
+            self.prochain += nombre
+        else:
+            self.prochain = (nombre - lineaires - 1) % cycle + 1
+        return self.prochain
+
+
+class Catalogue:
+    """Séries indexées par nom."""
+
+    __slots__ = ('series',)
+
+    def __init__(self, emissions_data=None, bdvideos_data=None):
+        self.series = {}
+        # Comme une recherche linéaire, la première série d'un nom l'emporte
+        for series in (bdvideos_data or {}).get("series", []):
+            serie = self._obtenir(series.get("nom"))
+            if serie.episodes is None:
+                serie.episodes = Episodes(series.get("fichiers", []))
+                serie.plex = series.get("plex", {})
+        for series in (emissions_data or {}).get("series", []):
+            serie = self._obtenir(series.get("nom"))
+            if serie.definition is None:
+                serie.definir(series)
+
+    def _obtenir(self, nom) -> Serie:
+        serie = self.series.get(nom)
+        if serie is None:
+            serie = self.series[nom] = Serie(nom)
+        return serie
+
+    def serie(self, nom):
+        """Retourne la série ``nom``, ou ``None``."""
+        return self.series.get(nom)
+
+    def definition(self, nom):
+        """Retourne la définition de la série ``nom`` dans ``emissions_def.json``, ou ``None``."""
+        serie = self.series.get(nom)
+        return serie.definition if serie else None
+
+    def __contains__(self, nom):
+        return nom in self.series
+
+    def __iter__(self):
+        return iter(self.series.values())
+
+    def __len__(self):
+        return len(self.series)
+
+
+def charger_donnees():
+    """Retourne le contenu de ``emissions_def.json`` et de ``bd_videos.json``.
+
+    Avec le catalogue SQLite, les fichiers modifiés à la main sont d'abord
+    réimportés.
+    """
+    if base_catalogue.actif():
+        base_catalogue.synchroniser()
+        return base_catalogue.definitions(), base_catalogue.videos()
+    with open(base_catalogue.JSON_DEFINITIONS, 'r', encoding='utf-8') as f:
+        emissions_data = json.load(f)
+    with open(base_catalogue.JSON_VIDEOS, 'r', encoding='utf-8') as f:
+        bdvideos_data = json.load(f)
+    return emissions_data, bdvideos_data
+
+
+def charger() -> Catalogue:
+    """Charge le catalogue du répertoire courant."""
+    return Catalogue(*charger_donnees())
@@ -6,11 +6,9 @@ Ce module fournit une interface interactive pour gérer toutes les opérations
 de génération et de transcodage de contenu vidéo pour la chaîne Télé Limoilou.
 """
 
-import os
 import sys
 import json
 import subprocess
-import shutil
 from pathlib import Path
 from datetime import datetime
 
@@ -29,7 +27,9 @@ except ImportError:
     print("Le fichier 'config.py' est manquant. Copiez 'config.py.sample' puis personnalisez-le.")
     sys.exit(1)
 
-from plexapi.server import PlexServer
+from utils import publier_emissions
+import client_plex
+import journal_etat
 
 # Configuration
 console = Console()
@@ -186,38 +186,32 @@ def regenerer_emission_jour():
         return False
 
     # Étape 3: Copier vers Plex
-    console.print("\n[bold cyan]Étape 3/4:[/bold cyan] Copie vers le répertoire Plex")
+    console.print("\n[bold cyan]Étape 3/4:[/bold cyan] Publication vers le répertoire Plex")
     try:
         destination_dir = Path(config.TVLIMOILOU_DIR)
         transcode_dir = Path(config.TRANSCODE_DIR)
 
-        # Supprimer les anciens fichiers MP4
-        for file_name in os.listdir(destination_dir):
-            if file_name.endswith(".mp4"):
-                file_path = destination_dir / file_name
-                os.remove(file_path)
-                console.print(f"  [dim]Fichier supprimé: {file_name}[/dim]")
-
-        # Copier les nouveaux fichiers
-        date_format = datetime.now().strftime("%Y-%m-%d")
-        for file_name in os.listdir(transcode_dir):
-            if file_name.endswith(".mp4"):
-                source_file = transcode_dir / file_name
-                destination_file = destination_dir / file_name
-                shutil.copyfile(source_file, destination_file)
-                console.print(f"  [dim]Fichier copié: {file_name}[/dim]")
+        # Publier les nouveaux fichiers avant de retirer les anciens
+        sources = sorted(
+            fichier for fichier in transcode_dir.iterdir()
+            if fichier.suffix == ".mp4" and fichier.is_file()
+        )
+        publies, supprimes = publier_emissions(sources, destination_dir)
+        for fichier in publies:
+            console.print(f"  [dim]Fichier publié: {fichier.name}[/dim]")
+        for fichier in supprimes:
+            console.print(f"  [dim]Fichier supprimé: {fichier.name}[/dim]")
 
-        console.print("[bold green]✓[/bold green] Copie terminée\n")
+        console.print("[bold green]✓[/bold green] Publication terminée\n")
 
     except Exception as e:
-        console.print(f"[bold red]✗ Erreur lors de la copie:[/bold red] {str(e)}\n")
+        console.print(f"[bold red]✗ Erreur lors de la publication:[/bold red] {str(e)}\n")
         return False
 
     # Étape 4: Rafraîchir Plex
     console.print("\n[bold cyan]Étape 4/4:[/bold cyan] Rafraîchissement de la bibliothèque Plex")
     try:
-        plex = PlexServer(config.PLEX_BASEURL, config.PLEX_TOKEN)
-        plex.library.section('Télé Limoilou').update()
+        client_plex.serveur().library.section('Télé Limoilou').update()
         console.print("[bold green]✓[/bold green] Bibliothèque Plex rafraîchie\n")
     except Exception as e:
         console.print(f"[bold red]✗ Erreur lors du rafraîchissement Plex:[/bold red] {str(e)}\n")
@@ -241,11 +235,9 @@ def afficher_statistiques():
         with open(script_dir / "emissions_def.json", "r", encoding="utf-8") as f:
             emissions_def = json.load(f)
 
-        with open(script_dir / "listegeneration.json", "r", encoding="utf-8") as f:
-            liste_gen = json.load(f)
+        liste_gen = journal_etat.charger(script_dir / "listegeneration.json")
 
-        with open(script_dir / "messages.json", "r", encoding="utf-8") as f:
-            messages = json.load(f)
+        messages = journal_etat.charger(script_dir / "messages.json")
 
     except FileNotFoundError as e:
         console.print(f"[bold red]Erreur:[/bold red] Fichier manquant - {e.filename}")
@@ -361,8 +353,7 @@ def editer_liste_generation():
 
     try:
         liste_path = script_dir / "listegeneration.json"
-        with open(liste_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = journal_etat.charger(liste_path)
 
         emissions = data.get("emissions", [])
 
@@ -424,10 +415,7 @@ def editer_liste_generation():
 
                 if selection and selection != "Annuler":
                     index = int(selection.split(".")[0]) - 1
-                    emissions[index]["genere"] = True
-
-                    with open(liste_path, "w", encoding="utf-8") as f:
-                        json.dump(data, f, indent=4, ensure_ascii=False)
+                    journal_etat.modifier(liste_path, data, ("emissions",), index, genere=True)
 
                     console.print(f"[green]✓ Émission marquée comme générée[/green]")
 
@@ -445,10 +433,7 @@ def editer_liste_generation():
 
                 if selection and selection != "Annuler":
                     index = int(selection.split(".")[0]) - 1
-                    emissions[index]["genere"] = False
-
-                    with open(liste_path, "w", encoding="utf-8") as f:
-                        json.dump(data, f, indent=4, ensure_ascii=False)
+                    journal_etat.modifier(liste_path, data, ("emissions",), index, genere=False)
 
                     console.print(f"[green]✓ Émission marquée comme non générée[/green]")
 
@@ -466,10 +451,7 @@ def editer_liste_generation():
 
                 if selection and selection != "Annuler":
                     index = int(selection.split(".")[0]) - 1
-                    emission_supprimee = emissions.pop(index)
-
-                    with open(liste_path, "w", encoding="utf-8") as f:
-                        json.dump(data, f, indent=4, ensure_ascii=False)
+                    emission_supprimee = journal_etat.supprimer(liste_path, data, ("emissions",), index)
 
                     console.print(f"[green]✓ Émission supprimée: {emission_supprimee.get('titre')}[/green]")
 
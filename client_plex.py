@@ -0,0 +1,73 @@
+"""Client Plex partagé par les scripts.
+
+La connexion au serveur n'est établie qu'au premier appel de ``serveur()``,
+si bien qu'une commande qui n'a pas besoin de Plex ne paie rien et ne
+dépend pas de sa disponibilité. Toutes les requêtes passent par une même
+session HTTP (connexions réutilisées) avec un délai d'attente explicite
+(``config.PLEX_DELAI_SECONDES``) et un nombre borné de nouvelles tentatives
+avec attente exponentielle (``config.PLEX_REESSAIS`` et
+``config.PLEX_DELAI_REESSAI``). Un serveur injoignable fait donc échouer
+l'appel en un temps borné, avec une exception que l'appelant peut traiter.
+
+Les connexions obtenues avec ``switchUser`` sont conservées pour la durée
+du processus.
+"""
+import sys
+import threading
+
+try:
+    import config
+except ImportError:
+    print("Le fichier 'config.py' est manquant. Copiez 'config.py.sample' puis personnalisez-le.")
+    sys.exit(1)
+
+# Codes HTTP pour lesquels une nouvelle tentative a du sens
+CODES_A_REESSAYER = (429, 500, 502, 503, 504)
+
+_verrou = threading.RLock()
+_serveur = None
+_utilisateurs = {}
+
+
+def delai() -> float:
+    """Délai d'attente (en secondes) appliqué à chaque requête Plex."""
+    return getattr(config, 'PLEX_DELAI_SECONDES', 10)
+
+
+def creer_session():
+    """Crée la session HTTP partagée, avec nouvelles tentatives bornées."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    reessais = Retry(
+        total=getattr(config, 'PLEX_REESSAIS', 3),
+        backoff_factor=getattr(config, 'PLEX_DELAI_REESSAI', 0.5),
+        status_forcelist=CODES_A_REESSAYER,
+        raise_on_status=False,
+    )
+    adaptateur = HTTPAdapter(max_retries=reessais, pool_connections=4, pool_maxsize=8)
+    session = requests.Session()
+    session.mount('http://', adaptateur)
+    session.mount('https://', adaptateur)
+    return session
+
+
+def serveur():
+    """Retourne le serveur Plex partagé, en s'y connectant au premier appel."""
+    global _serveur
+    with _verrou:
+        if _serveur is None:
+            from plexapi.server import PlexServer
+
+            _serveur = PlexServer(config.PLEX_BASEURL, config.PLEX_TOKEN,
+                                  session=creer_session(), timeout=delai())
+        return _serveur
+
+
+def utilisateur(nom: str):
+    """Retourne le serveur vu par l'utilisateur géré ``nom`` (``switchUser``)."""
+    with _verrou:
+        if nom not in _utilisateurs:
+            _utilisateurs[nom] = serveur().switchUser(nom, timeout=delai())
+        return _utilisateurs[nom]
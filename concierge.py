@@ -2,9 +2,6 @@ import os
 import shutil
 import subprocess
 import datetime
-import plexapi
-from plexapi.server import PlexServer
-import json
 import platform
 import tempfile
 import sys
@@ -15,7 +12,10 @@ except ImportError:
     print("Le fichier 'config.py' est manquant. Copiez 'config.py.sample' puis personnalisez-le.")
     sys.exit(1)
 
-from utils import verifier_fichier_existe
+from utils import verifier_fichier_existe, publier_emissions
+import client_plex
+import journal_etat
+import transcode
 
 # Détecter le système d'exploitation
 os_name = config.OS_NAME
@@ -24,21 +24,6 @@ python_path = sys.executable  # Donne le chemin du python actif
 # Chemin de destination pour les vidéos générées
 destination_dir = str(config.TVLIMOILOU_DIR)
 
-# Connexion au serveur Plex
-# Connexion au serveur Plex
-baseurl = config.PLEX_BASEURL
-token = config.PLEX_TOKEN
-
-plex = None
-userplex = None
-
-try:
-    plex = PlexServer(baseurl, token)
-    userplex = plex.switchUser("Les filles ")
-except Exception as e:
-    print(f"Erreur de connexion à Plex : {e}")
-    print("Le script continue sans accès à Plex.")
-
 nomjour = datetime.datetime.now().strftime('%A')
 
 # Chemin du répertoire contenant les scripts
@@ -62,14 +47,34 @@ def write_to_log(message):
     with open("log.txt", "a") as log_file:
         log_file.write(date_jour + " - " + message + "\n")
 
+# Fonction pour vider /transcode sans perdre les constructions interrompues
+def nettoyer_transcode():
+    """Vide ``TRANSCODE_DIR`` en conservant les points de contrôle des émissions à générer."""
+    emissions = journal_etat.charger(listegeneration_path).get("emissions", [])
+    a_conserver = {transcode.repertoire_points_controle(emission) for emission in emissions if not emission.get("genere")}
+
+    for element in transcode_dir.iterdir():
+        if element.is_dir() and element.name == 'points_controle':
+            for point in element.iterdir():
+                if point in a_conserver and transcode.lire_manifeste(point) is not None:
+                    write_to_log(f"Point de contrôle conservé: {point}")
+                elif point.is_dir():
+                    shutil.rmtree(point)
+                else:
+                    point.unlink()
+        elif element.is_dir():
+            shutil.rmtree(element)
+        else:
+            element.unlink()
+    write_to_log(f"Répertoire vidé: {transcode_dir}")
+
 # Fonction exécutée par le script
 def execute_script():
     """Orchestre les différentes étapes de génération des émissions."""
     # Lire le fichier listegeneration.json
     verifier_fichier_existe(str(listegeneration_path))
     verifier_fichier_existe('emissions_def.json')
-    with open(listegeneration_path, 'r', encoding='utf-8') as listegeneration_file:
-        listegeneration_data = json.load(listegeneration_file)
+    listegeneration_data = journal_etat.charger(listegeneration_path)
 
     # Vérifier si l'une des instances d'émissions a la clé "genere" égale à "false" ou si le jour n'est pas dimanche
     if any(emission.get("genere") == False for emission in listegeneration_data.get("emissions", [])) and nomjour != "Sunday":
@@ -86,6 +91,16 @@ def execute_script():
         subprocess.run([python_path, str(generer_emissions_script), "1", date_format])
         write_to_log(f"Script generer.py exécuté avec les paramètres: 1 {date_format}")
 
+    # Connexion au serveur Plex, établie seulement lorsqu'elle devient nécessaire
+    plex = None
+    userplex = None
+    try:
+        plex = client_plex.serveur()
+        userplex = client_plex.utilisateur("Les filles ")
+    except Exception as e:
+        print(f"Erreur de connexion à Plex : {e}")
+        print("Le script continue sans accès à Plex.")
+
     # Étape 0 : Vérifier si la vidéo a été regardée ou non
     
     arreter = True
@@ -154,6 +169,8 @@ def execute_script():
     emissions_def_backup = backup_dir / f"{current_datetime}_emissions_def.json"
     emissions_def_path = script_dir / "emissions_def.json"
 
+    # La copie doit contenir les changements encore dans le journal
+    journal_etat.consolider(listegeneration_path)
     shutil.copyfile(listegeneration_path, listegeneration_backup)
     write_to_log(f"Fichier listegeneration.json sauvegardé dans {listegeneration_backup}")
 
@@ -164,10 +181,9 @@ def execute_script():
         write_to_log("Fichier emissions_def.json non trouvé, pas de sauvegarde effectuée.")
 
 
-    # Étape 1: Supprimer les fichiers dans /transcode et genmessage s'ils existent
+    # Étape 1: Vider /transcode (sauf les points de contrôle valides) et supprimer genmessage
     if transcode_dir.exists():
-        shutil.rmtree(transcode_dir)
-        write_to_log(f"Répertoire supprimé: {transcode_dir}")
+        nettoyer_transcode()
         
     if genmessage_dir.exists():
         shutil.rmtree(genmessage_dir)
@@ -193,20 +209,18 @@ def execute_script():
     subprocess.run([python_path, str(transcode_script)])
     write_to_log("Script transcode.py exécuté")
 
-    # Étape 5: Supprimer tous les fichiers MP4 s'ils existent dans destination_dir
-    for file_name in os.listdir(destination_dir):
-        if file_name.endswith(".mp4"):
-            file_path = os.path.join(destination_dir, file_name)
-            os.remove(file_path)
-            write_to_log(f"Fichier supprimé: {file_path}")
-
-    # Étape 6: Copier les fichiers du répertoire /transcode contenant la date du jour dans destination_dir
-    date_format = datetime.datetime.now().strftime("%Y-%m-%d")
-    for file_name in os.listdir(transcode_dir):
-        source_file = os.path.join(transcode_dir, file_name)
-        destination_file = os.path.join(destination_dir, file_name)
-        shutil.copyfile(source_file, destination_file)
-        write_to_log(f"Fichier copié: {source_file} -> {destination_file}")
+    # Étape 5: Publier les émissions du répertoire /transcode dans destination_dir, puis
+    # retirer les anciennes : la bibliothèque Plex n'est jamais vide.
+    sources = [
+        os.path.join(transcode_dir, file_name)
+        for file_name in sorted(os.listdir(transcode_dir))
+        if file_name.endswith(".mp4") and os.path.isfile(os.path.join(transcode_dir, file_name))
+    ]  # Les points de contrôle restent dans /transcode
+    publies, supprimes = publier_emissions(sources, destination_dir)
+    for destination_file in publies:
+        write_to_log(f"Fichier publié: {destination_file}")
+    for file_path in supprimes:
+        write_to_log(f"Fichier supprimé: {file_path}")
 
     # Scanner les fichiers dans la bibliothèque Plex
     plex.library.section('Télé Limoilou').update()
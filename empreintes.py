@@ -0,0 +1,42 @@
+"""Empreintes échantillonnées des fichiers vidéo.
+
+Le chemin d'un épisode change lorsqu'il est déplacé d'un partage à l'autre
+ou renommé. Pour le reconnaître malgré tout, ``scanneurvid.py`` calcule une
+empreinte de son contenu : la taille du fichier et le hachage de
+``NB_BLOCS`` blocs de ``TAILLE_BLOC`` octets lus à des positions fixes
+(début, fin et positions réparties entre les deux). Le fichier n'est
+jamais lu en entier : sur un NAS, l'empreinte coûte quelques lectures au
+lieu du transfert complet qu'exigerait un hachage intégral.
+
+Deux fichiers de même empreinte sont considérés comme identiques. Une
+modification qui ne change ni la taille ni les blocs échantillonnés
+passerait inaperçue, ce qui n'arrive pas en pratique avec des vidéos
+(un réencodage ou un remuxage change la taille).
+"""
+import hashlib
+import os
+
+# Taille et nombre des blocs échantillonnés
+TAILLE_BLOC = 64 * 1024
+NB_BLOCS = 5
+
+
+def positions(taille: int) -> list:
+    """Positions des blocs lus pour un fichier de ``taille`` octets."""
+    if taille <= TAILLE_BLOC * NB_BLOCS:
+        # Petit fichier : il est lu en entier
+        return list(range(0, taille, TAILLE_BLOC))
+    dernier = taille - TAILLE_BLOC
+    return [dernier * i // (NB_BLOCS - 1) for i in range(NB_BLOCS)]
+
+
+def calculer(chemin) -> str:
+    """Retourne l'empreinte échantillonnée de ``chemin`` (``taille:hachage``)."""
+    hachage = hashlib.blake2b(digest_size=16)
+    with open(chemin, 'rb') as fichier:
+        taille = os.fstat(fichier.fileno()).st_size
+        hachage.update(taille.to_bytes(8, 'little'))
+        for position in positions(taille):
+            fichier.seek(position)
+            hachage.update(fichier.read(TAILLE_BLOC))
+    return f'{taille}:{hachage.hexdigest()}'
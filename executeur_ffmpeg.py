@@ -0,0 +1,330 @@
+"""Exécution des commandes ffmpeg selon différents moteurs.
+
+Le moteur est choisi par ``config.EXECUTEUR_FFMPEG`` :
+
+* ``"local"`` : binaire ``ffmpeg`` présent sur la machine;
+* ``"docker"`` : un conteneur ``linuxserver/ffmpeg`` lancé à chaque appel
+  (comportement historique sous Linux);
+* ``"docker-persistant"`` : un conteneur de longue durée propre au
+  processus, démarré au premier appel, dans lequel chaque commande est
+  lancée avec ``docker exec``. Son état n'est revérifié qu'après un
+  ``docker exec`` en échec. Le conteneur est arrêté à la fin du script;
+  ceux qu'ont laissés des scripts interrompus sont retirés au démarrage
+  suivant. Plusieurs scripts (transcodage du jour, préparation d'avance,
+  bibliothèque mezzanine) peuvent ainsi tourner en même temps sans
+  arrêter le conteneur des autres;
+* ``"auto"`` : Docker sous Linux, binaire local ailleurs.
+
+Tous les moteurs retournent le code de sortie de ffmpeg.
+
+Chaque exécution est suivie avec l'option ``-progress`` de ffmpeg. Le
+débit (images par seconde, vitesse, débit binaire), les octets écrits,
+le temps réel et le temps CPU sont ajoutés, avec les étiquettes fournies
+par l'appelant, au fichier de métriques de l'exécution en cours (JSON
+lines dans ``config.METRIQUES_DIR``).
+"""
+import atexit
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+try:
+    import config
+except ImportError:
+    print("Le fichier 'config.py' est manquant. Copiez 'config.py.sample' puis personnalisez-le.")
+    sys.exit(1)
+
+IMAGE_DOCKER = 'linuxserver/ffmpeg'
+
+# Résultat d'une exécution : code de sortie, sortie d'erreur (si capturée)
+# et indication que ffmpeg a démarré (au moins une ligne de progression)
+Resultat = namedtuple('Resultat', ['returncode', 'stderr', 'demarre'])
+
+_verrou_conteneur = threading.Lock()
+# Vrai une fois le conteneur persistant démarré ou trouvé en marche
+_conteneur_demarre = False
+_verrou_metriques = threading.Lock()
+_fichier_metriques = None
+
+
+def volumes_docker() -> list:
+    """Retourne les options ``-v`` communes aux moteurs Docker."""
+    volumes = [
+        f'{os.path.abspath(os.getcwd())}:/config',
+        '/mnt/medias_0:/mnt/medias_0',
+        '/mnt/médias-voute:/mnt/médias-voute',
+        f'{str(config.TRANSCODE_DIR)}:/tmp/transcode',
+    ]
+    # Répertoires de travail hors de TRANSCODE_DIR, montés au même chemin
+    for nom in ('PREPARATION_DIR', 'MEZZANINE_DIR'):
+        repertoire = getattr(config, nom, None)
+        if repertoire:
+            volumes.append(f'{repertoire}:{repertoire}')
+    for repertoire in getattr(config, 'VOLUMES_DOCKER_SUPPLEMENTAIRES', []):
+        volumes.append(f'{repertoire}:{repertoire}')
+
+    options = []
+    for volume in volumes:
+        options += ['-v', volume]
+    return options
+
+
+def repertoire_metriques():
+    """Répertoire des fichiers de métriques (``None`` désactive l'écriture)."""
+    return getattr(config, 'METRIQUES_DIR', Path.cwd() / 'metriques')
+
+
+def fichier_metriques():
+    """Fichier JSON lines propre à l'exécution courante du script."""
+    global _fichier_metriques
+    with _verrou_metriques:
+        if _fichier_metriques is None:
+            horodatage = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+            nom_script = Path(sys.argv[0]).stem or 'python'
+            _fichier_metriques = Path(repertoire_metriques()) / f'{horodatage}_{nom_script}_{os.getpid()}.jsonl'
+        return _fichier_metriques
+
+
+def enregistrer_metriques(enregistrement: dict):
+    """Ajoute un enregistrement au fichier de métriques de l'exécution."""
+    if repertoire_metriques() is None:
+        return
+    chemin = fichier_metriques()
+    with _verrou_metriques:
+        chemin.parent.mkdir(parents=True, exist_ok=True)
+        with open(chemin, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(enregistrement, ensure_ascii=False) + '\n')
+
+
+def _nombre(valeur, suffixe=''):
+    """Convertit une valeur de ``-progress`` (« 1.5x », « N/A »...) en nombre."""
+    if valeur is None:
+        return None
+    try:
+        return float(valeur.strip().removesuffix(suffixe))
+    except ValueError:
+        return None
+
+
+def _attendre(processus):
+    """Attend la fin du processus et retourne son utilisation des ressources."""
+    if hasattr(os, 'wait4'):
+        _, statut, usage = os.wait4(processus.pid, 0)
+        processus.returncode = os.waitstatus_to_exitcode(statut)
+        return usage
+    processus.wait()
+    return None
+
+
+def _lancer(commande_complete, capturer, moteur, etiquettes):
+    """Lance la commande, suit sa progression et retourne un ``Resultat``."""
+    debut = time.monotonic()
+    processus = subprocess.Popen(
+        commande_complete,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE if capturer else None,
+        text=True, encoding='utf-8', errors='replace'
+    )
+
+    # La sortie d'erreur est lue en parallèle pour éviter un blocage
+    erreurs = []
+    lecteur = None
+    if capturer:
+        lecteur = threading.Thread(target=lambda: erreurs.append(processus.stderr.read()), daemon=True)
+        lecteur.start()
+
+    progression = {}
+    for ligne in processus.stdout:
+        cle, _, valeur = ligne.strip().partition('=')
+        if cle:
+            progression[cle] = valeur
+
+    usage = _attendre(processus)
+    if lecteur:
+        lecteur.join()
+    duree = time.monotonic() - debut
+
+    # Le temps CPU d'un conteneur n'est pas visible depuis l'hôte
+    mesure_locale = usage is not None and moteur == 'local'
+    duree_sortie_us = _nombre(progression.get('out_time_us'))
+    enregistrement = {
+        'horodatage': datetime.datetime.now().isoformat(timespec='seconds'),
+        'moteur': moteur,
+        **(etiquettes or {}),
+        'code': processus.returncode,
+        'temps_reel_s': round(duree, 3),
+        'temps_cpu_s': round(usage.ru_utime + usage.ru_stime, 3) if mesure_locale else None,
+        'rss_max_ko': usage.ru_maxrss if mesure_locale else None,
+        'images': _nombre(progression.get('frame')),
+        'fps': _nombre(progression.get('fps')),
+        'vitesse': _nombre(progression.get('speed'), 'x'),
+        'debit_kbits': _nombre(progression.get('bitrate'), 'kbits/s'),
+        'octets_ecrits': _nombre(progression.get('total_size')),
+        'duree_sortie_s': round(duree_sortie_us / 1e6, 3) if duree_sortie_us else None,
+    }
+    enregistrer_metriques(enregistrement)
+    print(
+        f"ffmpeg terminé (code {processus.returncode}) en {duree:.1f} s"
+        f" - fps={enregistrement['fps']} vitesse={enregistrement['vitesse']}x"
+    )
+
+    return Resultat(processus.returncode, erreurs[0] if erreurs else None, bool(progression))
+
+
+def commande_local(command) -> list:
+    """Commande complète pour le binaire ``ffmpeg`` local."""
+    binaire = shutil.which('ffmpeg')
+    if binaire is None:
+        raise FileNotFoundError("Aucun binaire 'ffmpeg' trouvé dans le PATH.")
+    return [binaire] + command
+
+
+def commande_docker(command) -> list:
+    """Commande complète lançant un nouveau conteneur pour cet appel."""
+    return [
+        'docker', 'run', '--rm',
+        '--device=/dev/dri:/dev/dri',
+    ] + volumes_docker() + [
+        '--user', '0:0',  # Exécute le conteneur en tant que root
+        IMAGE_DOCKER,
+    ] + command
+
+
+def prefixe_conteneur() -> str:
+    """Préfixe du nom des conteneurs persistants."""
+    return getattr(config, 'CONTENEUR_FFMPEG', 'telelimoilou-ffmpeg')
+
+
+def nom_conteneur() -> str:
+    """Nom du conteneur persistant du processus courant."""
+    return f'{prefixe_conteneur()}-{os.getpid()}'
+
+
+def _processus_actif(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def retirer_conteneurs_orphelins():
+    """Retire les conteneurs persistants des processus terminés."""
+    prefixe = prefixe_conteneur()
+    resultat = subprocess.run(
+        ['docker', 'ps', '-a', '--filter', f'name=^/{prefixe}-', '--format', '{{.Names}}'],
+        capture_output=True, text=True
+    )
+    for nom in resultat.stdout.split():
+        pid = nom.removeprefix(f'{prefixe}-')
+        if pid.isdigit() and not _processus_actif(int(pid)):
+            print(f"Conteneur ffmpeg abandonné retiré : {nom}")
+            subprocess.run(['docker', 'rm', '-f', nom], capture_output=True)
+
+
+def conteneur_actif() -> bool:
+    """Indique si le conteneur persistant est en cours d'exécution."""
+    resultat = subprocess.run(
+        ['docker', 'inspect', '-f', '{{.State.Running}}', nom_conteneur()],
+        capture_output=True, text=True
+    )
+    return resultat.returncode == 0 and resultat.stdout.strip() == 'true'
+
+
+def demarrer_conteneur(verifier: bool = False):
+    """Démarre le conteneur persistant s'il ne tourne pas déjà.
+
+    Une fois le conteneur connu comme actif, l'appel ne coûte rien; avec
+    ``verifier``, son état est de nouveau demandé à Docker.
+    """
+    global _conteneur_demarre
+    if _conteneur_demarre and not verifier:
+        return
+    with _verrou_conteneur:
+        if _conteneur_demarre and not verifier:
+            return
+        if conteneur_actif():
+            _conteneur_demarre = True
+            return
+        retirer_conteneurs_orphelins()
+        # Un conteneur arrêté portant le même nom empêcherait le démarrage
+        subprocess.run(['docker', 'rm', '-f', nom_conteneur()], capture_output=True)
+        commande = [
+            'docker', 'run', '-d', '--rm',
+            '--name', nom_conteneur(),
+            '--device=/dev/dri:/dev/dri',
+        ] + volumes_docker() + [
+            '--user', '0:0',
+            '--entrypoint', 'sleep',
+            IMAGE_DOCKER, 'infinity',
+        ]
+        print(f"Démarrage du conteneur ffmpeg persistant : {' '.join(commande)}")
+        subprocess.run(commande, check=True, capture_output=True)
+        if not _conteneur_demarre:
+            # Le conteneur n'appartient qu'à ce processus : il est arrêté à sa sortie
+            atexit.register(arreter_conteneur)
+        _conteneur_demarre = True
+
+
+def arreter_conteneur():
+    """Arrête le conteneur persistant du processus courant."""
+    global _conteneur_demarre
+    with _verrou_conteneur:
+        subprocess.run(['docker', 'rm', '-f', nom_conteneur()], capture_output=True)
+        _conteneur_demarre = False
+
+
+def commande_docker_persistant(command) -> list:
+    """Commande complète exécutée dans le conteneur persistant."""
+    demarrer_conteneur()
+    binaire = getattr(config, 'COMMANDE_FFMPEG_CONTENEUR', 'ffmpeg')
+    return ['docker', 'exec', nom_conteneur(), binaire] + command
+
+
+MOTEURS = {
+    'local': commande_local,
+    'docker': commande_docker,
+    'docker-persistant': commande_docker_persistant,
+}
+
+
+def nom_moteur() -> str:
+    """Retourne le moteur effectif, en résolvant la valeur « auto »."""
+    moteur = getattr(config, 'EXECUTEUR_FFMPEG', 'auto').lower()
+    if moteur == 'auto':
+        return 'docker' if platform.system() == 'Linux' else 'local'
+    if moteur not in MOTEURS:
+        raise ValueError(f"Moteur ffmpeg inconnu : {moteur}")
+    return moteur
+
+
+def executer(command, capturer=False, moteur=None, etiquettes=None) -> Resultat:
+    """Exécute ``ffmpeg`` avec les arguments ``command``.
+
+    Avec ``capturer=True``, la sortie d'erreur de ffmpeg est retournée dans
+    le résultat au lieu d'être affichée. ``etiquettes`` (émission, segment,
+    codec...) accompagne les métriques de cette exécution.
+    """
+    moteur = moteur or nom_moteur()
+    commande_complete = MOTEURS[moteur](['-progress', 'pipe:1', '-nostats'] + command)
+    print(f"Exécution de la commande ({moteur}) : {' '.join(commande_complete)}")
+    resultat = _lancer(commande_complete, capturer, moteur, etiquettes)
+    if (moteur == 'docker-persistant' and resultat.returncode != 0 and not resultat.demarre
+            and not conteneur_actif()):
+        # ffmpeg n'a pas pu démarrer car le conteneur a disparu (redémarrage de
+        # Docker...) : il est relancé une fois. Un ffmpeg qui a commencé son
+        # travail n'est jamais relancé.
+        print("Le conteneur ffmpeg persistant ne tourne plus; nouvelle tentative.")
+        demarrer_conteneur(verifier=True)
+        resultat = _lancer(commande_complete, capturer, moteur, etiquettes)
+    return resultat
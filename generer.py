@@ -2,9 +2,7 @@ import os
 import json
 import random
 import sys
-import copy
 from datetime import datetime, timedelta
-from plexapi.server import PlexServer
 from pathlib import Path
 import platform
 
@@ -15,13 +13,14 @@ except ImportError:
     sys.exit(1)
 
 from utils import verifier_fichier_existe
+import catalogue
+import client_plex
+import journal_etat
 
 python_path = sys.executable  # Donne le chemin du python actif
 
-# Connexion au serveur Plex
-baseurl = config.PLEX_BASEURL
-token = config.PLEX_TOKEN
-plex = PlexServer(baseurl, token)
+# La connexion à Plex (client_plex) n'est établie que si un épisode n'est pas
+# résolu dans bd_videos.json (fichier produit par une version antérieure du scanneur)
 
 
 def main():
@@ -57,11 +56,13 @@ def main():
     # Charger les données à partir des fichiers JSON
     verifier_fichier_existe('emissions_def.json')
     verifier_fichier_existe('bd_videos.json')
-    emissions_data = load_json_data('emissions_def.json')
-    bdvideos_data = load_json_data('bd_videos.json')
+    emissions_data, bdvideos_data = catalogue.charger_donnees()
+    # Seul le modèle compact du catalogue reste en mémoire
+    series = catalogue.Catalogue(emissions_data, bdvideos_data)
+    del bdvideos_data
 
     # Traiter les émissions
-    emissions_info = process_emissions(num_loops, date_obj, emissions_data, bdvideos_data)
+    emissions_info = process_emissions(num_loops, date_obj, emissions_data, series)
 
     # Écrire les informations dans un fichier JSON
     write_json_data('listegeneration.json', emissions_data)
@@ -76,20 +77,12 @@ def load_json_data(filename):
 def write_json_data(filename, data):
     """Enregistre les données JSON dans un fichier.
 
-    Une copie profonde des données est utilisée afin de préserver la structure
-    originale. La clé ``series`` est retirée pour alléger le fichier de sortie.
+    La clé ``series`` est écartée pour alléger le fichier de sortie, sans
+    copier ni modifier les données. L'écriture est atomique et remplace
+    aussi le journal des changements d'état du fichier précédent.
     """
-    # Créez une copie profonde des données pour éviter de modifier les données originales
-    data_copy = copy.deepcopy(data)
-
-    # Supprimez la classe "series" du dictionnaire "data_copy"
-    if "series" in data_copy:
-        del data_copy["series"]
-
-    # Ouvrir le fichier pour écrire les données JSON
     try:
-        with open(filename, 'w', encoding='utf-8') as file:
-            json.dump(data_copy, file, ensure_ascii=False, indent=4)
+        journal_etat.ecrire(filename, data, exclure=("series",))
     except Exception as e:
         print(f"Erreur lors de la sauvegarde du fichier JSON : {e}")
 
@@ -99,61 +92,87 @@ def process_emissions(num_loops, date_obj, emissions_data, bdvideos_data):
     * ``num_loops`` définit le nombre de passages sur la liste des émissions.
     * ``date_obj`` indique la date de diffusion du premier épisode.
     * ``emissions_data`` contient la description des émissions à produire.
-    * ``bdvideos_data`` référence les fichiers ou épisodes Plex disponibles.
+    * ``bdvideos_data`` référence les fichiers ou épisodes Plex disponibles
+      (contenu de ``bd_videos.json`` ou ``catalogue.Catalogue`` déjà construit).
 
     La fonction assemble pour chaque émission la liste des segments vidéo à
     utiliser et met à jour l'information sur le prochain épisode à jouer.
+
+    Le calcul ne suit plus les segments un à un : les séries de chaque
+    segment sont résolues une seule fois, les épisodes séquentiels de tout
+    l'horizon sont obtenus en forme close (``catalogue.Serie.positions``)
+    et les tirages aléatoires sont faits d'un bloc, dans l'ordre des
+    segments. Pour une même graine de ``random``, le résultat est identique
+    à celui d'un parcours segment par segment.
     """
+    # Séries indexées par nom, pointeur séquentiel compris
+    if isinstance(bdvideos_data, catalogue.Catalogue):
+        series = bdvideos_data
+    else:
+        series = catalogue.Catalogue(emissions_data, bdvideos_data)
+
+    # Un passage sur la liste des émissions : séries de chaque segment, résolues une seule fois
+    gabarits = []
+    passages = {}
+    introuvables = []
+    for emission in emissions_data["emissions"]:
+        segments = []
+        for segment in emission["segments"]:
+            serie = series.serie(segment["série"])
+            if serie is None or serie.episodes is None:
+                if segment["série"] not in introuvables:
+                    introuvables.append(segment["série"])
+                serie = None
+            elif serie.ordre == "sequentiel":
+                passages[serie.nom] = passages.get(serie.nom, 0) + num_loops
+            segments.append((segment["série"], serie))
+        description = " | ".join(nom for nom, _ in segments if nom not in ["Fin", "Transitions", "Intros"])
+        gabarits.append((emission, description, segments))
+    for serie_name in introuvables:
+        print(f"La série '{serie_name}' n'a pas été trouvée dans bdvideos_data.")
+
+    # Épisodes séquentiels de tout l'horizon, série par série
+    sequentiels = {nom: iter(series.serie(nom).positions(nombre)) for nom, nombre in passages.items()}
+    # Tirages aléatoires dans l'ordre des segments : random.choice(range(n)) consomme
+    # le générateur exactement comme random.choice sur une liste de n épisodes
+    tirages = [
+        random.choice(range(len(serie.episodes)))
+        for _ in range(num_loops)
+        for _, _, segments in gabarits
+        for _, serie in segments
+        if serie is not None and serie.ordre != "sequentiel"
+    ]
+    aleatoires = iter(tirages)
+
+    # Un épisode revient souvent sur un long horizon : son chemin n'est résolu qu'une fois
+    chemins = {}
     emissions_info = []
-
     for _ in range(num_loops):
-        for emission in emissions_data["emissions"]:
-            series_list = []
+        for emission, description, segments in gabarits:
             videos_list = []
             aincrementer_list = []
             id_plex_list = []
-
-            for segment in emission["segments"]:
-                serie_name = segment["série"]
-
-                if serie_name not in ["Fin", "Transitions", "Intros"]:
-                    series_list.append(serie_name)
-
-                serie = find_serie(serie_name, bdvideos_data)
-                serie_def, ordre_serie = find_serie_def(serie_name, emissions_data)
-                print(f"Ordre '{ordre_serie}' '{serie_name}'  ")
-                if serie:
-                    if ordre_serie == "sequentiel":
-                        print(f"sequentiel")
-                        prochain_episode = serie_def.get("prochain", 1)
-                        video_choisie, id_plex = get_video_path(serie.get("fichiers", [])[prochain_episode - 1])
-                        if id_plex:
-                            id_plex_list.append(id_plex)
-                        prochain_episode += 1
-                        print(f"on incrémente")
-
-                        if prochain_episode > serie_def.get("nb_episodes", 1):
-                            prochain_episode = 1
-                            print(f"on revient a 1 ")
-
-                        serie_def["prochain"] = prochain_episode
-                        aincrementer_list.append(serie_name)
-                    else:
-                        print(f"aleatoire")
-                        video_choisie, id_plex = get_video_path(random.choice(serie.get("fichiers", [])))
-                        if id_plex:
-                            id_plex_list.append(id_plex)
-                    videos_list.append(video_choisie)
+            for serie_name, serie in segments:
+                if serie is None:
+                    continue
+                if serie.ordre == "sequentiel":
+                    rang = next(sequentiels[serie.nom]) - 1
+                    aincrementer_list.append(serie_name)
                 else:
-                    print(f"La série '{serie_name}' n'a pas été trouvée dans bdvideos_data.")
+                    rang = next(aleatoires)
+                cle = (serie.nom, rang)
+                if cle not in chemins:
+                    video_choisie, id_plex = get_video_path(serie.episodes[rang], serie.plex)
+                    # Appliquer map_path pour mapper les chemins pour chaque système d'exploitation
+                    chemins[cle] = (map_path(video_choisie), id_plex)
+                video_choisie, id_plex = chemins[cle]
+                if id_plex:
+                    id_plex_list.append(id_plex)
+                videos_list.append(video_choisie)
 
-            # Appliquer map_path pour mapper les chemins pour chaque système d'exploitation
-            videos_list = [map_path(video) for video in videos_list]
-
-            description = " | ".join(series_list)
             emission_info = {
                 "no": emission["no"],
-                "date_diffusion": date_obj.strftime('%Y-%m-%d'),
+                "date_diffusion": (date_obj + timedelta(days=len(emissions_info))).strftime('%Y-%m-%d'),
                 "titre": emission["titre"],
                 "description": description,
                 "fichiers_concatenes": videos_list,
@@ -162,37 +181,32 @@ def process_emissions(num_loops, date_obj, emissions_data, bdvideos_data):
                 "id_plex": id_plex_list  # Ajouter les identifiants Plex
             }
             emissions_info.append(emission_info)
-            date_obj += timedelta(days=1)
+
+    for nom, nombre in passages.items():
+        series.serie(nom).avancer(nombre)
+    print(f"Planification de {len(emissions_info)} émission(s) : {sum(passages.values())} épisode(s) "
+          f"séquentiel(s), {len(tirages)} tirage(s) aléatoire(s).")
 
     emissions_data["emissions"] = emissions_info
     return emissions_info
 
-def find_serie(serie_name, bdvideos_data):
-    """Recherche une série par son nom dans la base vidéo."""
-    for series in bdvideos_data.get("series", []):
-        if series.get("nom") == serie_name:
-            return series
-    return None
-
-def find_serie_def(serie_name, emissions_data):
-    """Retourne la définition d'une série et son ordre de lecture."""
-    for series in emissions_data.get("series", []):
-        if series.get("nom") == serie_name:
-            return series, series.get("ordre")
-    return None, None
-
-def get_video_path(file_entry):
+def get_video_path(file_entry, episodes_plex=None):
     """Obtient le chemin réel d'un fichier vidéo.
 
-    Si ``file_entry`` commence par ``PLEX-ÉPISODE:``, l'identifiant est
-    utilisé pour récupérer le fichier correspondant dans Plex puis le
-    chemin est ajusté avec le bon point de montage. La fonction retourne
-    le chemin final et éventuellement l'identifiant de l'épisode.
+    Si ``file_entry`` commence par ``PLEX-ÉPISODE:``, le chemin du fichier
+    est lu dans ``episodes_plex`` (la clé ``plex`` de la série dans
+    ``bd_videos.json``), sans requête réseau. À défaut, l'épisode est
+    demandé à Plex. Le chemin est ensuite ajusté avec le bon point de
+    montage. La fonction retourne le chemin final et éventuellement
+    l'identifiant de l'épisode.
     """
     if file_entry.startswith("PLEX-ÉPISODE:"):
         episode_id = file_entry.split(":")[1]
-        episode = plex.library.fetchItem(int(episode_id))
-        file_path = episode.media[0].parts[0].file
+        episode = (episodes_plex or {}).get(episode_id)
+        if episode and episode.get("fichier"):
+            file_path = episode["fichier"]
+        else:
+            file_path = client_plex.serveur().library.fetchItem(int(episode_id)).media[0].parts[0].file
 
         # Ajouter le point de montage approprié selon l'OS
         file_path = add_mount_point(file_path)
@@ -11,6 +11,7 @@ except ImportError:
     sys.exit(1)
 
 from utils import verifier_fichier_existe
+import journal_etat
 
 python_path = sys.executable  # Donne le chemin du python actif
 
@@ -271,16 +272,13 @@ def generate_image_description(text, api_choice):
 def load_messages():
     """Charge le fichier ``messages.json`` s'il existe."""
     try:
-        with open("messages.json", "r", encoding="utf-8") as file:
-            data = json.load(file)
-            return data["Messages"]
+        return journal_etat.charger("messages.json")["Messages"]
     except FileNotFoundError:
         return {}
 
 def save_messages(data):
     """Sauvegarde la structure des messages dans ``messages.json``."""
-    with open("messages.json", "w", encoding="utf-8") as file:
-        json.dump(data, file, ensure_ascii=False, indent=2)
+    journal_etat.ecrire("messages.json", data, indent=2)
 
 
 def main():
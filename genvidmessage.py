@@ -3,7 +3,6 @@
 Ce script lit ``messages.json`` pour créer une vidéo comportant une image
 et un enregistrement audio pour chaque message non encore généré.
 """
-import json
 import os
 import shutil
 from pathlib import Path
@@ -25,6 +24,9 @@ except ImportError:
     sys.exit(1)
 
 from utils import verifier_fichier_existe
+import index_medias
+import journal_etat
+import transcode
 
 # Détecter le système d'exploitation
 os_name = config.OS_NAME
@@ -53,8 +55,7 @@ args = parser.parse_args()
 
 # Charger les messages
 verifier_fichier_existe(str(messages_file_path))
-with open(messages_file_path, 'r', encoding='utf-8') as file:
-    data = json.load(file)
+data = journal_etat.charger(messages_file_path)
 
 # Fonctions utilitaires
 
@@ -86,6 +87,10 @@ def generate_image_from_prompt(client, prompt_text, output_path, max_attempts=3)
                 print("Échec après plusieurs tentatives.")
                 return False
 
+def marquer_genere(category, indice):
+    """Marque un message comme généré en l'ajoutant au journal de ``messages.json``."""
+    journal_etat.modifier(messages_file_path, data, ('Messages', category), indice, indent=2, genere=True)
+
 # Traitement principal
 stop_processing = False
 for category, messages in data['Messages'].items():
@@ -94,7 +99,7 @@ for category, messages in data['Messages'].items():
     for i in range(args.iterations):
         if stop_processing:
             break
-        for message in messages:
+        for indice, message in enumerate(messages):
             if isinstance(message, dict) and not message['genere']:
                 print(f"Génération de la vidéo pour le message {message['id']}...")
 
@@ -128,7 +133,7 @@ for category, messages in data['Messages'].items():
 
                 if not audio_generated:
                     print(f"Échec de génération de l'audio pour {message['id']} après 3 tentatives. Passage au message suivant.")
-                    message['genere'] = True
+                    marquer_genere(category, indice)
                     continue
 
                 # Génération ou téléchargement de l'image
@@ -161,16 +166,13 @@ for category, messages in data['Messages'].items():
 
                 if not image_generated:
                     print(f"Échec image pour {message['id']}. Passage au message suivant.")
-                    message['genere'] = True
+                    marquer_genere(category, indice)
                     continue
 
                 print(image_description)
 
                 # Définir la durée de l'audio
-                audio_duration = float(subprocess.check_output(
-                    ["ffprobe", "-v", "error", "-show_entries", "format=duration",
-                     "-of", "default=noprint_wrappers=1:nokey=1", str(speech_file_path)]
-                ).strip())
+                audio_duration = index_medias.obtenir(str(speech_file_path), persister=False)['duree']
 
                 # Déplacer les anciens fichiers vidéos vers l'archive
                 for filename in os.listdir(output_dir):
@@ -187,6 +189,9 @@ for category, messages in data['Messages'].items():
                 # Création de la vidéo
                 silence_file_path = str(Path.cwd() / "silence.mp3")
                 output_path = output_dir / "message.mp4"
+                # Le message est produit directement au format de diffusion
+                # pour que transcode.py puisse le copier sans réencodage.
+                largeur, hauteur = transcode.obtenir_resolution(config.FORMAT_SORTIE)
                 ffmpeg_command = [
                     "ffmpeg",
                     "-threads", "1",
@@ -199,11 +204,15 @@ for category, messages in data['Messages'].items():
                     f"[1]adelay=2000|2000[a1];[2]adelay=0|0[a2];[3]adelay={int(audio_duration * 1000) + 2000}|{int(audio_duration * 1000) + 2000}[a3];[a2][a1][a3]amix=inputs=3[audio]",
                     "-map", "0:v",
                     "-map", "[audio]",
-                    "-c:v", "libx264",
+                    "-c:v", transcode.choisir_codec(config.CODEC_VIDEO, config.ACCEL_INTEL),
                     "-t", str(audio_duration + 4),
                     "-pix_fmt", "yuv420p",
-                    "-vf", "scale=1280:720",
-                    "-r", "24",
+                    "-vf", f"scale={largeur}:{hauteur},setsar=1:1",
+                    "-r", "24000/1001",
+                    "-c:a", "aac",
+                    "-b:a", "128k",
+                    "-ar", "48000",
+                    "-ac", "2",
                     "-shortest",
                     str(output_path)
                 ]
@@ -222,11 +231,8 @@ for category, messages in data['Messages'].items():
                         shutil.move(file_path, archive_path)
                         print(f"Fichier {filename} archivé.")
 
-                message['genere'] = True
+                marquer_genere(category, indice)
                 stop_processing = True
                 break
 
-# Sauvegarder les changements
-with open(messages_file_path, 'w', encoding='utf-8') as file:
-    json.dump(data, file, ensure_ascii=False, indent=2)
 print("Traitement terminé.")
@@ -0,0 +1,306 @@
+"""Index persistant des métadonnées ffprobe des fichiers vidéo.
+
+``scanneurvid.py`` sonde une seule fois chaque fichier nouveau ou modifié
+et conserve le résultat dans ``index_medias.json``. Les autres scripts
+(transcodage, chapitres, messages) lisent cet index et ne relancent
+``ffprobe`` que si le fichier est absent de l'index ou a changé depuis.
+Des valeurs calculées plus coûteuses, comme la mesure d'intensité
+sonore, peuvent aussi y être rattachées à un fichier.
+
+Chaque entrée est indexée par chemin et n'est valide que si la taille et
+la date de modification du fichier correspondent à celles enregistrées.
+
+Plusieurs scripts (transcodage, mezzanine, messages) complètent l'index en
+même temps. Les entrées nouvelles ou modifiées sont écrites par lots, au
+plus toutes les ``DELAI_SAUVEGARDE`` secondes et à la fin du script, et
+chaque écriture les fusionne avec l'index relu sur disque : les sondes des
+autres processus ne sont pas perdues.
+"""
+import atexit
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    import config
+except ImportError:
+    print("Le fichier 'config.py' est manquant. Copiez 'config.py.sample' puis personnalisez-le.")
+    sys.exit(1)
+
+from utils import ecrire_json_atomique
+
+# Délai minimal entre deux écritures de l'index pendant un script (secondes)
+DELAI_SAUVEGARDE = 30
+
+_verrou = threading.RLock()
+_index = None
+# Entrées des fichiers temporaires, conservées seulement en mémoire
+_memoire = {}
+# Chemins ajoutés, modifiés ou retirés depuis la dernière écriture
+_modifiees = set()
+_retirees = set()
+_derniere_sauvegarde = time.monotonic()
+
+
+def chemin_index() -> Path:
+    """Retourne l'emplacement du fichier d'index."""
+    return Path(getattr(config, 'INDEX_MEDIAS', Path.cwd() / 'index_medias.json'))
+
+
+def _lire() -> dict:
+    """Lit l'index sur disque (vide s'il est absent ou illisible)."""
+    try:
+        with open(chemin_index(), 'r', encoding='utf-8') as fichier:
+            return json.load(fichier)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError as e:
+        print(f"Index des médias illisible, il sera reconstruit : {e}")
+        return {}
+
+
+def _charger() -> dict:
+    """Charge l'index en mémoire lors du premier accès."""
+    global _index
+    with _verrou:
+        if _index is None:
+            _index = _lire()
+        return _index
+
+
+def _noter(chemin: str, retiree: bool = False):
+    """Note une entrée à écrire (ou à retirer) lors de la prochaine sauvegarde."""
+    with _verrou:
+        if retiree:
+            _modifiees.discard(chemin)
+            _retirees.add(chemin)
+        else:
+            _retirees.discard(chemin)
+            _modifiees.add(chemin)
+
+
+def sauvegarder():
+    """Écrit sur disque les changements de ce processus.
+
+    L'index est relu juste avant l'écriture et seules les entrées changées
+    ici le remplacent : les entrées ajoutées entre-temps par d'autres
+    processus sont conservées, et reprises dans l'index en mémoire.
+    """
+    global _derniere_sauvegarde
+    with _verrou:
+        if _index is None or not (_modifiees or _retirees):
+            return
+        fusion = _lire()
+        for chemin in _modifiees:
+            fusion[chemin] = _index[chemin]
+        for chemin in _retirees:
+            fusion.pop(chemin, None)
+        ecrire_json_atomique(chemin_index(), fusion, indent=None)
+        # Mise à jour sur place : les appelants gardent une référence à l'index
+        _index.clear()
+        _index.update(fusion)
+        _modifiees.clear()
+        _retirees.clear()
+        _derniere_sauvegarde = time.monotonic()
+
+
+def _sauvegarder_si_du():
+    """Écrit l'index si la dernière écriture date de plus de ``DELAI_SAUVEGARDE`` secondes."""
+    if time.monotonic() - _derniere_sauvegarde >= DELAI_SAUVEGARDE:
+        sauvegarder()
+
+
+# Les changements pas encore écrits le sont à la fin du script
+atexit.register(sauvegarder)
+
+
+def _identite(chemin: str):
+    stat = os.stat(chemin)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def sonder(chemin: str) -> dict:
+    """Lance ``ffprobe`` une seule fois et retourne les métadonnées utiles."""
+    commande = [
+        'ffprobe', '-v', 'error',
+        '-show_entries',
+        'format=duration:stream=codec_type,codec_name,width,height,'
+        'sample_aspect_ratio,r_frame_rate,pix_fmt,bit_rate,sample_rate,channels,'
+        'profile,level,codec_tag_string:stream_tags=encoder',
+        '-of', 'json',
+        str(Path(chemin))
+    ]
+    sortie = json.loads(subprocess.check_output(commande).decode('utf-8'))
+    flux = sortie.get('streams', [])
+    video = next((f for f in flux if f.get('codec_type') == 'video'), {})
+    audio = next((f for f in flux if f.get('codec_type') == 'audio'), {})
+    duree = sortie.get('format', {}).get('duration')
+
+    return {
+        'largeur': video.get('width'),
+        'hauteur': video.get('height'),
+        'sar': video.get('sample_aspect_ratio', 'N/A'),
+        'images_par_seconde': video.get('r_frame_rate'),
+        'codec_video': video.get('codec_name'),
+        'format_pixels': video.get('pix_fmt'),
+        'profil_video': video.get('profile'),
+        'niveau_video': video.get('level'),
+        'etiquette_video': video.get('codec_tag_string'),
+        # Encodeur noté par ffmpeg dans le flux (« Lavc61.3.100 libx265 »)
+        'encodeur_video': video.get('tags', {}).get('encoder'),
+        'debit_video': int(video['bit_rate']) // 1000 if str(video.get('bit_rate', '')).isdigit() else None,
+        'codec_audio': audio.get('codec_name'),
+        'frequence_audio': int(audio['sample_rate']) if audio.get('sample_rate') else None,
+        'canaux_audio': audio.get('channels'),
+        'duree': float(duree) if duree not in (None, 'N/A') else None,
+    }
+
+
+def _sonder_avec_identite(chemin: str):
+    """Sonde un fichier dans un processus du pool (erreurs retournées)."""
+    try:
+        taille, mtime = _identite(chemin)
+        entree = sonder(chemin)
+    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+        return chemin, None, str(e)
+    entree['taille'] = taille
+    entree['mtime'] = mtime
+    return chemin, entree, None
+
+
+def _entree_valide(chemin: str, entree: dict) -> bool:
+    try:
+        taille, mtime = _identite(chemin)
+    except OSError:
+        return False
+    return entree.get('taille') == taille and entree.get('mtime') == mtime
+
+
+def obtenir(chemin: str, persister: bool = True) -> dict:
+    """Retourne les métadonnées de ``chemin`` depuis l'index ou ``ffprobe``.
+
+    Avec ``persister=False``, le résultat n'est conservé qu'en mémoire, ce
+    qui convient aux fichiers temporaires.
+    """
+    chemin = str(chemin)
+    index = _charger()
+    with _verrou:
+        entree = index.get(chemin) or _memoire.get(chemin)
+    if entree is not None and _entree_valide(chemin, entree):
+        return entree
+
+    _, entree, erreur = _sonder_avec_identite(chemin)
+    if entree is None:
+        raise RuntimeError(f"Impossible de sonder '{chemin}' : {erreur}")
+    with _verrou:
+        if persister:
+            index[chemin] = entree
+            _noter(chemin)
+        else:
+            _memoire[chemin] = entree
+    if persister:
+        _sauvegarder_si_du()
+    return entree
+
+
+def mettre_a_jour(chemins, nb_processus=None, elaguer=True, modifies=None, empreintes=None):
+    """Sonde les fichiers nouveaux ou modifiés à l'aide d'un pool de processus.
+
+    Les entrées dont le chemin ne figure plus dans ``chemins`` sont retirées
+    lorsque ``elaguer`` est vrai. Si l'appelant connaît déjà les fichiers
+    modifiés (balayage incrémental), il les passe dans ``modifies`` : les
+    autres fichiers déjà indexés ne sont alors pas vérifiés un à un.
+    Les empreintes échantillonnées connues (chemin -> empreinte) sont
+    conservées dans les entrées, sous la clé ``empreinte``.
+    """
+    chemins = [str(chemin) for chemin in chemins]
+    index = _charger()
+    if modifies is None:
+        a_sonder = [chemin for chemin in chemins
+                    if chemin not in index or not _entree_valide(chemin, index[chemin])]
+    else:
+        modifies = {str(chemin) for chemin in modifies}
+        a_sonder = [chemin for chemin in chemins if chemin not in index or chemin in modifies]
+
+    if nb_processus is None:
+        nb_processus = getattr(config, 'SONDE_NB_PROCESSUS', None) or os.cpu_count() or 1
+
+    print(f"Index des médias : {len(a_sonder)} fichier(s) à sonder sur {len(chemins)}")
+    if a_sonder:
+        with ProcessPoolExecutor(max_workers=nb_processus) as pool:
+            for chemin, entree, erreur in pool.map(_sonder_avec_identite, a_sonder, chunksize=8):
+                if entree is None:
+                    print(f"Erreur lors de l'analyse de '{chemin}' : {erreur}")
+                    continue
+                index[chemin] = entree
+                _noter(chemin)
+
+    for chemin, empreinte in (empreintes or {}).items():
+        if chemin in index and index[chemin].get('empreinte') != empreinte:
+            index[chemin]['empreinte'] = empreinte
+            _noter(chemin)
+
+    if elaguer:
+        conserves = set(chemins)
+        for chemin in [chemin for chemin in index if chemin not in conserves]:
+            del index[chemin]
+            _noter(chemin, retiree=True)
+
+    sauvegarder()
+
+
+def reprendre(ancien: str, nouveau: str) -> bool:
+    """Associe à ``nouveau`` l'entrée de ``ancien``, dont le contenu est identique.
+
+    Sert aux fichiers déplacés ou renommés, et à ceux dont seule la date de
+    modification a changé (``ancien`` égal à ``nouveau``) : leur empreinte
+    n'a pas changé, ils n'ont pas à être sondés de nouveau. Retourne
+    ``False`` si ``ancien`` n'est pas indexé.
+    """
+    ancien, nouveau = str(ancien), str(nouveau)
+    index = _charger()
+    with _verrou:
+        entree = index.get(ancien)
+        if entree is None:
+            return False
+        try:
+            taille, mtime = _identite(nouveau)
+        except OSError:
+            return False
+        index[nouveau] = dict(entree, taille=taille, mtime=mtime)
+        _noter(nouveau)
+    return True
+
+
+def valeur(chemin: str, cle: str):
+    """Retourne une valeur calculée et conservée pour ``chemin`` (ou ``None``).
+
+    La valeur n'est retournée que si le fichier n'a pas changé depuis son
+    enregistrement.
+    """
+    chemin = str(chemin)
+    index = _charger()
+    with _verrou:
+        entree = index.get(chemin) or _memoire.get(chemin)
+    if entree is None or not _entree_valide(chemin, entree):
+        return None
+    return entree.get(cle)
+
+
+def enregistrer_valeur(chemin: str, cle: str, donnee, persister: bool = True):
+    """Associe une valeur calculée (mesure audio, analyse...) à ``chemin``."""
+    entree = obtenir(chemin, persister=persister)
+    chemin = str(chemin)
+    with _verrou:
+        entree[cle] = donnee
+        index = _charger()
+        if persister and chemin in index:
+            # Une sauvegarde a pu remplacer l'entrée par celle relue sur disque
+            index[chemin] = entree
+            _noter(chemin)
+    _sauvegarder_si_du()
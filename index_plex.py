@@ -0,0 +1,194 @@
+"""Synchronisation incrémentale des séries Plex.
+
+Les épisodes de chaque série ``PLEX-SÉRIE:`` suivie sont conservés dans
+``index_plex.json``, avec pour chaque bibliothèque un repère : la plus
+récente date d'ajout ou de mise à jour (``addedAt``/``updatedAt``) vue
+pendant les synchronisations précédentes. Un balayage n'interroge Plex que
+pour :
+
+* les séries suivies, en une seule requête, afin de connaître leur
+  bibliothèque et leur nombre d'épisodes (``leafCount``), qui change
+  lorsqu'un épisode est retiré;
+* les épisodes ajoutés ou mis à jour depuis le repère, une requête par
+  bibliothèque.
+
+Seules les séries touchées sont relues en entier; les autres sont servies
+depuis l'index. Toute modification faite après une lecture porte une date
+postérieure à celles déjà vues : relever le repère à la plus récente date
+observée ne fait donc manquer aucun changement.
+"""
+import datetime
+import json
+import sys
+import threading
+from pathlib import Path
+
+try:
+    import config
+except ImportError:
+    print("Le fichier 'config.py' est manquant. Copiez 'config.py.sample' puis personnalisez-le.")
+    sys.exit(1)
+
+from utils import ecrire_json_atomique
+import client_plex
+
+# Marge (en secondes) retirée du repère pour ne pas manquer une mise à jour
+# survenue dans la même seconde que la précédente
+MARGE_REPERE = 1
+
+_verrou = threading.RLock()
+_index = None
+# Séries demandées pendant l'exécution, pour élaguer les autres
+_visitees = set()
+# Bibliothèque de chaque série, connue après series_inchangees()
+_bibliotheques = {}
+
+
+def chemin_index() -> Path:
+    """Retourne l'emplacement du fichier d'index."""
+    return Path(getattr(config, 'INDEX_PLEX', Path.cwd() / 'index_plex.json'))
+
+
+def _index_vide() -> dict:
+    return {'bibliotheques': {}, 'series': {}}
+
+
+def _charger() -> dict:
+    """Charge l'index en mémoire lors du premier accès."""
+    global _index
+    with _verrou:
+        if _index is None:
+            try:
+                with open(chemin_index(), 'r', encoding='utf-8') as fichier:
+                    _index = json.load(fichier)
+            except FileNotFoundError:
+                _index = _index_vide()
+            except json.JSONDecodeError as e:
+                print(f"Index Plex illisible, il sera reconstruit : {e}")
+                _index = _index_vide()
+        return _index
+
+
+def reinitialiser():
+    """Oublie les repères et les épisodes conservés (synchronisation complète)."""
+    global _index
+    with _verrou:
+        _index = _index_vide()
+
+
+def sauvegarder(elaguer: bool = True):
+    """Écrit l'index sur disque.
+
+    Avec ``elaguer``, les séries qui n'ont pas été demandées pendant
+    l'exécution sont retirées.
+    """
+    with _verrou:
+        if _index is None:
+            return
+        if elaguer:
+            for serie in [serie for serie in _index['series'] if serie not in _visitees]:
+                del _index['series'][serie]
+        ecrire_json_atomique(chemin_index(), _index, indent=None)
+
+
+def _relever_repere(bibliotheque, horodatage):
+    """Relève le repère de ``bibliotheque`` à ``horodatage`` s'il est plus récent."""
+    if bibliotheque is None or horodatage is None:
+        return
+    with _verrou:
+        reperes = _charger()['bibliotheques']
+        if horodatage > reperes.get(bibliotheque, 0):
+            reperes[bibliotheque] = horodatage
+
+
+def _horodatage(element):
+    """Plus récente date d'ajout ou de mise à jour d'un élément Plex, en secondes."""
+    dates = [date for date in (element.updatedAt, element.addedAt) if date]
+    return int(max(dates).timestamp()) if dates else None
+
+
+def series_inchangees(series_ids) -> dict:
+    """Retourne les épisodes conservés des séries qui n'ont pas changé.
+
+    Le résultat associe à chaque identifiant de série inchangée la liste
+    des identifiants ``PLEX-ÉPISODE:`` et le dictionnaire des épisodes, dans
+    le format de ``scanneurvid.get_plex_episodes``. Les séries absentes du
+    résultat doivent être relues, puis notées avec ``enregistrer``.
+    """
+    series_ids = [str(series_id) for series_id in series_ids]
+    index = _charger()
+    with _verrou:
+        _visitees.update(series_ids)
+    if not series_ids:
+        return {}
+
+    serveur = client_plex.serveur()
+    try:
+        series = serveur.fetchItems([int(series_id) for series_id in series_ids])
+    except Exception as e:
+        print(f"Synchronisation Plex incrémentale impossible, les séries seront relues : {e}")
+        return {}
+
+    modifiees = set()
+    series_par_bibliotheque = {}
+    for serie in series:
+        cle = str(serie.ratingKey)
+        bibliotheque = str(serie.librarySectionID)
+        with _verrou:
+            _bibliotheques[cle] = bibliotheque
+        series_par_bibliotheque.setdefault(bibliotheque, []).append(cle)
+        entree = index['series'].get(cle)
+        # Un épisode retiré ne figure pas parmi les mises à jour : il change le nombre d'épisodes
+        if entree is None or entree['bibliotheque'] != bibliotheque or len(entree['episodes']) != serie.leafCount:
+            modifiees.add(cle)
+
+    for bibliotheque, cles in series_par_bibliotheque.items():
+        repere = index['bibliotheques'].get(bibliotheque)
+        if repere is None:
+            # Première synchronisation de cette bibliothèque
+            modifiees.update(cles)
+            continue
+        depuis = datetime.datetime.fromtimestamp(repere - MARGE_REPERE)
+        print(f"Épisodes de la bibliothèque Plex {bibliotheque} modifiés depuis le {depuis:%Y-%m-%d %H:%M:%S}")
+        try:
+            episodes = serveur.library.sectionByID(int(bibliotheque)).search(
+                libtype='episode', filters={'updatedAt>>': depuis}
+            )
+        except Exception as e:
+            print(f"Impossible d'obtenir les mises à jour de la bibliothèque Plex {bibliotheque} : {e}")
+            modifiees.update(cles)
+            continue
+        for episode in episodes:
+            _relever_repere(bibliotheque, _horodatage(episode))
+            # Avec la marge, les épisodes déjà vus au repère reviennent : ils sont ignorés
+            entree = index['series'].get(str(episode.grandparentRatingKey))
+            connu = entree and entree['episodes'].get(str(episode.ratingKey))
+            maj = int(episode.updatedAt.timestamp()) if episode.updatedAt else None
+            if not connu or connu.get('maj') != maj:
+                modifiees.add(str(episode.grandparentRatingKey))
+
+    inchangees = {}
+    for serie in series:
+        cle = str(serie.ratingKey)
+        if cle in modifiees:
+            # Une série touchée est relue en entier, même si la relecture échoue
+            with _verrou:
+                index['series'].pop(cle, None)
+            continue
+        episodes = index['series'][cle]['episodes']
+        inchangees[cle] = ([f"PLEX-ÉPISODE:{episode_id}" for episode_id in episodes], episodes)
+    print(f"Séries Plex inchangées : {len(inchangees)} sur {len(series_ids)}")
+    return inchangees
+
+
+def enregistrer(series_id, episodes: dict):
+    """Conserve les épisodes d'une série relue en entier."""
+    cle = str(series_id)
+    with _verrou:
+        bibliotheque = _bibliotheques.get(cle)
+        if bibliotheque is None:
+            # Bibliothèque inconnue : la série sera relue au prochain balayage
+            return
+        _charger()['series'][cle] = {'bibliotheque': bibliotheque, 'episodes': episodes}
+        for episode in episodes.values():
+            _relever_repere(bibliotheque, episode.get('maj'))
@@ -0,0 +1,152 @@
+"""Index persistant des répertoires de séries pour un balayage incrémental.
+
+Pour chaque répertoire parcouru, ``index_repertoires.json`` conserve sa
+date de modification, ses fichiers vidéo (avec taille et date de
+modification) et ses sous-répertoires. La date de modification d'un
+répertoire ne change que lorsqu'une entrée y est ajoutée, retirée ou
+renommée : un répertoire inchangé n'est donc pas relu, seul un ``stat`` est
+nécessaire pour le vérifier. Les répertoires modifiés sont relus avec
+``os.scandir``.
+
+La modification d'un fichier en place ne touche pas son répertoire; elle
+est détectée plus tard par l'index des médias, qui valide chaque fichier
+par sa taille et sa date de modification avant de l'utiliser, ou tout de
+suite si le répertoire est marqué à relire avec ``invalider()``.
+"""
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+try:
+    import config
+except ImportError:
+    print("Le fichier 'config.py' est manquant. Copiez 'config.py.sample' puis personnalisez-le.")
+    sys.exit(1)
+
+from utils import ecrire_json_atomique
+
+# Extensions de fichiers vidéo à rechercher
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov')
+
+_verrou = threading.RLock()
+_index = None
+# Répertoires rencontrés pendant l'exécution, pour élaguer les autres
+_visites = set()
+
+
+def chemin_index() -> Path:
+    """Retourne l'emplacement du fichier d'index."""
+    return Path(getattr(config, 'INDEX_REPERTOIRES', Path.cwd() / 'index_repertoires.json'))
+
+
+def _charger() -> dict:
+    """Charge l'index en mémoire lors du premier accès."""
+    global _index
+    with _verrou:
+        if _index is None:
+            try:
+                with open(chemin_index(), 'r', encoding='utf-8') as fichier:
+                    _index = json.load(fichier)
+            except FileNotFoundError:
+                _index = {}
+            except json.JSONDecodeError as e:
+                print(f"Index des répertoires illisible, il sera reconstruit : {e}")
+                _index = {}
+        return _index
+
+
+def sauvegarder(elaguer: bool = True):
+    """Écrit l'index sur disque.
+
+    Avec ``elaguer``, les répertoires qui n'ont pas été rencontrés pendant
+    l'exécution (supprimés, ou racines qui ne sont plus suivies) sont retirés.
+    """
+    with _verrou:
+        if _index is None:
+            return
+        if elaguer:
+            for repertoire in [repertoire for repertoire in _index if repertoire not in _visites]:
+                del _index[repertoire]
+        ecrire_json_atomique(chemin_index(), _index, indent=None)
+
+
+def invalider(repertoire):
+    """Force la relecture de ``repertoire`` au prochain parcours.
+
+    Sert lorsqu'un fichier a été réécrit en place (fin d'une copie, par
+    exemple) : la date du répertoire n'a pas changé, mais ses fichiers si.
+    Les identités connues sont conservées pour détecter les fichiers modifiés.
+    """
+    with _verrou:
+        entree = _charger().get(Path(repertoire).as_posix())
+        if entree is not None:
+            entree['mtime'] = None
+
+
+def _lister(repertoire: str, mtime: int) -> dict:
+    """Relit un répertoire avec ``os.scandir``."""
+    fichiers = {}
+    sous_repertoires = []
+    with os.scandir(repertoire) as entrees:
+        for entree in entrees:
+            try:
+                if entree.is_dir():
+                    # Comme os.walk, les liens vers des répertoires ne sont pas suivis
+                    if not entree.is_symlink():
+                        sous_repertoires.append(entree.name)
+                elif entree.name.lower().endswith(VIDEO_EXTENSIONS):
+                    stat = entree.stat()
+                    fichiers[entree.name] = [stat.st_size, stat.st_mtime_ns]
+            except OSError:
+                if entree.name.lower().endswith(VIDEO_EXTENSIONS):
+                    fichiers[entree.name] = [None, None]
+    return {'mtime': mtime, 'fichiers': fichiers, 'sous_repertoires': sorted(sous_repertoires)}
+
+
+def parcourir(racine) -> tuple:
+    """Parcourt ``racine`` en ne relisant que les répertoires modifiés.
+
+    Retourne la liste triée des fichiers vidéo (chemins avec des « / », même
+    sous Windows) et la liste des fichiers dont la taille ou la date de
+    modification a changé dans les répertoires relus.
+    """
+    index = _charger()
+    fichiers = []
+    modifies = []
+    a_visiter = [Path(racine).as_posix()]
+    while a_visiter:
+        repertoire = a_visiter.pop()
+        try:
+            # La date est lue avant la liste : un ajout pendant la lecture
+            # provoquera une nouvelle lecture au prochain balayage.
+            mtime = os.stat(repertoire).st_mtime_ns
+        except OSError:
+            continue
+
+        with _verrou:
+            ancien = index.get(repertoire)
+        if ancien is not None and ancien['mtime'] == mtime:
+            entree = ancien
+        else:
+            try:
+                entree = _lister(repertoire, mtime)
+            except OSError as e:
+                print(f"Impossible de lire le répertoire '{repertoire}' : {e}")
+                continue
+            if ancien is not None:
+                modifies.extend(
+                    f'{repertoire}/{nom}'
+                    for nom, identite in entree['fichiers'].items()
+                    if nom in ancien['fichiers'] and ancien['fichiers'][nom] != identite
+                )
+            with _verrou:
+                index[repertoire] = entree
+
+        with _verrou:
+            _visites.add(repertoire)
+        fichiers.extend(f'{repertoire}/{nom}' for nom in entree['fichiers'])
+        a_visiter.extend(f'{repertoire}/{nom}' for nom in entree['sous_repertoires'])
+
+    return sorted(fichiers), modifies
@@ -0,0 +1,180 @@
+"""Persistance incrémentale des états de ``listegeneration.json`` et ``messages.json``.
+
+Marquer une émission ou un message comme généré ne réécrit plus tout le
+document : le changement est ajouté à un journal voisin
+(``listegeneration.json.journal``), une ligne JSON écrite puis synchronisée
+sur disque (``fsync``). Le coût d'un changement ne dépend donc pas de la
+taille du document, et un arrêt brutal ne peut abîmer que la dernière
+ligne du journal, ignorée à la relecture.
+
+Les lecteurs passent par ``charger()``, qui rejoue le journal sur le
+document. Lorsque le journal atteint ``config.JOURNAL_COMPACTION`` entrées,
+le document complet est réécrit de façon atomique (fichier temporaire,
+``fsync``, renommage) et le journal est supprimé.
+
+La première ligne du journal identifie le document sur lequel il
+s'applique (inode, taille, date de modification). Un journal qui ne
+correspond plus au document (document réécrit par ``generer.py`` ou
+modifié à la main, arrêt entre le renommage et la suppression du journal)
+est ignoré puis supprimé.
+"""
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+try:
+    import config
+except ImportError:
+    print("Le fichier 'config.py' est manquant. Copiez 'config.py.sample' puis personnalisez-le.")
+    sys.exit(1)
+
+from utils import ecrire_json_atomique
+
+_verrou = threading.RLock()
+
+
+def chemin_journal(chemin) -> Path:
+    """Retourne l'emplacement du journal associé au document ``chemin``."""
+    chemin = Path(chemin)
+    return chemin.with_name(chemin.name + '.journal')
+
+
+def seuil_compaction() -> int:
+    """Nombre d'entrées du journal au-delà duquel le document est réécrit."""
+    return getattr(config, 'JOURNAL_COMPACTION', 50)
+
+
+def _identite(chemin) -> list:
+    etat = os.stat(chemin)
+    return [etat.st_ino, etat.st_size, etat.st_mtime_ns]
+
+
+def _lire_journal(chemin):
+    """Retourne les opérations valides du journal et la longueur lue.
+
+    ``None`` est retourné si le journal est absent ou ne correspond pas au
+    document. La lecture s'arrête à la première ligne incomplète.
+    """
+    journal = chemin_journal(chemin)
+    try:
+        with open(journal, 'rb') as fichier:
+            contenu = fichier.read()
+    except FileNotFoundError:
+        return None
+    operations = []
+    entete = None
+    longueur = 0
+    for ligne in contenu.splitlines(keepends=True):
+        if not ligne.endswith(b'\n'):
+            break
+        try:
+            element = json.loads(ligne)
+        except ValueError:
+            break
+        if entete is None:
+            entete = element
+        else:
+            operations.append(element)
+        longueur += len(ligne)
+    if entete is None or entete.get('document') != _identite(chemin):
+        return None
+    return operations, longueur
+
+
+def _appliquer(data, operation):
+    """Applique une opération du journal au document en mémoire."""
+    liste = data
+    for cle in operation['cles']:
+        liste = liste[cle]
+    if operation['op'] == 'modifier':
+        liste[operation['indice']].update(operation['champs'])
+    elif operation['op'] == 'supprimer':
+        del liste[operation['indice']]
+
+
+def charger(chemin) -> dict:
+    """Charge le document ``chemin`` avec les changements de son journal."""
+    with _verrou:
+        with open(chemin, 'r', encoding='utf-8') as fichier:
+            data = json.load(fichier)
+        lecture = _lire_journal(chemin)
+        if lecture is not None:
+            for operation in lecture[0]:
+                _appliquer(data, operation)
+        return data
+
+
+def _noter(chemin, data, operation, indent):
+    """Ajoute ``operation`` au journal, puis compacte si le seuil est atteint."""
+    with _verrou:
+        journal = chemin_journal(chemin)
+        lecture = _lire_journal(chemin)
+        if lecture is None:
+            # Nouveau journal : l'en-tête le lie à la version actuelle du document
+            operations, longueur = [], 0
+            entete = json.dumps({'document': _identite(chemin)}) + '\n'
+            mode = 'w'
+        else:
+            operations, longueur = lecture
+            entete = ''
+            mode = 'r+'
+        with open(journal, mode, encoding='utf-8') as fichier:
+            # Une ligne à moitié écrite lors d'un arrêt brutal est écartée
+            fichier.seek(longueur)
+            fichier.truncate()
+            fichier.write(entete + json.dumps(operation, ensure_ascii=False) + '\n')
+            fichier.flush()
+            os.fsync(fichier.fileno())
+        if len(operations) + 1 >= seuil_compaction():
+            compacter(chemin, data, indent)
+
+
+def modifier(chemin, data, cles, indice, indent=4, **champs):
+    """Modifie l'élément ``indice`` de la liste ``cles`` et note le changement.
+
+    ``cles`` est la suite de clés menant à la liste dans le document, par
+    exemple ``('emissions',)`` ou ``('Messages', categorie)``.
+    """
+    operation = {'op': 'modifier', 'cles': list(cles), 'indice': indice, 'champs': champs}
+    _appliquer(data, operation)
+    _noter(chemin, data, operation, indent)
+
+
+def supprimer(chemin, data, cles, indice, indent=4):
+    """Retire l'élément ``indice`` de la liste ``cles``, note le changement et le retourne."""
+    liste = data
+    for cle in cles:
+        liste = liste[cle]
+    element = liste[indice]
+    operation = {'op': 'supprimer', 'cles': list(cles), 'indice': indice}
+    _appliquer(data, operation)
+    _noter(chemin, data, operation, indent)
+    return element
+
+
+def compacter(chemin, data, indent=4):
+    """Réécrit le document complet de façon atomique et supprime le journal."""
+    with _verrou:
+        ecrire_json_atomique(chemin, data, indent=indent)
+        # Un arrêt avant cette suppression est sans effet : l'en-tête ne correspond plus
+        chemin_journal(chemin).unlink(missing_ok=True)
+
+
+def ecrire(chemin, data, exclure=(), indent=4):
+    """Remplace le document par ``data``, sans les clés ``exclure``.
+
+    Les clés sont écartées sans copier les données : ``json.dump`` écrit
+    le document au fil de l'eau dans le fichier temporaire.
+    """
+    if exclure:
+        data = {cle: valeur for cle, valeur in data.items() if cle not in exclure}
+    compacter(chemin, data, indent)
+
+
+def consolider(chemin, indent=4):
+    """Intègre le journal au document, par exemple avant d'en faire une copie."""
+    with _verrou:
+        if chemin_journal(chemin).exists():
+            compacter(chemin, charger(chemin), indent)
@@ -0,0 +1,166 @@
+"""Construction en arrière-plan de la bibliothèque mezzanine.
+
+Chaque fichier du catalogue (``bd_videos.json``) est converti une seule
+fois au format de diffusion de la chaîne : résolution, codec, 24000/1001
+images par seconde, AAC 48 kHz stéréo et intensité sonore normalisée. Le
+transcodage quotidien n'a plus qu'à concaténer ces fichiers sans
+réencodage.
+
+Le script est incrémental : les fichiers déjà convertis avec les réglages
+actuels sont ignorés et les conversions devenues inutiles (source
+modifiée ou retirée, réglages changés) sont supprimées. Rien n'est
+supprimé lorsqu'une source est inaccessible (partage hors ligne) : sa
+conversion ne peut alors pas être distinguée d'une conversion obsolète.
+Il est lancé
+automatiquement par ``scanneurvid.py`` lorsque ``config.MEZZANINE_AUTO``
+est activé.
+"""
+import json
+import os
+import sys
+from pathlib import Path
+
+try:
+    import config
+except ImportError:
+    print("Le fichier 'config.py' est manquant. Copiez 'config.py.sample' puis personnalisez-le.")
+    sys.exit(1)
+
+from utils import verifier_fichier_existe
+from generer import add_mount_point, map_path
+import cache_segments
+import journal_etat
+import transcode
+
+
+def sources_catalogue(bd_videos_path='bd_videos.json', liste_path='listegeneration.json'):
+    """Retourne les fichiers locaux du catalogue, les plus urgents en premier.
+
+    Les sources des émissions pas encore générées passent avant le reste
+    du catalogue afin d'être prêtes pour les prochaines diffusions.
+    """
+    with open(bd_videos_path, 'r', encoding='utf-8') as f:
+        bd_videos = json.load(f)
+
+    catalogue = []
+    for series in bd_videos.get('series', []):
+        catalogue.extend(fichier for fichier in series.get('fichiers', []) if not fichier.startswith('PLEX-'))
+        # Épisodes Plex dont le chemin a été résolu par scanneurvid.py
+        catalogue.extend(
+            map_path(add_mount_point(episode['fichier']))
+            for episode in series.get('plex', {}).values()
+            if episode.get('fichier')
+        )
+
+    urgentes = []
+    if os.path.exists(liste_path):
+        liste = journal_etat.charger(liste_path)
+        for emission in liste.get('emissions', []):
+            if not emission.get('genere'):
+                urgentes.extend(emission.get('fichiers_concatenes', []))
+
+    # Supprimer les doublons en conservant l'ordre de priorité
+    return list(dict.fromkeys(urgentes + catalogue))
+
+
+def prendre_verrou(repertoire: Path):
+    """Empêche deux constructions simultanées; retourne le chemin du verrou ou ``None``."""
+    verrou = repertoire / '.verrou'
+    try:
+        descripteur = os.open(verrou, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            pid = int(verrou.read_text())
+            if os.name == 'posix':
+                os.kill(pid, 0)  # Le processus existe-t-il encore?
+            return None
+        except (ValueError, ProcessLookupError):
+            # Verrou abandonné par un processus terminé
+            verrou.unlink()
+            return prendre_verrou(repertoire)
+        except PermissionError:
+            return None
+    with os.fdopen(descripteur, 'w') as f:
+        f.write(str(os.getpid()))
+    return verrou
+
+
+def construire(sources, codec):
+    """Convertit les sources absentes de la bibliothèque mezzanine.
+
+    Retourne l'ensemble des fichiers mezzanine attendus pour ``sources`` et
+    la liste des sources inaccessibles : absentes, dans un répertoire qui
+    n'existe pas non plus (partage non monté, NAS éteint...). Un fichier
+    absent d'un répertoire accessible a été retiré et n'est pas attendu.
+    """
+    repertoire = transcode.repertoire_mezzanine()
+    travail = repertoire / '.en_cours'
+    travail.mkdir(parents=True, exist_ok=True)
+
+    attendus = set()
+    injoignables = []
+    nb_convertis = 0
+    for source in sources:
+        if not os.path.exists(source):
+            if not os.path.isdir(os.path.dirname(source)):
+                injoignables.append(source)
+            continue
+        cle = cache_segments.cle_segment(source, transcode.reglages_encodage(codec))
+        destination = repertoire / f'{cle}.mp4'
+        attendus.add(destination)
+        if destination.exists():
+            continue
+
+        print(f"Conversion mezzanine : {source}")
+        temporaire = travail / f'{cle}.mp4'
+        code_retour = transcode.transcode_video(source, str(temporaire), codec,
+                                                {'emission': 'mezzanine', 'source': source})
+        if code_retour == 0 and temporaire.exists():
+            os.replace(temporaire, destination)
+            nb_convertis += 1
+        else:
+            print(f"Échec de la conversion mezzanine de '{source}' (code {code_retour})")
+            if temporaire.exists():
+                temporaire.unlink()
+
+    print(f"Bibliothèque mezzanine : {nb_convertis} fichier(s) converti(s), {len(attendus)} attendu(s)")
+    return attendus, injoignables
+
+
+def elaguer(attendus):
+    """Supprime les fichiers mezzanine qui ne correspondent plus au catalogue."""
+    for fichier in transcode.repertoire_mezzanine().glob('*.mp4'):
+        if fichier not in attendus:
+            print(f"Fichier mezzanine obsolète supprimé : {fichier.name}")
+            fichier.unlink()
+
+
+def main():
+    """Met à jour la bibliothèque mezzanine à partir de ``bd_videos.json``."""
+    if not getattr(config, 'MEZZANINE_DIR', None):
+        print("MEZZANINE_DIR n'est pas défini dans config.py.")
+        sys.exit(1)
+
+    verifier_fichier_existe('bd_videos.json')
+    repertoire = transcode.repertoire_mezzanine()
+    repertoire.mkdir(parents=True, exist_ok=True)
+
+    verrou = prendre_verrou(repertoire)
+    if verrou is None:
+        print("Une construction mezzanine est déjà en cours.")
+        return
+
+    try:
+        codec = transcode.choisir_codec(config.CODEC_VIDEO, config.ACCEL_INTEL)
+        attendus, injoignables = construire(sources_catalogue(), codec)
+        if injoignables:
+            print(f"{len(injoignables)} source(s) inaccessible(s), par exemple '{injoignables[0]}' : "
+                  "aucun fichier mezzanine n'est supprimé.")
+        else:
+            elaguer(attendus)
+    finally:
+        verrou.unlink()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,11 @@
+import argparse
 import os
 import json
+import subprocess
 import platform
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from plexapi.server import PlexServer
 import sys
 
 try:
@@ -11,7 +14,14 @@ except ImportError:
     print("Le fichier 'config.py' est manquant. Copiez 'config.py.sample' puis personnalisez-le.")
     sys.exit(1)
 
-from utils import verifier_fichier_existe
+from utils import verifier_fichier_existe, ecrire_json_atomique
+import base_catalogue
+import client_plex
+import empreintes
+import index_plex
+from generer import add_mount_point as add_plex_mount_point, map_path
+import index_medias
+import index_repertoires
 
 python_path = sys.executable  # Donne le chemin du python actif
 
@@ -19,23 +29,18 @@ python_path = sys.executable  # Donne le chemin du python actif
 PATH_MAPPINGS = config.PATH_MAPPINGS
 
 # Extensions de fichiers vidéo à rechercher
-VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mkv', '.mov']
+VIDEO_EXTENSIONS = list(index_repertoires.VIDEO_EXTENSIONS)
 
-# Connexion au serveur Plex
-BASEURL = config.PLEX_BASEURL
-TOKEN = config.PLEX_TOKEN
-try:
-    plex = PlexServer(BASEURL, TOKEN)
-except Exception as e:
-    print(f"Erreur de connexion à Plex : {e}")
-    exit(1)
+# Sémaphores limitant les lectures simultanées sur un même disque ou partage
+_semaphores_montage = {}
+_verrou_montages = threading.Lock()
 
 def display_all_series_ids():
     """
     Affiche toutes les séries dans Plex organisées par bibliothèque avec leurs IDs.
     """
     try:
-        libraries = plex.library.sections()
+        libraries = client_plex.serveur().library.sections()
         print("\n--- Liste de toutes les séries organisées par bibliothèque ---\n")
         for library in libraries:
             if library.type == 'show':  # Vérifie si la bibliothèque est de type 'show' (séries)
@@ -51,27 +56,47 @@ def display_all_series_ids():
 
 def scan_directory(path):
     """
-    Parcourt récursivement un répertoire et retourne une liste de tous les fichiers vidéo trouvés.
+    Parcourt récursivement un répertoire et retourne la liste triée des fichiers vidéo trouvés,
+    ainsi que celle des fichiers modifiés depuis le dernier balayage.
+    Seuls les répertoires modifiés depuis le dernier balayage sont relus (voir ``index_repertoires``).
     """
-    video_files = []
-    for root, _, files in os.walk(path):
-        for file in files:
-            if any(file.lower().endswith(ext) for ext in VIDEO_EXTENSIONS):
-                # Conserver les chemins avec des slashes même sous Windows
-                video_files.append(str(Path(root).as_posix() + '/' + file))
-    return sorted(video_files)
+    return index_repertoires.parcourir(path)
 
 def get_plex_episodes(series_id):
     """
-    Retourne une liste des identifiants des épisodes pour une série Plex donnée.
+    Retourne une liste des identifiants des épisodes pour une série Plex donnée, ainsi qu'un
+    dictionnaire donnant pour chaque épisode le chemin du fichier, la durée (ms) et la date de
+    mise à jour. Tout est obtenu en une seule requête pour la série, si bien que generer.py
+    n'a plus à interroger Plex épisode par épisode.
     """
     try:
-        serie = plex.library.fetchItem(int(series_id))
-        episode_ids = [f"PLEX-ÉPISODE:{episode.ratingKey}" for episode in serie.episodes()]
-        return episode_ids
+        serie = client_plex.serveur().library.fetchItem(int(series_id))
+        episode_ids = []
+        episodes = {}
+        for episode in serie.episodes():
+            episode_ids.append(f"PLEX-ÉPISODE:{episode.ratingKey}")
+            media = episode.media[0] if episode.media else None
+            part = media.parts[0] if media and media.parts else None
+            episodes[str(episode.ratingKey)] = {
+                "fichier": part.file if part else None,
+                "duree": episode.duration,
+                "maj": int(episode.updatedAt.timestamp()) if episode.updatedAt else None,
+            }
+        return episode_ids, episodes
     except Exception as e:
         print(f"Erreur lors de la récupération des épisodes pour la série ID {series_id} : {e}")
-        return []
+        return [], {}
+
+def chemins_plex_locaux(series_data):
+    """
+    Retourne les chemins locaux (avec point de montage) des épisodes Plex résolus.
+    """
+    return [
+        map_path(add_plex_mount_point(episode["fichier"]))
+        for series in series_data
+        for episode in series.get("plex", {}).values()
+        if episode.get("fichier")
+    ]
 
 def add_mount_point(path, os_name):
     """
@@ -82,88 +107,400 @@ def add_mount_point(path, os_name):
         path = os.path.join(mount_point, path.lstrip("/"))
     return path
 
-def process_series_and_update_json(json_data, os_name):
+def semaphore_montage(cle):
+    """
+    Retourne le sémaphore du disque ou partage identifié par `cle`.
+    """
+    with _verrou_montages:
+        if cle not in _semaphores_montage:
+            limite = max(1, int(getattr(config, 'SCAN_PAR_MONTAGE', 2)))
+            _semaphores_montage[cle] = threading.BoundedSemaphore(limite)
+        return _semaphores_montage[cle]
+
+def cle_montage(full_path):
+    """
+    Identifie le disque ou partage réseau d'un chemin par son périphérique.
+    """
+    try:
+        return os.stat(full_path).st_dev
+    except OSError:
+        return full_path
+
+def plex_series_ids(json_data):
+    """
+    Retourne les identifiants des séries Plex (`PLEX-SÉRIE:`) de 'emissions_def.json'.
+    """
+    return [
+        path.split(":")[1]
+        for series in json_data.get("series", [])
+        for path in series.get("chemins", [])
+        if path.startswith("PLEX-SÉRIE:")
+    ]
+
+def scan_path(path, os_name, plex_inchangees=None):
+    """
+    Traite une entrée de la clé "chemins" d'une série (répertoire ou série Plex).
+    Retourne les fichiers vidéo ou identifiants Plex trouvés, les fichiers modifiés
+    et les informations des épisodes Plex.
+    Une série Plex présente dans `plex_inchangees` n'a pas changé depuis la dernière
+    synchronisation : ses épisodes sont repris de l'index sans interroger Plex.
+    """
+    if path.startswith("PLEX-SÉRIE:"):
+        series_id = path.split(":")[1]
+        if plex_inchangees and series_id in plex_inchangees:
+            episode_ids, episodes = plex_inchangees[series_id]
+            return episode_ids, [], episodes
+        # Extraire les épisodes depuis Plex
+        print(f"Extraction des épisodes depuis Plex pour la série ID: {series_id}")
+        with semaphore_montage("PLEX"):
+            episode_ids, episodes = get_plex_episodes(series_id)
+        if episodes:
+            index_plex.enregistrer(series_id, episodes)
+        return episode_ids, [], episodes
+
+    # Ajouter le point de montage approprié avant de scanner le répertoire
+    full_path = add_mount_point(path, os_name)
+    print(f"Scanning directory: {full_path}")
+    if not Path(full_path).exists():
+        print(f"Chemin non trouvé : {full_path}")
+        return [], [], {}
+    with semaphore_montage(cle_montage(full_path)):
+        fichiers, modifies = scan_directory(full_path)
+    return fichiers, modifies, {}
+
+def process_series_and_update_json(json_data, os_name, plex_inchangees=None):
     """
     Traite les données JSON pour extraire les informations des séries et leurs fichiers vidéo ou identifiants Plex.
     Met à jour le fichier 'emissions_def.json' avec le nombre d'épisodes.
     Applique le mapping des chemins en fonction de l'OS.
+    Retourne aussi, par série, la liste des fichiers modifiés depuis le dernier balayage.
+    Les séries Plex de `plex_inchangees` sont reprises de l'index sans interroger Plex.
+
+    Tous les chemins de toutes les séries sont balayés en parallèle (`config.SCAN_NB_FILS`),
+    avec au plus `config.SCAN_PAR_MONTAGE` lectures simultanées par disque ou partage.
+    Les résultats sont fusionnés dans l'ordre de 'emissions_def.json', comme un balayage
+    séquentiel, pour que la numérotation des épisodes (`prochain`) reste stable.
     """
     series_data = []  # Liste pour stocker les données des séries
+    modifies_par_serie = {}
+    series_list = json_data.get("series", [])
+
+    nb_fils = max(1, int(getattr(config, 'SCAN_NB_FILS', 1)))
+    with ThreadPoolExecutor(max_workers=nb_fils) as pool:
+        resultats = {
+            (i, j): pool.submit(scan_path, path, os_name, plex_inchangees)
+            for i, series in enumerate(series_list)
+            for j, path in enumerate(series.get("chemins", []))
+        }
 
-    for series in json_data.get("series", []):
+    for i, series in enumerate(series_list):
         series_name = series.get("nom")
         series_paths = series.get("chemins", [])
         
         # Initialisation du compteur d'épisodes
         video_files_or_episodes = []
+        episodes_plex = {}
+        modifies_par_serie[series_name] = []
 
-        for path in series_paths:
-            if path.startswith("PLEX-SÉRIE:"):
-                # Extraire les épisodes depuis Plex
-                series_id = path.split(":")[1]
-                print(f"Extraction des épisodes depuis Plex pour la série ID: {series_id}")
-                video_files_or_episodes.extend(get_plex_episodes(series_id))
-            else:
-                # Ajouter le point de montage approprié avant de scanner le répertoire
-                full_path = add_mount_point(path, os_name)
-                print(f"Scanning directory: {full_path}")
-                if Path(full_path).exists():
-                    video_files_or_episodes.extend(scan_directory(full_path))
-                else:
-                    print(f"Chemin non trouvé : {full_path}")
+        for j in range(len(series_paths)):
+            fichiers, modifies, episodes = resultats[(i, j)].result()
+            video_files_or_episodes.extend(fichiers)
+            modifies_par_serie[series_name].extend(modifies)
+            episodes_plex.update(episodes)
 
         # Mettre à jour la clé nb_episodes dans json_data pour la série correspondante
         series['nb_episodes'] = len(video_files_or_episodes)
 
         # Ajouter les données de la série à la liste pour bd_videos.json
-        series_data.append({
+        donnees_serie = {
             "nom": series_name,
             "nb_episodes": len(video_files_or_episodes),  # Calcul du nombre d'épisodes
             "fichiers": video_files_or_episodes
-        })
+        }
+        if episodes_plex:
+            # Chemin, durée et date de mise à jour de chaque épisode Plex, par identifiant
+            donnees_serie["plex"] = episodes_plex
+        series_data.append(donnees_serie)
+
+    # Retourne la liste des séries pour bd_videos, json_data mis à jour et les fichiers modifiés
+    return series_data, json_data, modifies_par_serie
+
+def empreintes_par_fichier(series_list):
+    """
+    Retourne les empreintes connues des séries de `series_list`, par chemin de fichier.
+    """
+    return {
+        fichier: empreinte
+        for series in series_list
+        for fichier, empreinte in zip(series.get('fichiers', []), series.get('empreintes') or [])
+        if empreinte
+    }
+
+def calculer_empreinte(fichier):
+    """
+    Calcule l'empreinte échantillonnée d'un fichier, ou retourne None s'il est illisible.
+    """
+    try:
+        with semaphore_montage(cle_montage(os.path.dirname(fichier))):
+            return empreintes.calculer(fichier)
+    except OSError as e:
+        print(f"Impossible de calculer l'empreinte de '{fichier}' : {e}")
+        return None
+
+def empreinte_a_jour(fichier, empreinte):
+    """
+    Indique si `empreinte`, conservée dans l'ancien 'bd_videos.json', vaut encore pour `fichier`.
+    L'index des médias la garde avec la taille et la date de modification du fichier : elle n'est
+    reprise que si ces dernières n'ont pas changé (un fichier réécrit en place ne touche pas la
+    date de son répertoire, le balayage incrémental ne le voit donc pas).
+    """
+    with semaphore_montage(cle_montage(os.path.dirname(fichier))):
+        return index_medias.valeur(fichier, 'empreinte') == empreinte
+
+def ajouter_empreintes(series_data, anciennes_series, modifies_par_serie):
+    """
+    Ajoute à chaque série la clé "empreintes" : l'empreinte échantillonnée de chacun de ses
+    fichiers, dans l'ordre de "fichiers" (None pour les épisodes Plex).
+    Seuls les fichiers nouveaux ou modifiés sont lus; les autres reprennent l'empreinte
+    conservée dans l'ancien 'bd_videos.json' si leur taille et leur date n'ont pas changé.
+    Les fichiers modifiés en place sont ajoutés à `modifies_par_serie`.
+    """
+    anciennes = empreintes_par_fichier(anciennes_series)
+    modifies = {fichier for fichiers in modifies_par_serie.values() for fichier in fichiers}
+    series_par_fichier = {
+        fichier: series['nom']
+        for series in series_data
+        for fichier in series['fichiers']
+        if not fichier.startswith("PLEX-")
+    }
+    a_verifier = sorted(fichier for fichier in series_par_fichier if fichier not in modifies and fichier in anciennes)
+    nb_fils = max(1, int(getattr(config, 'SCAN_NB_FILS', 1)))
+    with ThreadPoolExecutor(max_workers=nb_fils) as pool:
+        a_jour = dict(zip(a_verifier, pool.map(lambda fichier: empreinte_a_jour(fichier, anciennes[fichier]),
+                                               a_verifier)))
+    for fichier in a_verifier:
+        if not a_jour[fichier]:
+            modifies.add(fichier)
+            modifies_par_serie.setdefault(series_par_fichier[fichier], []).append(fichier)
+    a_calculer = sorted(
+        fichier for fichier in series_par_fichier
+        if fichier in modifies or fichier not in anciennes
+    )
+    calculees = {}
+    if a_calculer:
+        print(f"Calcul de l'empreinte de {len(a_calculer)} fichier(s)...")
+        with ThreadPoolExecutor(max_workers=nb_fils) as pool:
+            calculees = dict(zip(a_calculer, pool.map(calculer_empreinte, a_calculer)))
+
+    for series in series_data:
+        liste = [
+            None if fichier.startswith("PLEX-")
+            else calculees[fichier] if fichier in calculees
+            else anciennes.get(fichier)
+            for fichier in series['fichiers']
+        ]
+        series.pop('empreintes', None)
+        if any(liste):
+            series['empreintes'] = liste
+
+def calculer_changements(series_data, anciennes_series, modifies_par_serie):
+    """
+    Compare le balayage aux séries de l'ancien 'bd_videos.json'.
+    Retourne, pour chaque série touchée, les fichiers ajoutés, retirés, modifiés et déplacés.
+
+    Un fichier retiré dont l'empreinte réapparaît sous un autre chemin (renommage, déplacement
+    vers un autre partage ou une autre série) est noté comme déplacé ([ancien, nouveau]).
+    Un fichier dont la date a changé mais pas l'empreinte n'est pas considéré comme modifié.
+    """
+    anciens_fichiers = {series['nom']: series.get('fichiers', []) for series in anciennes_series}
+    anciennes_empreintes = empreintes_par_fichier(anciennes_series)
+    nouvelles_empreintes = empreintes_par_fichier(series_data)
+
+    bruts = {}
+    for series in series_data:
+        anciens = anciens_fichiers.get(series['nom'], [])
+        ensemble_anciens = set(anciens)
+        ensemble_nouveaux = set(series['fichiers'])
+        bruts[series['nom']] = (
+            [fichier for fichier in series['fichiers'] if fichier not in ensemble_anciens],
+            [fichier for fichier in anciens if fichier not in ensemble_nouveaux],
+        )
+
+    # Fichiers retirés, par empreinte, pouvant être retrouvés ailleurs
+    disponibles = {}
+    for _, retires in bruts.values():
+        for fichier in retires:
+            if fichier in anciennes_empreintes:
+                disponibles.setdefault(anciennes_empreintes[fichier], []).append(fichier)
+    deplaces = {}
+    retrouves = set()
+    for nom, (ajoutes, _) in bruts.items():
+        for fichier in ajoutes:
+            candidats = disponibles.get(nouvelles_empreintes.get(fichier))
+            if candidats:
+                ancien = candidats.pop(0)
+                retrouves.add(ancien)
+                deplaces.setdefault(nom, []).append([ancien, fichier])
+
+    changements = {}
+    for series in series_data:
+        ajoutes, retires = bruts[series['nom']]
+        nouveaux_deplaces = {nouveau for _, nouveau in deplaces.get(series['nom'], [])}
+        changement = {
+            "ajoutes": [fichier for fichier in ajoutes if fichier not in nouveaux_deplaces],
+            "retires": [fichier for fichier in retires if fichier not in retrouves],
+            "modifies": [
+                fichier for fichier in modifies_par_serie.get(series['nom'], [])
+                if anciennes_empreintes.get(fichier) is None
+                or anciennes_empreintes.get(fichier) != nouvelles_empreintes.get(fichier)
+            ],
+            "deplaces": deplaces.get(series['nom'], []),
+        }
+        if any(changement.values()):
+            changements[series['nom']] = changement
+    return changements
+
+def reprendre_index_medias(changements, modifies_par_serie):
+    """
+    Reporte dans l'index des médias les fichiers déplacés et ceux dont seule la date a changé,
+    pour ne pas les sonder de nouveau. Retourne les fichiers réellement modifiés.
+    """
+    modifies = [fichier for changement in changements.values() for fichier in changement['modifies']]
+    for changement in changements.values():
+        for ancien, nouveau in changement['deplaces']:
+            index_medias.reprendre(ancien, nouveau)
+    ensemble_modifies = set(modifies)
+    for fichiers in modifies_par_serie.values():
+        for fichier in fichiers:
+            if fichier not in ensemble_modifies:
+                index_medias.reprendre(fichier, fichier)
+    return modifies
+
+def signaler_doublons(series_data):
+    """
+    Affiche les fichiers de contenu identique présents sous plusieurs chemins
+    (par exemple sur deux partages). Retourne le nombre de groupes de doublons.
+    """
+    par_empreinte = {}
+    for fichier, empreinte in empreintes_par_fichier(series_data).items():
+        par_empreinte.setdefault(empreinte, []).append(fichier)
+    doublons = [fichiers for fichiers in par_empreinte.values() if len(fichiers) > 1]
+    for fichiers in doublons:
+        print(f"Fichiers identiques : {', '.join(sorted(fichiers))}")
+    return len(doublons)
 
-    return series_data, json_data  # Retourne la liste des séries pour bd_videos et json_data mis à jour
+def recaler_prochains(definitions, anciennes_series, series_data):
+    """
+    Retrouve, pour chaque série, l'épisode désigné par "prochain" dans le nouveau balayage.
+    Un épisode renommé ou déplacé est retrouvé par son empreinte. Retourne les séries dont le
+    rang de cet épisode a changé : {nom: (ancien prochain, nouveau prochain)}.
+    """
+    anciennes = {series['nom']: series for series in anciennes_series}
+    nouvelles = {series['nom']: series for series in series_data}
+    prochains = {}
+    for definition in definitions.get("series", []):
+        nom = definition.get("nom")
+        prochain = definition.get("prochain")
+        if not prochain or nom not in anciennes or nom not in nouvelles:
+            continue
+        anciens_fichiers = anciennes[nom].get('fichiers', [])
+        if not 1 <= prochain <= len(anciens_fichiers):
+            continue
+        fichier = anciens_fichiers[prochain - 1]
+        fichiers = nouvelles[nom]['fichiers']
+        if prochain <= len(fichiers) and fichiers[prochain - 1] == fichier:
+            continue
+        empreinte = empreintes_par_fichier([anciennes[nom]]).get(fichier)
+        liste_empreintes = nouvelles[nom].get('empreintes') or []
+        if fichier in fichiers:
+            rang = fichiers.index(fichier)
+        elif empreinte and empreinte in liste_empreintes:
+            rang = liste_empreintes.index(empreinte)
+        else:
+            # Épisode retiré : le rang est conservé
+            continue
+        if rang + 1 != prochain:
+            prochains[nom] = (prochain, rang + 1)
+    return prochains
 
-def save_json_data(data, file_path):
+def save_json_data(data, file_path, changements=None):
     """
     Sauvegarde les données dans un fichier JSON avec une clé "series".
+    Les changements du dernier balayage sont conservés sous la clé "changements".
     """
+    if base_catalogue.actif():
+        # Le catalogue est mis à jour puis le fichier JSON en est exporté
+        try:
+            base_catalogue.remplacer_videos(data, changements)
+            base_catalogue.exporter(file_path)
+        except Exception as e:
+            print(f"Erreur lors de la sauvegarde du fichier JSON : {e}")
+        return
+
     wrapped_data = {"series": data}  # Envelopper les données dans une clé "series"
+    if changements is not None:
+        wrapped_data["changements"] = changements
     try:
-        with open(file_path, 'w', encoding='utf-8') as json_file:
-            json.dump(wrapped_data, json_file, ensure_ascii=False, indent=4)
+        # Écriture atomique : surveillant.py peut écrire pendant qu'un autre script lit
+        ecrire_json_atomique(file_path, wrapped_data)
     except Exception as e:
         print(f"Erreur lors de la sauvegarde du fichier JSON : {e}")
 
-def save_json_data_nb_episodes_only(updated_json_data, original_json_data, file_path):
+def save_json_data_nb_episodes_only(updated_json_data, original_json_data, file_path, prochains=None):
     """
     Sauvegarde uniquement les informations mises à jour sur le nombre d'épisodes
     dans le fichier JSON, sans toucher aux autres informations.
+    Le "prochain" des séries de `prochains` ({nom: (ancien, nouveau)}) est recalé
+    s'il n'a pas changé depuis la lecture.
     """
+    nb_episodes = {series['nom']: series['nb_episodes'] for series in updated_json_data.get("series", [])}
+    prochains = prochains or {}
     try:
-        for updated_series in updated_json_data.get("series", []):
-            # Rechercher la série correspondante dans le JSON d'origine
-            for original_series in original_json_data.get("series", []):
-                if original_series['nom'] == updated_series['nom']:
-                    # Mettre à jour uniquement le nb_episodes
-                    original_series['nb_episodes'] = updated_series['nb_episodes']
+        if base_catalogue.actif():
+            # Une seule transaction, sans réécrire les autres champs (ex. « prochain »)
+            base_catalogue.synchroniser(Path(file_path).parent)
+            base_catalogue.mettre_a_jour_nb_episodes(nb_episodes)
+            if prochains:
+                base_catalogue.recaler_prochains(prochains)
+            base_catalogue.exporter(file_path)
+            return
+
+        for original_series in original_json_data.get("series", []):
+            # Mettre à jour uniquement le nb_episodes
+            if original_series['nom'] in nb_episodes:
+                original_series['nb_episodes'] = nb_episodes[original_series['nom']]
+            ancien, nouveau = prochains.get(original_series['nom'], (None, None))
+            if ancien is not None and original_series.get('prochain') == ancien:
+                original_series['prochain'] = nouveau
 
         # Sauvegarder les modifications dans le fichier JSON d'origine
-        with open(file_path, 'w', encoding='utf-8') as json_file:
-            json.dump(original_json_data, json_file, ensure_ascii=False, indent=4)
+        ecrire_json_atomique(file_path, original_json_data)
 
     except Exception as e:
         print(f"Erreur lors de la sauvegarde du fichier JSON : {e}")
 
+def lancer_mezzanine():
+    """Démarre ``mezzanine.py`` en arrière-plan sans attendre sa fin."""
+    script = Path(__file__).parent.resolve() / "mezzanine.py"
+    # Le processus enfant garde sa propre copie du descripteur du journal
+    with open(Path.cwd() / "logmezzanine.txt", "a", encoding="utf-8") as journal:
+        subprocess.Popen([python_path, str(script)], stdout=journal, stderr=subprocess.STDOUT,
+                         start_new_session=True)
+    print("Construction de la bibliothèque mezzanine lancée en arrière-plan.")
+
 def main():
     """Analyse les répertoires de séries et met à jour les fichiers JSON."""
+    parser = argparse.ArgumentParser(description="Met à jour bd_videos.json et le nombre d'épisodes des séries.")
+    parser.add_argument('--lister-series', action='store_true',
+                        help="Affiche toutes les séries de Plex avec leurs IDs, par bibliothèque")
+    parser.add_argument('--synchro-complete', action='store_true',
+                        help="Relit toutes les séries Plex au lieu des seules séries modifiées")
+    args = parser.parse_args()
+
     # Déterminer le système d'exploitation
     os_name = config.OS_NAME
     print(f"Système d'exploitation détecté : {os_name}")
 
-    # Afficher toutes les séries avec leurs IDs organisées par bibliothèque
-    display_all_series_ids()
-
     # Chemin vers le fichier JSON d'origine et de destination dans le répertoire courant
     JSON_FILE_PATH = Path.cwd() / "emissions_def.json"
     VIDEO_FILES_JSON_PATH = Path.cwd() / "bd_videos.json"
@@ -179,17 +516,78 @@ def main():
         print(f"Erreur lors de la lecture du fichier JSON : {e}")
         exit(1)
 
+    series_plex = plex_series_ids(data)
+    if series_plex or args.lister_series:
+        # Connexion au serveur Plex, partagée ensuite par tous les fils de balayage
+        try:
+            client_plex.serveur()
+        except Exception as e:
+            print(f"Erreur de connexion à Plex : {e}")
+            exit(1)
+
+    if args.lister_series:
+        # Afficher toutes les séries avec leurs IDs organisées par bibliothèque
+        display_all_series_ids()
+
+    # Ne relire que les séries Plex modifiées depuis la dernière synchronisation
+    if args.synchro_complete:
+        index_plex.reinitialiser()
+    plex_inchangees = index_plex.series_inchangees(series_plex)
+
+    # Lecture de l'ancien bd_videos.json pour calculer les changements
+    anciennes_series = []
+    if VIDEO_FILES_JSON_PATH.exists():
+        try:
+            with open(VIDEO_FILES_JSON_PATH, 'r', encoding='utf-8') as json_file:
+                anciennes_series = json.load(json_file).get("series", [])
+        except Exception as e:
+            print(f"Impossible de lire l'ancien fichier {VIDEO_FILES_JSON_PATH} : {e}")
+
     # Traitement des séries et mise à jour de json_data
     print("Traitement des séries et mise à jour du nombre d'épisodes...")
-    series_data, updated_json_data = process_series_and_update_json(data, os_name)
+    series_data, updated_json_data, modifies_par_serie = process_series_and_update_json(data, os_name, plex_inchangees)
+    index_repertoires.sauvegarder()
+    index_plex.sauvegarder()
+
+    # Empreintes échantillonnées des fichiers nouveaux ou modifiés
+    ajouter_empreintes(series_data, anciennes_series, modifies_par_serie)
+
+    changements = calculer_changements(series_data, anciennes_series, modifies_par_serie)
+    if not changements:
+        print("Aucun changement depuis le dernier balayage.")
+    for series_name, changement in changements.items():
+        print(f"{series_name} : {len(changement['ajoutes'])} ajouté(s), {len(changement['retires'])} retiré(s), "
+              f"{len(changement['modifies'])} modifié(s), {len(changement['deplaces'])} déplacé(s)")
+    signaler_doublons(series_data)
+
+    # L'épisode désigné par « prochain » reste le même s'il a été renommé ou déplacé
+    prochains = recaler_prochains(data, anciennes_series, series_data)
+    for series_name, (ancien, nouveau) in prochains.items():
+        print(f"{series_name} : prochain épisode {ancien} -> {nouveau}")
 
     # Sauvegarde des données dans le fichier JSON d'origine (mise à jour uniquement de nb_episodes)
     print(f"Sauvegarde des données mises à jour dans le fichier JSON d'origine (nb_episodes uniquement) : {JSON_FILE_PATH}")
-    save_json_data_nb_episodes_only(updated_json_data, data, JSON_FILE_PATH)
+    save_json_data_nb_episodes_only(updated_json_data, data, JSON_FILE_PATH, prochains)
 
     # Sauvegarde des données dans le fichier JSON de destination (bd_videos.json)
     print(f"Sauvegarde des données dans le fichier JSON de destination : {VIDEO_FILES_JSON_PATH}")
-    save_json_data(series_data, VIDEO_FILES_JSON_PATH)
+    save_json_data(series_data, VIDEO_FILES_JSON_PATH, changements)
+
+    # Sonder une seule fois les fichiers nouveaux ou modifiés
+    print("Mise à jour de l'index des métadonnées vidéo...")
+    fichiers_locaux = [
+        fichier
+        for series in series_data
+        for fichier in series["fichiers"]
+        if not fichier.startswith("PLEX-")
+    ] + chemins_plex_locaux(series_data)
+    fichiers_modifies = reprendre_index_medias(changements, modifies_par_serie)
+    index_medias.mettre_a_jour(fichiers_locaux, modifies=fichiers_modifies,
+                               empreintes=empreintes_par_fichier(series_data))
+
+    # Convertir en arrière-plan les nouveaux fichiers pour la bibliothèque mezzanine
+    if getattr(config, 'MEZZANINE_AUTO', False):
+        lancer_mezzanine()
 
     print("Le programme a terminé avec succès.")
 
@@ -0,0 +1,273 @@
+"""Surveillance continue des répertoires de séries.
+
+Au lieu d'attendre le prochain ``scanneurvid.py``, ce script garde
+``bd_videos.json`` et le ``nb_episodes`` de ``emissions_def.json`` à jour à
+mesure que des épisodes sont copiés, déplacés ou supprimés.
+
+Les répertoires sur un disque local sont suivis avec inotify (module
+optionnel ``inotify_simple``). Les partages réseau (CIFS, NFS...), où
+inotify ne voit pas les changements faits par d'autres machines, sont
+sondés toutes les ``config.SURVEILLANCE_INTERVALLE`` secondes; sans
+``inotify_simple`` ou hors Linux, tous les répertoires sont sondés.
+
+Les événements sont regroupés : une série touchée n'est relue qu'après
+``config.SURVEILLANCE_DELAI_REGROUPEMENT`` secondes sans nouvel événement
+(au plus ``config.SURVEILLANCE_DELAI_MAX`` secondes après le premier), si
+bien qu'une copie de plusieurs centaines de fichiers ne provoque qu'une
+poignée d'écritures. La relecture passe par le balayage incrémental de
+``scanneurvid.py`` : seuls les répertoires modifiés sont relus.
+
+Un fichier vidéo n'est pris en compte qu'une fois écrit (fermeture après
+écriture ou arrivée par renommage), jamais à sa création : une copie en
+cours n'est pas sondée. Son répertoire est alors relu même si sa date n'a
+pas changé, pour que la taille et l'empreinte finales remplacent celles
+d'une lecture faite pendant la copie.
+
+Usage : python surveillant.py [--sondage]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+
+try:
+    import config
+except ImportError:
+    print("Le fichier 'config.py' est manquant. Copiez 'config.py.sample' puis personnalisez-le.")
+    sys.exit(1)
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+from utils import verifier_fichier_existe
+import index_medias
+import index_plex
+import index_repertoires
+import scanneurvid
+
+# Systèmes de fichiers réseau : les changements faits ailleurs échappent à inotify
+SYSTEMES_RESEAU = ('cifs', 'smb3', 'smbfs', 'nfs', 'nfs4', '9p', 'davfs', 'fuse.sshfs', 'fuse.rclone')
+
+JSON_DEFINITIONS = Path.cwd() / "emissions_def.json"
+JSON_VIDEOS = Path.cwd() / "bd_videos.json"
+
+
+def systeme_de_fichiers(chemin) -> str:
+    """Type du système de fichiers contenant ``chemin`` (d'après /proc/mounts)."""
+    chemin = os.path.realpath(chemin)
+    meilleur, type_fs = '', ''
+    try:
+        with open('/proc/mounts', 'r', encoding='utf-8') as montages:
+            for ligne in montages:
+                champs = ligne.split()
+                if len(champs) < 3:
+                    continue
+                # Les espaces des points de montage sont encodés en octal
+                point = champs[1].replace('\\040', ' ')
+                dedans = chemin == point or chemin.startswith(point.rstrip('/') + '/')
+                if dedans and len(point) > len(meilleur):
+                    meilleur, type_fs = point, champs[2]
+    except OSError:
+        pass
+    return type_fs
+
+
+def surveillable(chemin) -> bool:
+    """Indique si ``chemin`` peut être suivi avec inotify."""
+    return (INotify is not None and platform.system() == 'Linux'
+            and systeme_de_fichiers(chemin) not in SYSTEMES_RESEAU)
+
+
+def racines_par_serie(definitions, os_name) -> dict:
+    """Associe chaque répertoire de 'emissions_def.json' aux séries qui l'utilisent."""
+    racines = {}
+    for series in definitions.get("series", []):
+        for path in series.get("chemins", []):
+            if path.startswith("PLEX-"):
+                continue
+            full_path = scanneurvid.add_mount_point(path, os_name)
+            racines.setdefault(full_path, set()).add(series["nom"])
+    return racines
+
+
+def ajouter_surveillance(inotify, repertoire, noms, surveilles) -> bool:
+    """Ajoute une surveillance inotify sur ``repertoire`` et ses sous-répertoires."""
+    masque = (flags.CREATE | flags.DELETE | flags.MOVED_FROM | flags.MOVED_TO
+              | flags.CLOSE_WRITE | flags.DELETE_SELF | flags.MOVE_SELF)
+    for courant, _, _ in os.walk(repertoire):
+        try:
+            wd = inotify.add_watch(courant, masque)
+        except OSError as e:
+            # Limite max_user_watches atteinte ou répertoire disparu entre-temps
+            print(f"Impossible de surveiller '{courant}' : {e}")
+            return False
+        surveilles[wd] = (courant, surveilles.get(wd, (None, set()))[1] | noms)
+    return True
+
+
+def mettre_a_jour_series(noms, os_name):
+    """Relit les séries ``noms`` et écrit les fichiers JSON si elles ont changé."""
+    with open(JSON_DEFINITIONS, 'r', encoding='utf-8') as json_file:
+        definitions = json.load(json_file)
+    a_relire = [dict(series) for series in definitions.get("series", []) if series.get("nom") in noms]
+    if not a_relire:
+        return
+
+    series_plex = scanneurvid.plex_series_ids({"series": a_relire})
+    plex_inchangees = index_plex.series_inchangees(series_plex) if series_plex else {}
+    series_data, _, modifies_par_serie = scanneurvid.process_series_and_update_json(
+        {"series": a_relire}, os_name, plex_inchangees
+    )
+    # Seule une partie des séries a été relue : rien n'est élagué
+    index_repertoires.sauvegarder(elaguer=False)
+    if series_plex:
+        index_plex.sauvegarder(elaguer=False)
+
+    anciennes_series = []
+    if JSON_VIDEOS.exists():
+        with open(JSON_VIDEOS, 'r', encoding='utf-8') as json_file:
+            anciennes_series = json.load(json_file).get("series", [])
+    scanneurvid.ajouter_empreintes(series_data, anciennes_series, modifies_par_serie)
+    changements = scanneurvid.calculer_changements(series_data, anciennes_series, modifies_par_serie)
+    if not changements:
+        return
+    for series_name, changement in changements.items():
+        print(f"{series_name} : {len(changement['ajoutes'])} ajouté(s), {len(changement['retires'])} retiré(s), "
+              f"{len(changement['modifies'])} modifié(s), {len(changement['deplaces'])} déplacé(s)")
+
+    # Les autres séries de bd_videos.json sont conservées telles quelles
+    par_nom = {series["nom"]: series for series in anciennes_series}
+    par_nom.update({series["nom"]: series for series in series_data})
+    with open(JSON_DEFINITIONS, 'r', encoding='utf-8') as json_file:
+        # Relu juste avant l'écriture pour ne pas écraser un « prochain » avancé entre-temps
+        definitions = json.load(json_file)
+    ordre = [series["nom"] for series in definitions.get("series", []) if series["nom"] in par_nom]
+    prochains = scanneurvid.recaler_prochains(definitions, anciennes_series, series_data)
+    scanneurvid.save_json_data([par_nom[nom] for nom in ordre], JSON_VIDEOS, changements)
+    scanneurvid.save_json_data_nb_episodes_only({"series": a_relire}, definitions, JSON_DEFINITIONS, prochains)
+
+    fichiers_locaux = [
+        fichier
+        for series in series_data
+        for fichier in series["fichiers"]
+        if not fichier.startswith("PLEX-")
+    ] + scanneurvid.chemins_plex_locaux(series_data)
+    fichiers_modifies = scanneurvid.reprendre_index_medias(changements, modifies_par_serie)
+    index_medias.mettre_a_jour(fichiers_locaux, elaguer=False, modifies=fichiers_modifies,
+                               empreintes=scanneurvid.empreintes_par_fichier(series_data))
+
+
+def surveiller(sondage_force=False):
+    """Boucle principale : suit les répertoires et regroupe les mises à jour."""
+    os_name = config.OS_NAME
+    intervalle = getattr(config, 'SURVEILLANCE_INTERVALLE', 60)
+    delai_regroupement = getattr(config, 'SURVEILLANCE_DELAI_REGROUPEMENT', 10)
+    delai_max = getattr(config, 'SURVEILLANCE_DELAI_MAX', 120)
+
+    inotify = None
+    surveilles = {}  # descripteur inotify -> (répertoire, séries)
+    sondees = set()  # séries dont un répertoire est sondé
+    racines = None
+    mtime_definitions = None
+    en_attente = set()
+    premier_evenement = dernier_evenement = None
+    prochain_sondage = 0
+
+    while True:
+        maintenant = time.monotonic()
+
+        # Les définitions ont changé : reconstruire les surveillances si les chemins diffèrent
+        mtime = os.stat(JSON_DEFINITIONS).st_mtime_ns
+        if mtime != mtime_definitions:
+            mtime_definitions = mtime
+            with open(JSON_DEFINITIONS, 'r', encoding='utf-8') as json_file:
+                nouvelles_racines = racines_par_serie(json.load(json_file), os_name)
+            if nouvelles_racines != racines:
+                racines = nouvelles_racines
+                if inotify is not None:
+                    inotify.close()
+                inotify = INotify() if INotify is not None and not sondage_force else None
+                surveilles.clear()
+                sondees.clear()
+                for racine, noms in racines.items():
+                    if inotify is not None and surveillable(racine) and Path(racine).is_dir() \
+                            and ajouter_surveillance(inotify, racine, noms, surveilles):
+                        print(f"Surveillance inotify : {racine}")
+                    else:
+                        print(f"Surveillance par sondage : {racine}")
+                        sondees.update(noms)
+                # Rattraper les changements survenus pendant que rien n'était surveillé
+                en_attente.update(nom for noms in racines.values() for nom in noms)
+
+        if surveilles:
+            evenements = inotify.read(timeout=1000)
+        else:
+            time.sleep(1)
+            evenements = []
+        for evenement in evenements:
+            if evenement.mask & flags.Q_OVERFLOW:
+                # Des événements ont été perdus : toutes les séries suivies sont relues
+                en_attente.update(nom for _, noms in surveilles.values() for nom in noms)
+            elif evenement.wd in surveilles:
+                repertoire, noms = surveilles[evenement.wd]
+                if evenement.mask & flags.IGNORED:
+                    del surveilles[evenement.wd]
+                    continue
+                est_repertoire = evenement.mask & flags.ISDIR
+                if est_repertoire and evenement.mask & (flags.CREATE | flags.MOVED_TO):
+                    ajouter_surveillance(inotify, os.path.join(repertoire, evenement.name), noms, surveilles)
+                if not est_repertoire:
+                    if not evenement.name.lower().endswith(index_repertoires.VIDEO_EXTENSIONS):
+                        continue
+                    if evenement.mask & flags.CREATE:
+                        # Copie en cours : on attend la fermeture du fichier
+                        continue
+                    if evenement.mask & (flags.CLOSE_WRITE | flags.MOVED_TO):
+                        index_repertoires.invalider(repertoire)
+                en_attente.update(noms)
+            else:
+                continue
+            maintenant = time.monotonic()
+            premier_evenement = premier_evenement or maintenant
+            dernier_evenement = maintenant
+
+        if sondees and maintenant >= prochain_sondage:
+            # Un répertoire inchangé ne coûte qu'un stat au balayage incrémental
+            en_attente.update(sondees)
+            prochain_sondage = maintenant + intervalle
+
+        pret = dernier_evenement is None or (
+            maintenant - dernier_evenement >= delai_regroupement or maintenant - premier_evenement >= delai_max
+        )
+        if en_attente and pret:
+            noms = en_attente
+            en_attente = set()
+            premier_evenement = dernier_evenement = None
+            try:
+                mettre_a_jour_series(noms, os_name)
+            except Exception as e:
+                print(f"Erreur lors de la mise à jour des séries {', '.join(sorted(noms))} : {e}")
+
+
+def main():
+    """Surveille les répertoires de séries jusqu'à l'interruption du script."""
+    parser = argparse.ArgumentParser(description="Garde bd_videos.json à jour pendant que les épisodes changent.")
+    parser.add_argument('--sondage', action='store_true', help="Sonde tous les répertoires au lieu d'utiliser inotify")
+    args = parser.parse_args()
+
+    verifier_fichier_existe(str(JSON_DEFINITIONS))
+    if INotify is None and not args.sondage:
+        print("Module 'inotify_simple' absent : tous les répertoires seront sondés.")
+    try:
+        surveiller(args.sondage)
+    except KeyboardInterrupt:
+        print("Surveillance interrompue.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,15 @@
 import os
-import subprocess
 import sys
 import json
 import datetime
+import hashlib
 import locale
-from pydub import AudioSegment
+import math
+import threading
 from pathlib import Path
 import tempfile
-import platform
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     import config
@@ -16,7 +17,27 @@ except ImportError:
     print("Le fichier 'config.py' est manquant. Copiez 'config.py.sample' puis personnalisez-le.")
     sys.exit(1)
 
-from utils import verifier_fichier_existe
+from utils import verifier_fichier_existe, ecrire_json_atomique
+import base_catalogue
+import cache_segments
+import catalogue
+import executeur_ffmpeg
+import index_medias
+import journal_etat
+
+# Niveau visé par la normalisation audio (en dBFS)
+CIBLE_NORMALISATION_DB = -24
+
+# Protège le manifeste des points de contrôle contre les écritures simultanées
+_verrou_manifeste = threading.Lock()
+# Protège le fichier des signatures des encodeurs
+_verrou_signatures = threading.Lock()
+
+# Encodage d'analyse de la complexité : extraits en basse résolution à qualité constante
+ANALYSE_CRF = 23
+ANALYSE_HAUTEUR = 270
+ANALYSE_DUREE_EXTRAIT = 8
+ANALYSE_POSITIONS = (0.2, 0.5, 0.8)
 
 # Fonctions utilitaires pour le transcodage
 
@@ -35,23 +56,19 @@ def obtenir_resolution(format_sortie: str) -> tuple:
         return 1280, 720
     return 1920, 1080
 
-def obtenir_duree_ms(fichier: str) -> int:
+def obtenir_duree_ms(fichier: str, persister: bool = True) -> int:
     """Retourne la durée d'une vidéo en millisecondes."""
-    commande = [
-        'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
-        '-of', 'default=noprint_wrappers=1:nokey=1', fichier
-    ]
-    sortie = subprocess.check_output(commande).decode('utf-8').strip()
-    return int(float(sortie) * 1000)
+    duree = index_medias.obtenir(fichier, persister=persister)['duree']
+    return int(duree * 1000)
 
-def ajouter_chapitres(fichier_final: str, videos_source: list[str], titres: list[str]):
+def ajouter_chapitres(fichier_final: str, videos_source: list[str], titres: list[str], etiquettes=None):
     """Insère des chapitres dans ``fichier_final`` sans perdre les métadonnées."""
     metadata_path = os.path.join(str(config.TRANSCODE_DIR), 'chapitres.txt')
     with open(metadata_path, 'w', encoding='utf-8') as f:
         f.write(';FFMETADATA1\n')
         start = 0
         for vid, titre in zip(videos_source, titres):
-            duree = obtenir_duree_ms(vid)
+            duree = obtenir_duree_ms(vid, persister=False)
             end = start + duree
             f.write('[CHAPTER]\n')
             f.write('TIMEBASE=1/1000\n')
@@ -68,82 +85,370 @@ def ajouter_chapitres(fichier_final: str, videos_source: list[str], titres: list
         '-map_chapters', '1',
         '-c', 'copy', '-y', temp_file
     ]
-    run_ffmpeg_command(commande)
-    os.remove(fichier_final)
-    shutil.move(temp_file, fichier_final)
+    code_retour = run_ffmpeg_command(commande, {**(etiquettes or {}), 'etape': 'chapitres'})
+    if code_retour == 0:
+        os.remove(fichier_final)
+        shutil.move(temp_file, fichier_final)
+    else:
+        print(f"Échec de l'ajout des chapitres (code {code_retour}), fichier conservé sans chapitres.")
     os.remove(metadata_path)
+    return code_retour
 
 python_path = sys.executable  # Donne le chemin du python actif
 
-# Fonction pour détecter si le système d'exploitation est Linux
-def is_linux():
-    """Indique si le système courant est Linux."""
-    return platform.system() == 'Linux'
-
-# Fonction pour exécuter une commande ffmpeg via Docker ou directement
-def run_ffmpeg_command(command):
-    """Lance ``ffmpeg`` en utilisant Docker sous Linux ou localement ailleurs."""
-    if is_linux():
-        docker_command = [
-    	    'docker', 'run', '--rm', 
-            '--device=/dev/dri:/dev/dri',
-            '-v', f'{os.path.abspath(os.getcwd())}:/config',
-            '-v', '/mnt/medias_0:/mnt/medias_0',
-            '-v', '/mnt/médias-voute:/mnt/médias-voute',
-            '-v', f'{str(config.TRANSCODE_DIR)}:/tmp/transcode',
-	    '--user', '0:0',  # Exécute le conteneur en tant que root
-            'linuxserver/ffmpeg',
- #           '-hwaccel', 'qsv',
-        ] + command
-        print(f"Exécution de la commande via Docker : {' '.join(docker_command)}")
-        subprocess.call(docker_command)
-    else:
-        win_command = [
-            'ffmpeg ',
-        ] + command    
-        print(f"Exécution de la commande directement : {' '.join(win_command)}")
-        subprocess.call(win_command)
+# Fonction pour exécuter une commande ffmpeg via le moteur configuré
+def run_ffmpeg_command(command, etiquettes=None):
+    """Lance ``ffmpeg`` avec le moteur configuré et retourne son code de sortie.
+
+    ``etiquettes`` (émission, segment, codec...) accompagne les métriques
+    de l'exécution.
+    """
+    return executeur_ffmpeg.executer(command, etiquettes=etiquettes).returncode
+
+# Fonction pour exécuter ffmpeg en récupérant ses messages
+def capturer_ffmpeg_command(command, etiquettes=None):
+    """Lance ``ffmpeg`` et retourne son code de sortie et sa sortie d'erreur."""
+    resultat = executeur_ffmpeg.executer(command, capturer=True, etiquettes=etiquettes)
+    return resultat.returncode, resultat.stderr
 
 # Fonction pour obtenir la résolution d'une vidéo
 def get_video_resolution(video_path):
     """Retourne la largeur et la hauteur d'une vidéo en pixels."""
     video_path = str(Path(video_path))  # S'assurer que le chemin est portable
-    command = [
-        'ffprobe',
-        '-v', 'error',
-        '-select_streams', 'v:0',
-        '-show_entries', 'stream=width,height',
-        '-of', 'csv=s=x:p=0',
-        video_path
-    ]
-    output = subprocess.check_output(command).decode('utf-8').strip()
-    width, height = map(int, output.split('x'))
+    metadonnees = index_medias.obtenir(video_path)
+    width, height = metadonnees['largeur'], metadonnees['hauteur']
     print(f"Résolution de la vidéo : {width}x{height}")
     return width, height
 
 # Fonction pour normaliser l'audio
-def normalize_audio_relative(input_file, output_file, target_db=-24):
+def normalize_audio_relative(input_file, output_file, target_db=CIBLE_NORMALISATION_DB):
     """Ajuste le volume d'un fichier audio pour viser ``target_db`` décibels."""
+    from pydub import AudioSegment  # Utilisé seulement par le mode « pydub »
+
     audio = AudioSegment.from_file(input_file)
     loudness_difference = target_db - audio.dBFS
     normalized_audio = audio + loudness_difference
     normalized_audio.export(output_file, format="mp4")
     print(f"Audio normalisé et enregistré dans : {output_file}")
 
+def mode_normalisation():
+    """Retourne le mode de normalisation audio configuré (« loudnorm » ou « pydub »)."""
+    return getattr(config, 'NORMALISATION_AUDIO', 'pydub').lower()
+
+def cible_loudnorm():
+    """Retourne la cible EBU R128 (intensité, crête vraie, plage) de la configuration."""
+    return {
+        'I': getattr(config, 'CIBLE_LOUDNESS_LUFS', -24),
+        'TP': getattr(config, 'CRETE_MAX_DBTP', -2),
+        'LRA': getattr(config, 'PLAGE_LOUDNESS_LU', 11),
+    }
+
+# Fonction pour mesurer l'intensité sonore d'une source
+def mesurer_loudness(input_file, etiquettes=None):
+    """Mesure l'intensité sonore EBU R128 de ``input_file`` (premier passage).
+
+    La mesure est lue en continu par ffmpeg, sans charger la piste en
+    mémoire, puis conservée dans l'index des médias. Retourne ``None`` si
+    la source n'a pas de piste audio mesurable.
+    """
+    cible = cible_loudnorm()
+    mesure = index_medias.valeur(input_file, 'loudnorm')
+    if mesure and mesure.get('cible') == cible:
+        return mesure
+
+    filtre = 'loudnorm=I={I}:TP={TP}:LRA={LRA}:print_format=json'.format(**cible)
+    command = [
+        '-hide_banner', '-nostats',
+        '-i', input_file,
+        '-map', '0:a:0',
+        '-af', filtre,
+        '-f', 'null', '-',
+    ]
+    code_retour, sortie = capturer_ffmpeg_command(command, {**(etiquettes or {}), 'etape': 'mesure_loudness'})
+    debut, fin = sortie.rfind('{'), sortie.rfind('}')
+    if code_retour != 0 or debut == -1 or fin < debut:
+        print(f"Mesure de l'intensité sonore impossible pour : {input_file}")
+        return None
+    try:
+        resultat = json.loads(sortie[debut:fin + 1])
+        mesure = {
+            'cible': cible,
+            'input_i': float(resultat['input_i']),
+            'input_tp': float(resultat['input_tp']),
+            'input_lra': float(resultat['input_lra']),
+            'input_thresh': float(resultat['input_thresh']),
+            'target_offset': float(resultat['target_offset']),
+        }
+    except (ValueError, KeyError) as e:
+        print(f"Mesure de l'intensité sonore illisible pour {input_file} : {e}")
+        return None
+    if any(math.isinf(v) for k, v in mesure.items() if k != 'cible'):
+        print(f"Piste audio silencieuse, pas de normalisation : {input_file}")
+        return None
+
+    index_medias.enregistrer_valeur(input_file, 'loudnorm', mesure)
+    return mesure
+
+def filtre_loudnorm(mesure):
+    """Construit le filtre ``loudnorm`` du second passage à partir d'une mesure."""
+    cible = mesure['cible']
+    return (
+        f"loudnorm=I={cible['I']}:TP={cible['TP']}:LRA={cible['LRA']}"
+        f":measured_I={mesure['input_i']}:measured_TP={mesure['input_tp']}"
+        f":measured_LRA={mesure['input_lra']}:measured_thresh={mesure['input_thresh']}"
+        f":offset={mesure['target_offset']}:linear=true"
+    )
+
+# Analyse de la complexité des sources pour le débit adaptatif
+
+def debit_adaptatif() -> bool:
+    """Indique si le débit vidéo est choisi selon la complexité de chaque source."""
+    return bool(getattr(config, 'DEBIT_ADAPTATIF', False))
+
+def parametres_debit() -> dict:
+    """Réglages qui déterminent le débit choisi pour une source."""
+    if not debit_adaptatif():
+        return {'mode': 'fixe', 'bitrate': getattr(config, 'BITRATE_VIDEO', 1000)}
+    return {
+        'mode': 'adaptatif',
+        'bitrate': getattr(config, 'BITRATE_VIDEO', 1000),
+        'minimum': getattr(config, 'DEBIT_VIDEO_MIN', 500),
+        'maximum': getattr(config, 'DEBIT_VIDEO_MAX', 2500),
+        'reference': getattr(config, 'DEBIT_REFERENCE_ANALYSE', 400),
+    }
+
+def mesurer_complexite(input_file, etiquettes=None):
+    """Mesure la complexité visuelle de ``input_file`` par un encodage d'essai.
+
+    Quelques extraits sont encodés en basse résolution à qualité constante
+    (CRF). Le débit obtenu indique combien de bits la source demande : un
+    dessin animé statique donne un débit faible, un film d'action un débit
+    élevé. La mesure est conservée dans l'index des médias, si bien que
+    chaque fichier n'est analysé qu'une fois. Retourne le débit d'analyse
+    en kb/s, ou ``None`` si l'analyse échoue.
+    """
+    parametres = {'crf': ANALYSE_CRF, 'hauteur': ANALYSE_HAUTEUR,
+                  'duree': ANALYSE_DUREE_EXTRAIT, 'positions': list(ANALYSE_POSITIONS)}
+    mesure = index_medias.valeur(input_file, 'complexite')
+    if mesure and mesure.get('parametres') == parametres:
+        return mesure['debit_analyse_kbps']
+
+    duree = index_medias.obtenir(input_file)['duree'] or 0
+    if duree <= ANALYSE_DUREE_EXTRAIT * len(ANALYSE_POSITIONS):
+        extraits = [(0, duree or ANALYSE_DUREE_EXTRAIT)]  # Source courte : analysée en entier
+    else:
+        extraits = [(duree * position, ANALYSE_DUREE_EXTRAIT) for position in ANALYSE_POSITIONS]
+
+    # Le fichier d'essai est placé dans TRANSCODE_DIR, visible des moteurs Docker
+    os.makedirs(str(config.TRANSCODE_DIR), exist_ok=True)
+    descripteur, essai = tempfile.mkstemp(dir=str(config.TRANSCODE_DIR), prefix='analyse_', suffix='.mkv')
+    os.close(descripteur)
+    octets = 0
+    try:
+        for debut, longueur in extraits:
+            command = [
+                '-hide_banner', '-loglevel', 'error',
+                '-ss', f'{debut:.3f}', '-t', f'{longueur:.3f}',
+                '-i', input_file,
+                '-map', '0:v:0', '-an',
+                '-vf', f'scale=-2:{ANALYSE_HAUTEUR}',
+                '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', str(ANALYSE_CRF),
+                '-f', 'matroska', '-y', essai,
+            ]
+            code_retour = run_ffmpeg_command(command, {**(etiquettes or {}), 'etape': 'analyse_complexite'})
+            if code_retour != 0:
+                print(f"Analyse de complexité impossible pour : {input_file}")
+                return None
+            octets += os.path.getsize(essai)
+    finally:
+        os.remove(essai)
+
+    duree_analysee = sum(longueur for _, longueur in extraits)
+    debit_analyse = round(octets * 8 / 1000 / duree_analysee, 1)
+    index_medias.enregistrer_valeur(input_file, 'complexite', {
+        'parametres': parametres,
+        'debit_analyse_kbps': debit_analyse,
+    })
+    return debit_analyse
+
+def debit_video(input_file, etiquettes=None) -> int:
+    """Débit vidéo (kb/s) à appliquer à ``input_file``.
+
+    En mode adaptatif, ``BITRATE_VIDEO`` est le débit d'une source de
+    complexité de référence (``DEBIT_REFERENCE_ANALYSE``); les autres
+    sources reçoivent un débit proportionnel à leur complexité mesurée,
+    borné par ``DEBIT_VIDEO_MIN`` et ``DEBIT_VIDEO_MAX``.
+    """
+    parametres = parametres_debit()
+    if parametres['mode'] == 'fixe':
+        return parametres['bitrate']
+    debit_analyse = mesurer_complexite(input_file, etiquettes)
+    if debit_analyse is None:
+        return parametres['bitrate']
+    debit = parametres['bitrate'] * debit_analyse / parametres['reference']
+    debit = int(min(max(debit, parametres['minimum']), parametres['maximum']))
+    print(f"Débit choisi pour {os.path.basename(input_file)} : {debit} kb/s (analyse : {debit_analyse} kb/s)")
+    return debit
+
+# Passage direct des sources déjà au format de diffusion
+
+def famille_codec(codec: str) -> str:
+    """Nom ffprobe du format produit par un encodeur (« libx265 » -> « hevc »)."""
+    for famille, encodeurs in (('hevc', ('libx265', 'hevc_qsv', 'hevc')), ('h264', ('libx264', 'h264_qsv', 'h264'))):
+        if codec in encodeurs:
+            return famille
+    return codec
+
+def chemin_signatures() -> Path:
+    """Fichier des signatures des segments produits par chaque encodeur."""
+    return index_medias.chemin_index().with_name('signatures_encodeurs.json')
+
+def signature_video(metadonnees: dict) -> list:
+    """Paramètres du flux vidéo qui doivent être identiques pour concaténer sans réencodage.
+
+    Le démultiplexeur concat avec ``-c copy`` ne garde que les paramètres
+    (``hvcC``/``avcC``) du premier segment : profil, niveau, étiquette et
+    encodeur doivent être ceux des segments produits par ``transcode_video``.
+    """
+    encodeur = metadonnees.get('encodeur_video')
+    return [
+        metadonnees.get('codec_video'),
+        metadonnees.get('profil_video'),
+        metadonnees.get('niveau_video'),
+        metadonnees.get('etiquette_video'),
+        encodeur.split()[-1] if encodeur else None,
+    ]
+
+def cle_signatures(codec) -> str:
+    """Clé des signatures : les réglages d'encodage du segment."""
+    contenu = json.dumps(reglages_encodage(codec), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenu.encode('utf-8')).hexdigest()
+
+def lire_signatures() -> dict:
+    """Signatures connues, par clé de réglages."""
+    try:
+        with open(chemin_signatures(), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def noter_signature(fichier, codec):
+    """Retient la signature d'un segment que ``codec`` vient de produire."""
+    try:
+        signature = signature_video(index_medias.obtenir(fichier, persister=False))
+    except RuntimeError as e:
+        print(f"Signature du segment {fichier} inconnue : {e}")
+        return
+    cle = cle_signatures(codec)
+    with _verrou_signatures:
+        # Relu juste avant l'écriture pour garder les signatures notées par d'autres processus
+        signatures = lire_signatures()
+        if signature not in signatures.get(cle, []):
+            signatures.setdefault(cle, []).append(signature)
+            ecrire_json_atomique(chemin_signatures(), signatures)
+
+def video_compatible(metadonnees: dict, codec: str) -> bool:
+    """Indique si la vidéo peut être copiée telle quelle dans l'émission.
+
+    En plus du format, le flux doit avoir la signature (profil, niveau,
+    étiquette, encodeur) d'un segment déjà produit par ``codec`` avec les
+    réglages actuels : tant qu'aucun segment n'a été encodé, rien n'est copié.
+    """
+    target_width, target_height = obtenir_resolution(config.FORMAT_SORTIE)
+    parametres = parametres_debit()
+    debit_max = parametres.get('maximum', parametres['bitrate'])
+    return (
+        signature_video(metadonnees) in lire_signatures().get(cle_signatures(codec), [])
+        and metadonnees.get('largeur') == target_width
+        and metadonnees.get('hauteur') == target_height
+        and metadonnees.get('sar') in ('1:1', 'N/A')
+        and metadonnees.get('images_par_seconde') == '24000/1001'
+        and metadonnees.get('codec_video') == famille_codec(codec)
+        and metadonnees.get('format_pixels') == 'yuv420p'
+        # Un débit inconnu (conteneur sans l'information) n'empêche pas la copie
+        and (metadonnees.get('debit_video') or 0) <= debit_max * 1.5
+    )
+
+def audio_compatible(metadonnees: dict) -> bool:
+    """Indique si le format de la piste audio est celui de la diffusion."""
+    return (
+        metadonnees.get('codec_audio') == 'aac'
+        and metadonnees.get('frequence_audio') == 48000
+        and metadonnees.get('canaux_audio') == 2
+    )
+
+def loudness_conforme(mesure) -> bool:
+    """Indique si une mesure EBU R128 est déjà assez proche de la cible."""
+    if mesure is None:
+        return True  # Piste silencieuse ou non mesurable : rien à corriger
+    tolerance = getattr(config, 'TOLERANCE_LOUDNESS_LU', 1)
+    cible = mesure['cible']
+    return abs(mesure['input_i'] - cible['I']) <= tolerance and mesure['input_tp'] <= cible['TP']
+
+def remuxer_video(input_file, output_file, codec, etiquettes):
+    """Produit le segment d'une source déjà au format sans réencoder la vidéo.
+
+    La vidéo est toujours copiée. L'audio est copié lui aussi s'il a le bon
+    format et la bonne intensité sonore; sinon, seule la piste audio est
+    réencodée (avec le gain mesuré en mode « loudnorm »). Retourne ``None``
+    si la source doit passer par le transcodage complet.
+    """
+    metadonnees = index_medias.obtenir(input_file)
+    if not getattr(config, 'PASSTHROUGH_COMPATIBLE', False) or not video_compatible(metadonnees, codec):
+        return None
+
+    temp_audio_file = None
+    entrees = ['-i', input_file]
+    carte_audio = '0:a:0?'
+    options_audio = ['-c:a', 'aac', '-b:a', '128k', '-ar', '48000', '-ac', '2']
+    if mode_normalisation() == 'loudnorm':
+        mesure = mesurer_loudness(input_file, etiquettes)
+        if audio_compatible(metadonnees) and loudness_conforme(mesure):
+            options_audio = ['-c:a', 'copy']
+            print(f"Source déjà au format de diffusion, copie sans réencodage : {input_file}")
+        else:
+            if not loudness_conforme(mesure):
+                options_audio = ['-af', filtre_loudnorm(mesure)] + options_audio
+            print(f"Vidéo copiée, seul l'audio est réencodé : {input_file}")
+    else:
+        nom_segment = os.path.splitext(os.path.basename(output_file))[0]
+        temp_audio_file = os.path.join(os.path.dirname(output_file), f'{nom_segment}_audio_normalized.mp4')
+        normalize_audio_relative(input_file, temp_audio_file, CIBLE_NORMALISATION_DB)
+        entrees += ['-i', temp_audio_file]
+        carte_audio = '1:a'
+        print(f"Vidéo copiée, seul l'audio est réencodé : {input_file}")
+
+    command = entrees + [
+        '-map', '0:v:0',
+        '-map', carte_audio,
+        '-c:v', 'copy',
+    ] + options_audio + [
+        # Même base de temps que les segments encodés pour la concaténation
+        '-video_track_timescale', '24000',
+        '-y',
+        output_file,
+    ]
+    code_retour = run_ffmpeg_command(command, {**etiquettes, 'etape': 'passthrough'})
+
+    if temp_audio_file and os.path.exists(temp_audio_file):
+        os.remove(temp_audio_file)
+    return code_retour
+
 # Fonction pour transcoder une vidéo
-def transcode_video(input_file, output_file, codec):
-    """Transcode une vidéo en appliquant un redimensionnement et un codec."""
+def transcode_video(input_file, output_file, codec, etiquettes=None):
+    """Transcode une vidéo en appliquant un redimensionnement et un codec.
+
+    Une source déjà au format de diffusion est seulement remuxée (voir
+    ``remuxer_video``).
+    """
+    etiquettes = {**(etiquettes or {}), 'codec': codec}
+    code_retour = remuxer_video(input_file, output_file, codec, etiquettes)
+    if code_retour is not None:
+        return code_retour
+
     width, height = get_video_resolution(input_file)
     
-    command_sar = [
-        'ffprobe',
-        '-v', 'error',
-        '-select_streams', 'v:0',
-        '-show_entries', 'stream=sample_aspect_ratio',
-        '-of', 'csv=p=0',
-        str(Path(input_file))
-    ]
-    sar = subprocess.check_output(command_sar).decode('utf-8').strip()
+    sar = index_medias.obtenir(input_file)['sar']
 
     new_width = width
     padded_width = width
@@ -173,29 +478,52 @@ def transcode_video(input_file, output_file, codec):
 
     scale_filter = f'scale={padded_width}:{padded_height},setsar=1:1' if sar != 'N/A' and sar != '1:1' else f'scale={padded_width}:{padded_height}'
 
-    temp_audio_file = os.path.join(os.path.dirname(output_file), 'audio_normalized.mp4')
-    normalize_audio_relative(input_file, temp_audio_file)
+    threads = getattr(config, 'THREADS_PAR_TRAVAILLEUR', 1)
+    temp_audio_file = None
+    filtre_audio = None
+
+    if mode_normalisation() == 'loudnorm':
+        # La source n'est lue qu'une fois : le gain mesuré est appliqué dans
+        # le graphe de filtres de l'encodage principal.
+        mesure = mesurer_loudness(input_file, etiquettes)
+        if mesure:
+            filtre_audio = filtre_loudnorm(mesure)
+        entrees = ['-i', input_file]
+        carte_audio = '0:a:0?'
+    else:
+        # Fichier audio temporaire propre à chaque segment pour permettre
+        # plusieurs transcodages simultanés dans le même répertoire.
+        nom_segment = os.path.splitext(os.path.basename(output_file))[0]
+        temp_audio_file = os.path.join(os.path.dirname(output_file), f'{nom_segment}_audio_normalized.mp4')
+        normalize_audio_relative(input_file, temp_audio_file, CIBLE_NORMALISATION_DB)
+        entrees = ['-i', input_file, '-i', temp_audio_file]
+        carte_audio = '1:a'
 
     print("Début du transcodage vidéo")
     command = [
-        '-threads', '1',
-        '-i', input_file,
-        '-i', temp_audio_file,
+        '-threads', str(threads),
+    ] + entrees + [
         '-map', '0:v',
-        '-map', '1:a',
+        '-map', carte_audio,
         '-c:v', codec,
     ]
 
  #   if codec.startswith('hevc'):
  #       command += ['-profile:v', 'main']
 
-    bitrate = getattr(config, 'BITRATE_VIDEO', 1000)
+    bitrate = debit_video(input_file, etiquettes)
 
     command += [
         '-b:v', f'{bitrate}k',
         '-maxrate', f'{bitrate}k',
         '-bufsize', f'{bitrate * 2}k',
         '-vf', f'{scale_filter},pad={target_width}:{target_height}:{padding_horizontal}:{padding_vertical}:black',
+    ]
+
+    if filtre_audio:
+        command += ['-af', filtre_audio]
+
+    command += [
         '-c:a', 'aac',
         '-b:a', '128k',
         '-ar', '48000',
@@ -210,15 +538,220 @@ def transcode_video(input_file, output_file, codec):
 
     command.append(output_file)
 
-    run_ffmpeg_command(command)
+    code_retour = run_ffmpeg_command(command, {**etiquettes, 'etape': 'transcodage'})
+    if code_retour == 0 and os.path.exists(output_file):
+        noter_signature(output_file, codec)
+
+    if temp_audio_file:
+        try:
+            os.remove(temp_audio_file)
+        except FileNotFoundError:
+            print(f"Le fichier temporaire {temp_audio_file} n'existe pas.")
+
+    return code_retour
+
+def reglages_encodage(codec):
+    """Regroupe les réglages qui déterminent le contenu d'un segment transcodé."""
+    reglages = {
+        'format_sortie': config.FORMAT_SORTIE,
+        'codec': codec,
+        # En mode adaptatif, le débit découle de la source, déjà dans la clé
+        'bitrate': parametres_debit() if debit_adaptatif() else getattr(config, 'BITRATE_VIDEO', 1000),
+        'normalisation': (
+            {'mode': 'loudnorm', **cible_loudnorm()}
+            if mode_normalisation() == 'loudnorm'
+            else {'mode': 'pydub', 'db': CIBLE_NORMALISATION_DB}
+        ),
+    }
+    if getattr(config, 'PASSTHROUGH_COMPATIBLE', False):
+        reglages['passthrough'] = {'tolerance_loudness': getattr(config, 'TOLERANCE_LOUDNESS_LU', 1)}
+    return reglages
+
+def transcoder_segment(input_file, output_file, codec, etiquettes=None):
+    """Transcode un segment en réutilisant le cache lorsque c'est possible.
+
+    Un segment récupéré du cache est un lien physique vers son entrée :
+    ffmpeg écrit donc dans un fichier temporaire qui remplace ensuite
+    ``output_file`` par un renommage, sans jamais réécrire l'entrée en place.
+    """
+    cle = None
+    if cache_segments.cache_actif():
+        cle = cache_segments.cle_segment(input_file, reglages_encodage(codec))
+        if cache_segments.recuperer(cle, output_file):
+            return 0
+
+    temporaire = f'{os.path.splitext(output_file)[0]}.encodage.mp4'
+    code_retour = transcode_video(input_file, temporaire, codec, etiquettes)
+    if code_retour == 0 and os.path.exists(temporaire):
+        os.replace(temporaire, output_file)
+    elif os.path.exists(temporaire):
+        os.remove(temporaire)
+
+    if cle and code_retour == 0 and os.path.exists(output_file):
+        cache_segments.enregistrer(cle, output_file)
+    return code_retour
+
+def repertoire_mezzanine() -> Path:
+    """Répertoire de la bibliothèque mezzanine (sources déjà converties)."""
+    return Path(getattr(config, 'MEZZANINE_DIR', Path(tempfile.gettempdir()) / 'mezzanine'))
+
+def segment_mezzanine(input_file, codec):
+    """Retourne la version mezzanine de ``input_file`` si elle existe.
+
+    Le nom du fichier mezzanine dépend de la source et des réglages
+    d'encodage : un fichier modifié ou un changement de réglages le rend
+    simplement introuvable.
+    """
+    if not getattr(config, 'MEZZANINE_DIR', None):
+        return None
+    cle = cache_segments.cle_segment(input_file, reglages_encodage(codec))
+    chemin = repertoire_mezzanine() / f'{cle}.mp4'
+    return str(chemin) if chemin.exists() else None
+
+# Fonction pour transcoder tous les segments d'une émission
+def transcoder_segments(fichiers_concatenes, input_dir, emission_dir, codec, segments_prets=(), etiquettes=None,
+                        cles=None):
+    """Transcode les segments d'une émission, en parallèle si configuré.
+
+    Le nombre de transcodages simultanés est donné par
+    ``config.NB_TRAVAILLEURS_TRANSCODAGE``. La fonction ne retourne
+    qu'une fois le dernier segment terminé et renvoie la liste des couples
+    ``(source, segment produit)``, dans l'ordre de l'émission.
+
+    Les segments listés dans ``segments_prets`` sont déjà valides et ne
+    sont pas transcodés de nouveau. Une source déjà convertie dans la
+    bibliothèque mezzanine est utilisée telle quelle. Lorsque ``cles`` est
+    fourni, chaque segment terminé est noté aussitôt dans le manifeste de
+    ``emission_dir``.
+    """
+    etiquettes = etiquettes or {}
 
+    def traiter(i, input_file, transcode_output):
+        code_retour = transcoder_segment(input_file, transcode_output, codec, {**etiquettes, 'segment': i})
+        if cles and code_retour == 0 and os.path.exists(transcode_output):
+            noter_point_controle(Path(emission_dir), i, cles[i - 1], transcode_output)
+        return code_retour
+
+    taches = []
+    segments = {}
+    for i, fichier in enumerate(fichiers_concatenes, start=1):
+        input_file = os.path.join(input_dir, fichier)
+        transcode_output = os.path.join(emission_dir, f'{i:02}.mp4')
+        if transcode_output in segments_prets:
+            segments[i] = (input_file, transcode_output)
+        elif not os.path.exists(input_file):
+            print(f"Le fichier '{input_file}' n'existe pas. Passage au fichier suivant.")
+        else:
+            mezzanine = segment_mezzanine(input_file, codec)
+            if mezzanine:
+                print(f"Segment mezzanine utilisé pour : {input_file}")
+                segments[i] = (input_file, mezzanine)
+            else:
+                taches.append((i, input_file, transcode_output))
+
+    nb_travailleurs = max(1, int(getattr(config, 'NB_TRAVAILLEURS_TRANSCODAGE', 1)))
+    nb_travailleurs = min(nb_travailleurs, max(1, len(taches)))
+
+    if nb_travailleurs == 1:
+        codes = [traiter(i, input_file, transcode_output) for i, input_file, transcode_output in taches]
+    else:
+        print(f"Transcodage de {len(taches)} segments avec {nb_travailleurs} travailleurs")
+        with ThreadPoolExecutor(max_workers=nb_travailleurs) as pool:
+            futures = [
+                pool.submit(traiter, i, input_file, transcode_output)
+                for i, input_file, transcode_output in taches
+            ]
+            # Attendre tous les segments et propager une éventuelle erreur
+            codes = [future.result() for future in futures]
+
+    for (i, input_file, transcode_output), code_retour in zip(taches, codes):
+        if code_retour != 0:
+            print(f"Échec du transcodage de '{input_file}' (code {code_retour}). Segment ignoré.")
+            if os.path.exists(transcode_output):
+                os.remove(transcode_output)
+        elif os.path.exists(transcode_output):
+            segments[i] = (input_file, transcode_output)
+
+    return [segments[i] for i in sorted(segments)]
+
+def echapper_ffmetadata(valeur: str) -> str:
+    """Protège les caractères spéciaux d'une valeur du format FFMETADATA."""
+    for caractere in ('\\', '=', ';', '#', '\n'):
+        valeur = valeur.replace(caractere, '\\' + caractere)
+    return valeur
+
+def duree_segment_ms(source: str, segment: str) -> int:
+    """Durée du segment produit, ou à défaut celle de sa source.
+
+    La conversion à 24000/1001 images/s et l'amorce AAC changent un peu
+    la durée de chaque segment : les chapitres suivent celle du segment.
+    """
     try:
-        os.remove(temp_audio_file)
-    except FileNotFoundError:
-        print(f"Le fichier temporaire {temp_audio_file} n'existe pas.")
+        return obtenir_duree_ms(segment, persister=False)
+    except (RuntimeError, TypeError):
+        return obtenir_duree_ms(source)
+
+# Fonction pour assembler une émission en un seul passage
+def assembler_emission(video_files, output_file, metadata_title, metadata_description, chapters=None, durees_ms=None,
+                       etiquettes=None):
+    """Concatène les segments et écrit métadonnées et chapitres en un seul passage.
+
+    Les chapitres sont calculés à partir de ``durees_ms`` (déjà connues) et
+    l'atome ``moov`` est placé en tête du fichier pour la lecture en continu.
+    """
+    # Fichiers de travail placés à côté de la sortie pour permettre
+    # d'assembler une émission préparée d'avance hors de TRANSCODE_DIR.
+    base_temporaire = os.path.splitext(output_file)[0]
+    concat_file_path = f'{base_temporaire}.concat.txt'
+    metadata_path = f'{base_temporaire}.metadonnees.txt'
+
+    with open(concat_file_path, 'w', encoding='utf-8') as f:
+        for video_file in video_files:
+            f.write(f"file '{video_file}'\n")
+
+    with open(metadata_path, 'w', encoding='utf-8') as f:
+        f.write(';FFMETADATA1\n')
+        f.write(f'title={echapper_ffmetadata(metadata_title)}\n')
+        f.write(f'description={echapper_ffmetadata(metadata_description)}\n')
+        f.write('language=fre\n')
+        if chapters and durees_ms:
+            start = 0
+            for duree, titre in zip(durees_ms, chapters):
+                end = start + duree
+                f.write('[CHAPTER]\n')
+                f.write('TIMEBASE=1/1000\n')
+                f.write(f'START={start}\n')
+                f.write(f'END={end}\n')
+                f.write(f'title={echapper_ffmetadata(titre)}\n')
+                start = end
+
+    command = [
+        '-f', 'concat',
+        '-safe', '0',
+        '-i', concat_file_path,
+        '-i', metadata_path,
+        '-map_metadata', '1',
+        '-map_chapters', '1',
+        '-c', 'copy',
+        '-movflags', '+faststart',
+        '-y',
+        output_file
+    ]
+
+    code_retour = run_ffmpeg_command(command, {**(etiquettes or {}), 'etape': 'assemblage'})
+    if code_retour == 0:
+        print("Émission assemblée avec succès")
+
+    for fichier_temporaire in (concat_file_path, metadata_path):
+        try:
+            os.remove(fichier_temporaire)
+        except FileNotFoundError:
+            print(f"Le fichier temporaire {fichier_temporaire} n'existe pas.")
+
+    return code_retour
 
 # Fonction pour concaténer plusieurs vidéos
-def concatenate_videos(video_files, output_file, metadata_title, metadata_description, chapters=None):
+def concatenate_videos(video_files, output_file, metadata_title, metadata_description, chapters=None, etiquettes=None):
     """Assemble plusieurs vidéos en une seule et ajoute les chapitres."""
     # Utiliser un fichier temporaire pour concatener
     concat_file_path = os.path.join(str(config.TRANSCODE_DIR), 'concat.txt')
@@ -241,7 +774,10 @@ def concatenate_videos(video_files, output_file, metadata_title, metadata_descri
     
     print(f"Commande concaténation {concat_command}")
 
-    run_ffmpeg_command(concat_command)
+    code_retour = run_ffmpeg_command(concat_command, {**(etiquettes or {}), 'etape': 'assemblage'})
+    if code_retour != 0:
+        print(f"Échec de la concaténation (code {code_retour})")
+        return code_retour
     print("Vidéos concaténées avec succès")
 
 
@@ -258,23 +794,36 @@ def concatenate_videos(video_files, output_file, metadata_title, metadata_descri
         temp_output_file
     ]
 
-    run_ffmpeg_command(metadata_command)
-
-    os.remove(output_file)
-    shutil.move(temp_output_file, output_file)  # Utiliser shutil.move pour déplacer le fichier temp.mp4
+    if run_ffmpeg_command(metadata_command, {**(etiquettes or {}), 'etape': 'metadonnees'}) == 0:
+        os.remove(output_file)
+        shutil.move(temp_output_file, output_file)  # Utiliser shutil.move pour déplacer le fichier temp.mp4
+    else:
+        print("Échec de l'ajout des métadonnées, fichier conservé sans métadonnées.")
 
     if chapters:
-        ajouter_chapitres(output_file, existing_video_files, chapters)
+        ajouter_chapitres(output_file, existing_video_files, chapters, etiquettes)
 
     try:
         os.remove(concat_file_path)
     except FileNotFoundError:
         print(f"Le fichier temporaire {concat_file_path} n'existe pas.")
 
+    return code_retour
+
 # Fonction pour mettre à jour le fichier emissions_def.json
 def update_emissions_def(emissions, emission, rep_mode):
     """Met à jour le suivi des épisodes dans ``emissions_def.json``."""
     verifier_fichier_existe('emissions_def.json')
+    if base_catalogue.actif():
+        # Chaque série avance dans sa propre transaction, sans réécrire les autres
+        base_catalogue.synchroniser()
+        for series_name in ([] if rep_mode else emission['a_incrementer']):
+            if base_catalogue.avancer_prochain(series_name) is None:
+                print(f"La série '{series_name}' n'a pas été trouvée dans emissions_def['series'].")
+        base_catalogue.exporter('emissions_def.json')
+        print("Mise à jour du fichier emissions_def.json terminée")
+        return
+
     with open('emissions_def.json', encoding='utf-8') as emissions_def_file:
         emissions_def = json.load(emissions_def_file)
 
@@ -283,16 +832,14 @@ def update_emissions_def(emissions, emission, rep_mode):
     else:
         series_to_increment = emission['a_incrementer']
 
+    series_par_nom = catalogue.Catalogue(emissions_def)
     for series_name in series_to_increment:
         if 'series' in emissions_def:
-            series_list = emissions_def['series']
-
-            for series in series_list:
-                if series['nom'] == series_name:
-                    series['prochain'] = (series.get('prochain', 1) + 1) % (series.get('nb_episodes', 1) + 1)
-                    if series['prochain'] == 0:
-                        series['prochain'] = 1
-                    break
+            series = series_par_nom.definition(series_name)
+            if series is not None:
+                series['prochain'] = (series.get('prochain', 1) + 1) % (series.get('nb_episodes', 1) + 1)
+                if series['prochain'] == 0:
+                    series['prochain'] = 1
             else:
                 print(f"La série '{series_name}' n'a pas été trouvée dans emissions_def['series'].")
         else:
@@ -302,9 +849,225 @@ def update_emissions_def(emissions, emission, rep_mode):
         json.dump(emissions_def, emissions_def_file, indent=4, ensure_ascii=False)
     print("Mise à jour du fichier emissions_def.json terminée")
 
+def nom_fichier_emission(emission) -> str:
+    """Nom du fichier final d'une émission."""
+    return f"{emission['titre']} - {emission['date_diffusion']}.mp4"
+
+# Fonction pour construire une émission complète
+def construire_emission(emission, emission_dir, input_dir, codec):
+    """Transcode les segments d'une émission dans ``emission_dir`` puis les assemble.
+
+    ``emission_dir`` sert de point de contrôle : son manifeste note chaque
+    segment terminé avec sa somme de contrôle. Une construction interrompue
+    reprend aux segments manquants et une émission déjà assemblée n'est pas
+    refaite. Retourne le fichier final, le code de sortie de l'assemblage
+    et la liste des segments utilisés.
+    """
+    titre_emission = emission['titre']
+    date_diffusion = emission['date_diffusion']
+    fichiers_concatenes = emission['fichiers_concatenes']
+    description_emission = emission['description']
+
+    date_diffusion_obj = datetime.datetime.strptime(date_diffusion, '%Y-%m-%d')
+    nom_jour = date_diffusion_obj.strftime('%Y-%m-%d')
+
+    output_file = os.path.join(emission_dir, nom_fichier_emission(emission))
+    print(f"Début du traitement de l'émission '{titre_emission}'")
+
+    os.makedirs(emission_dir, exist_ok=True)
+    cles = cles_segments(fichiers_concatenes, input_dir, codec)
+    manifeste = reprendre_points_controle(Path(emission_dir), fichiers_concatenes, cles)
+    if fichier_intact(output_file, manifeste['emission']):
+        print(f"Émission '{titre_emission}' déjà assemblée : {output_file}")
+        return output_file, 0, []
+    if os.path.exists(output_file):
+        # Assemblage périmé, peut-être déjà publié par un lien physique : il est retiré, pas réécrit
+        os.remove(output_file)
+    segments_prets = {os.path.join(emission_dir, f'{int(numero):02}.mp4') for numero in manifeste['segments']}
+
+    etiquettes = {'emission': f'{titre_emission} - {date_diffusion}'}
+    segments = transcoder_segments(fichiers_concatenes, input_dir, emission_dir, codec, segments_prets, etiquettes,
+                                   cles)
+    video_files = [segment for _, segment in segments]
+
+    chapitres = [os.path.splitext(os.path.basename(source))[0] for source, _ in segments]
+    if getattr(config, 'ASSEMBLAGE_UNE_PASSE', False):
+        durees_ms = [duree_segment_ms(source, segment) for source, segment in segments]
+        code_retour = assembler_emission(video_files, output_file, f'Émission du {nom_jour}',
+                                         description_emission, chapitres, durees_ms, etiquettes)
+    else:
+        code_retour = concatenate_videos(video_files, output_file, f'Émission du {nom_jour}',
+                                         description_emission, chapitres, etiquettes)
+
+    if code_retour == 0:
+        noter_point_controle(Path(emission_dir), None, None, output_file)
+    return output_file, code_retour, video_files
+
+# Points de contrôle des émissions en cours de construction
+
+def repertoire_points_controle(emission) -> Path:
+    """Répertoire de construction d'une émission dans ``TRANSCODE_DIR``."""
+    return Path(config.TRANSCODE_DIR) / 'points_controle' / f"{emission['date_diffusion']} - {emission['titre']}"
+
+def empreinte_fichier(chemin) -> dict:
+    """Taille et somme de contrôle SHA-256 d'un fichier produit."""
+    sha = hashlib.sha256()
+    with open(chemin, 'rb') as f:
+        for bloc in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(bloc)
+    return {'taille': os.path.getsize(chemin), 'sha256': sha.hexdigest()}
+
+def fichier_intact(chemin, empreinte) -> bool:
+    """Vérifie qu'un fichier correspond à l'empreinte notée dans le manifeste."""
+    if not empreinte or not os.path.exists(chemin) or os.path.getsize(chemin) != empreinte.get('taille'):
+        return False
+    return empreinte_fichier(chemin)['sha256'] == empreinte.get('sha256')
+
+def reprendre_points_controle(repertoire: Path, fichiers_concatenes, cles) -> dict:
+    """Réécrit le manifeste de ``repertoire`` en ne gardant que le travail valide.
+
+    Un segment n'est conservé que si sa source et les réglages n'ont pas
+    changé (même clé) et si le fichier correspond à sa somme de contrôle.
+    Les autres segments du répertoire sont supprimés plutôt que réencodés
+    par-dessus : ils peuvent être des liens physiques vers le cache.
+    """
+    ancien = lire_manifeste(repertoire) or {}
+    segments = {}
+    for numero, point in ancien.get('segments', {}).items():
+        i = int(numero)
+        cle = cles[i - 1] if 0 < i <= len(cles) else None
+        if cle is not None and point.get('cle') == cle and fichier_intact(repertoire / f'{i:02}.mp4', point):
+            segments[numero] = point
+
+    conserves = {int(numero) for numero in segments}
+    for fichier in repertoire.glob('*.mp4'):
+        # NN.mp4, et NN.encodage.mp4 laissé par un encodage interrompu
+        numero = fichier.name.split('.')[0]
+        if numero.isdigit() and (int(numero) not in conserves or fichier.name != f'{int(numero):02}.mp4'):
+            print(f"Segment périmé supprimé : {fichier}")
+            fichier.unlink()
+
+    manifeste = {
+        'fichiers_concatenes': fichiers_concatenes,
+        'cles': cles,
+        'segments': segments,
+        'emission': ancien.get('emission') if ancien.get('cles') == cles else None,
+    }
+    with _verrou_manifeste:
+        ecrire_json_atomique(repertoire / 'manifeste.json', manifeste)
+    if segments:
+        print(f"Reprise de {repertoire} : {len(segments)} segment(s) déjà terminé(s).")
+    return manifeste
+
+def noter_point_controle(repertoire: Path, numero, cle, fichier):
+    """Note un segment terminé (ou l'émission assemblée si ``numero`` est ``None``)."""
+    point = empreinte_fichier(fichier)
+    with _verrou_manifeste:
+        manifeste = lire_manifeste(repertoire) or {'segments': {}}
+        if numero is None:
+            manifeste['emission'] = point
+        else:
+            manifeste.setdefault('segments', {})[str(numero)] = {'cle': cle, **point}
+        ecrire_json_atomique(repertoire / 'manifeste.json', manifeste)
+
+# Préparation d'avance des émissions à venir
+
+def base_preparation() -> Path:
+    """Répertoire où sont préparées les émissions à venir."""
+    return Path(getattr(config, 'PREPARATION_DIR', Path(tempfile.gettempdir()) / 'preparation'))
+
+def repertoire_preparation(emission) -> Path:
+    """Répertoire de préparation d'une émission."""
+    return base_preparation() / f"{emission['date_diffusion']} - {emission['titre']}"
+
+def heure_creuse(maintenant=None) -> bool:
+    """Indique si l'heure actuelle se situe dans ``config.PREPARATION_HEURES``."""
+    debut, fin = getattr(config, 'PREPARATION_HEURES', (0, 24))
+    heure = (maintenant or datetime.datetime.now()).hour
+    if debut <= fin:
+        return debut <= heure < fin
+    return heure >= debut or heure < fin  # Plage qui passe minuit
+
+def cles_segments(fichiers_concatenes, input_dir, codec) -> list:
+    """Clé de chaque segment (``None`` si la source est absente)."""
+    cles = []
+    for fichier in fichiers_concatenes:
+        input_file = os.path.join(input_dir, fichier)
+        if os.path.exists(input_file):
+            cles.append(cache_segments.cle_segment(input_file, reglages_encodage(codec)))
+        else:
+            cles.append(None)
+    return cles
+
+def lire_manifeste(repertoire: Path):
+    """Lit le manifeste d'une émission en construction, ou retourne ``None``."""
+    try:
+        with open(repertoire / 'manifeste.json', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def preparer_emissions(emissions, input_dir, codec, nb_jours):
+    """Transcode d'avance les ``nb_jours`` prochaines émissions non générées.
+
+    Le travail est fait dans ``config.PREPARATION_DIR`` pendant les heures
+    creuses seulement. ``listegeneration.json`` et ``emissions_def.json``
+    ne sont pas modifiés : c'est l'exécution quotidienne qui promeut
+    l'émission préparée.
+    """
+    a_preparer = [emission for emission in emissions if not emission['genere']][:nb_jours]
+    attendus = {repertoire_preparation(emission) for emission in a_preparer}
+
+    base = base_preparation()
+    base.mkdir(parents=True, exist_ok=True)
+    for repertoire in base.iterdir():
+        if repertoire.is_dir() and repertoire not in attendus:
+            print(f"Préparation obsolète supprimée : {repertoire}")
+            shutil.rmtree(repertoire)
+
+    for emission in a_preparer:
+        if not heure_creuse():
+            print("Hors des heures creuses : arrêt de la préparation.")
+            break
+
+        # Une préparation interrompue reprend à partir de ses points de contrôle
+        repertoire = repertoire_preparation(emission)
+        _, code_retour, _ = construire_emission(emission, str(repertoire), input_dir, codec)
+        if code_retour == 0:
+            print(f"Émission du {emission['date_diffusion']} préparée dans {repertoire}")
+        else:
+            print(f"La préparation de l'émission du {emission['date_diffusion']} a échoué.")
+
+def promouvoir_preparation(emission, emission_dir):
+    """Récupère le travail fait d'avance pour ``emission``.
+
+    Le répertoire de préparation devient le point de contrôle de la
+    construction du jour : ``construire_emission`` y réutilise le fichier
+    final ou les segments encore valides et ne transcode que les segments
+    modifiés (par exemple le message du jour).
+    """
+    repertoire = repertoire_preparation(emission)
+    if lire_manifeste(repertoire) is None:
+        return False
+    if lire_manifeste(Path(emission_dir)) is not None:
+        # Une construction du jour a déjà commencé : elle est plus récente
+        shutil.rmtree(repertoire)
+        return False
+
+    if os.path.exists(emission_dir):
+        shutil.rmtree(emission_dir)
+    os.makedirs(os.path.dirname(emission_dir), exist_ok=True)
+    shutil.move(str(repertoire), emission_dir)
+    print(f"Préparation d'avance reprise pour l'émission du {emission['date_diffusion']}.")
+    return True
+
 # Fonction principale
 def main():
-    """Transcode et assemble les segments listés dans ``listegeneration.json``."""
+    """Transcode et assemble les segments listés dans ``listegeneration.json``.
+
+    Avec l'option ``-avance`` (ou ``-avance=N``), les N prochaines émissions
+    sont préparées d'avance au lieu de générer l'émission du jour.
+    """
     input_dir = os.getcwd()
 
     # Utilisation du répertoire temporaire en utilisant tempfile pour garantir la portabilité
@@ -318,6 +1081,7 @@ def main():
 
     codec = choisir_codec(config.CODEC_VIDEO, config.ACCEL_INTEL)
     rep_mode = False
+    nb_jours_avance = 0
     
     for arg in sys.argv[1:]:
         if arg.lower() == '-intel':
@@ -326,56 +1090,44 @@ def main():
             codec = choisir_codec(config.CODEC_VIDEO, False)
         elif arg.lower() == '-rep':
             rep_mode = True
+        elif arg.lower().startswith('-avance'):
+            _, _, valeur = arg.partition('=')
+            nb_jours_avance = int(valeur) if valeur else getattr(config, 'PREPARATION_JOURS', 3)
 
     verifier_fichier_existe('listegeneration.json')
     verifier_fichier_existe('emissions_def.json')
 
-    with open('listegeneration.json', encoding='utf-8') as f:
-        data = json.load(f)
-        emissions = data['emissions']
-
-        for emission in emissions:
-            if emission['genere']:
-                continue
-
-            titre_emission = emission['titre']
-            date_diffusion = emission['date_diffusion']
-            fichiers_concatenes = emission['fichiers_concatenes']
-            description_emission = emission['description']
-
-            date_diffusion_obj = datetime.datetime.strptime(date_diffusion, '%Y-%m-%d')
-            nom_jour = date_diffusion_obj.strftime('%Y-%m-%d')
-
-            emission_dir = output_dir
-            output_file = os.path.join(emission_dir, f'{titre_emission} - {date_diffusion}.mp4')
-            print(f"Début du traitement de l'émission '{titre_emission}'")
-
-            for i, fichier in enumerate(fichiers_concatenes, start=1):
-                input_file = os.path.join(input_dir, fichier)
-                transcode_output = os.path.join(emission_dir, f'{i:02}.mp4')
-                if os.path.exists(input_file):
-                    transcode_video(input_file, transcode_output, codec)
-                else:
-                    print(f"Le fichier '{input_file}' n'existe pas. Passage au fichier suivant.")
-                    continue
-
-            video_files = [os.path.join(emission_dir, f'{i:02}.mp4') for i in range(1, len(fichiers_concatenes) + 1)]
-            video_files = [video_file for video_file in video_files if os.path.exists(video_file)]
-
-            chapitres = [os.path.splitext(os.path.basename(f))[0] for f in fichiers_concatenes]
-            concatenate_videos(video_files, output_file, f'Émission du {nom_jour}', description_emission, chapitres)
-
-            for video_file in video_files:
-                os.remove(video_file)
-
-            emission['genere'] = True
-            
-            update_emissions_def(emissions, emission, rep_mode)
-            
-            break  # Sortir de la boucle après avoir traité la première émission
-         
-    with open('listegeneration.json', 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+    data = journal_etat.charger('listegeneration.json')
+    emissions = data['emissions']
+
+    if nb_jours_avance:
+        preparer_emissions(emissions, input_dir, codec, nb_jours_avance)
+        return
+
+    for indice, emission in enumerate(emissions):
+        if emission['genere']:
+            continue
+
+        # Les segments sont construits dans un point de contrôle conservé
+        # en cas d'échec; seul le fichier final rejoint TRANSCODE_DIR.
+        emission_dir = str(repertoire_points_controle(emission))
+        promouvoir_preparation(emission, emission_dir)
+
+        output_file, code_retour, _ = construire_emission(emission, emission_dir, input_dir, codec)
+        if code_retour != 0:
+            print(f"L'assemblage de l'émission '{emission['titre']}' a échoué (code {code_retour}).")
+            print(f"Les segments terminés sont conservés dans {emission_dir} pour la reprise.")
+            sys.exit(1)
+
+        shutil.move(output_file, os.path.join(output_dir, nom_fichier_emission(emission)))
+        shutil.rmtree(emission_dir)
+
+        # Seul le changement d'état est ajouté au journal de listegeneration.json
+        journal_etat.modifier('listegeneration.json', data, ('emissions',), indice, genere=True)
+
+        update_emissions_def(emissions, emission, rep_mode)
+
+        break  # Sortir de la boucle après avoir traité la première émission
 
 if __name__ == '__main__':
     main()
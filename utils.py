@@ -1,5 +1,9 @@
+import json
+import os
 from pathlib import Path
+import shutil
 import sys
+import tempfile
 
 def verifier_fichier_existe(filename: str):
     """Valide la présence d'un fichier de configuration.
@@ -17,3 +21,87 @@ def verifier_fichier_existe(filename: str):
             "puis personnalisez-le avant de relancer l'application."
         )
         sys.exit(1)
+
+
+def ecrire_json_atomique(filename, data, indent=4):
+    """Écrit un fichier JSON sans risquer de le laisser à moitié écrit.
+
+    Les données sont d'abord écrites dans un fichier temporaire situé dans
+    le même répertoire, puis celui-ci remplace le fichier d'origine par un
+    renommage atomique.
+    """
+    path = Path(filename)
+    descripteur, temporaire = tempfile.mkstemp(dir=path.parent or '.', prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(descripteur, 'w', encoding='utf-8') as fichier:
+            json.dump(data, fichier, ensure_ascii=False, indent=indent)
+            fichier.flush()
+            os.fsync(fichier.fileno())
+        if path.exists():
+            shutil.copymode(path, temporaire)
+        else:
+            os.chmod(temporaire, 0o644)
+        os.replace(temporaire, path)
+    except BaseException:
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+        raise
+
+
+def publier_fichier(source, destination_dir) -> Path:
+    """Place ``source`` dans ``destination_dir`` sans qu'il soit jamais incomplet.
+
+    Sur le même système de fichiers, un lien physique évite toute copie.
+    Ailleurs, le fichier est copié sous un nom temporaire caché, synchronisé
+    sur disque puis renommé. Dans les deux cas, le renommage final est
+    atomique : un fichier du même nom est remplacé d'un coup.
+    """
+    source = Path(source)
+    destination = Path(destination_dir) / source.name
+    temporaire = destination.with_name(f'.{source.name}.{os.getpid()}.tmp')
+    if temporaire.exists():
+        temporaire.unlink()
+    try:
+        try:
+            os.link(source, temporaire)
+        except OSError:
+            # Autre système de fichiers (ou liens non pris en charge) : copie
+            with open(source, 'rb') as lecture, open(temporaire, 'wb') as ecriture:
+                shutil.copyfileobj(lecture, ecriture, 16 * 1024 * 1024)
+                ecriture.flush()
+                os.fsync(ecriture.fileno())
+            shutil.copymode(source, temporaire)
+        os.replace(temporaire, destination)
+    except BaseException:
+        if temporaire.exists():
+            temporaire.unlink()
+        raise
+
+    if os.name == 'posix':
+        # Rendre le renommage durable avant de supprimer les anciens fichiers
+        descripteur = os.open(destination.parent, os.O_RDONLY)
+        try:
+            os.fsync(descripteur)
+        finally:
+            os.close(descripteur)
+    return destination
+
+
+def publier_emissions(sources, destination_dir, extension='.mp4'):
+    """Publie ``sources`` puis retire les anciens fichiers de ``destination_dir``.
+
+    Les anciens fichiers ne sont supprimés qu'une fois les nouveaux en
+    place, pour que la bibliothèque ne soit jamais vide; sans nouveau
+    fichier, rien n'est supprimé. Retourne la liste des fichiers publiés et
+    celle des fichiers supprimés.
+    """
+    publies = [publier_fichier(source, destination_dir) for source in sources]
+    if not publies:
+        return [], []
+    noms_publies = {fichier.name for fichier in publies}
+    supprimes = []
+    for fichier in Path(destination_dir).iterdir():
+        if fichier.suffix == extension and fichier.is_file() and fichier.name not in noms_publies:
+            fichier.unlink()
+            supprimes.append(fichier)
+    return publies, supprimes